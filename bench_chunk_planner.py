@@ -0,0 +1,132 @@
+"""
+    Create by: apenasrr
+    Source: https://github.com/apenasrr/mass_videojoin
+
+    Benchmark of the join chunk planner (get_list_chunk_videos).
+    Checks that the plan is the same of the former iterrows planner and
+    shows the time to plan a synthetic report of up to 100k videos, also
+    with the balanced planner.
+
+    Usage: python bench_chunk_planner.py
+"""
+
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+
+from make_join import get_list_chunk_videos
+from video_tools import float_seconds_from_string, float_seconds_to_string
+
+
+def get_df_synthetic(qt_videos, seed=0):
+    """
+    Returns:
+        dataframe: columns: file_path_folder, file_name, file_size, duration,
+                   group_encode. About 50 videos per group
+    """
+
+    rng = np.random.default_rng(seed)
+    array_duration = rng.uniform(30, 3600, qt_videos)
+    df = pd.DataFrame(
+        {
+            "file_path_folder": [f"c:\\videos\\{i // 200}"
+                                 for i in range(qt_videos)],
+            "file_name": [f"{i}.mp4" for i in range(qt_videos)],
+            "file_size": rng.integers(10, 400, qt_videos) * 1024 ** 2,
+            "duration": [float_seconds_to_string(x) for x in array_duration],
+            "group_encode": np.cumsum(rng.random(qt_videos) < 0.02) + 1,
+        }
+    )
+    return df
+
+
+def get_list_chunk_videos_iterrows(df, max_size_mb, duration_limit):
+    """Former planner, one group at a time with iterrows"""
+
+    max_size_bytes = max_size_mb * 1024 ** 2
+    float_duration_limit = float_seconds_from_string(duration_limit)
+    df["file_path"] = df["file_path_folder"] + "\\" + df["file_name"]
+    list_final = []
+    for group_no in df["group_encode"].unique().tolist():
+        df_group = df.loc[df["group_encode"].isin([group_no]), :].copy()
+        df_group["float_duration"] = df_group["duration"].apply(
+            float_seconds_from_string
+        )
+        chunk_size = 0
+        chunk_duration = 0
+        list_videos = []
+        for _, row in df_group.iterrows():
+            if (chunk_size + row["file_size"] > max_size_bytes) or (
+                chunk_duration + row["float_duration"] > float_duration_limit
+            ):
+                list_final.append(list_videos)
+                list_videos = []
+                chunk_size = 0
+                chunk_duration = 0
+            list_videos.append(row["file_path"])
+            chunk_size += row["file_size"]
+            chunk_duration += row["float_duration"]
+        if len(list_videos) > 0:
+            list_final.append(list_videos)
+    return list_final
+
+
+def main():
+
+    logging.disable(logging.INFO)
+    max_size_mb = 1000
+    duration_limit = "02:00:00.00"
+
+    df = get_df_synthetic(5_000)
+    list_expected = get_list_chunk_videos_iterrows(
+        df.copy(), max_size_mb, duration_limit
+    )
+    list_result = get_list_chunk_videos(df.copy(), max_size_mb,
+                                        duration_limit)
+    assert list_result == list_expected, "plan differs from iterrows planner"
+    print(f"same plan as iterrows planner: {len(list_result)} chunks")
+
+    list_balanced = get_list_chunk_videos(df.copy(), max_size_mb,
+                                          duration_limit, "balanced")
+    assert len(list_balanced) == len(list_result), "balanced added chunks"
+    dict_array_chunk_size = {}
+    for list_plan, planner in ((list_result, "greedy"),
+                               (list_balanced, "balanced")):
+        array_chunk_size = np.array(
+            [df.loc[df["file_name"].isin([p.split("\\")[-1] for p in c]),
+                    "file_size"].sum() for c in list_plan]
+        ) / 1024 ** 2
+        dict_array_chunk_size[planner] = array_chunk_size
+        print(f"{planner:>8}: smallest chunk {array_chunk_size.min():6.0f}"
+              f" MB, size std {array_chunk_size.std():6.1f} MB")
+    assert (dict_array_chunk_size["balanced"].std()
+            < dict_array_chunk_size["greedy"].std()), "balanced not more even"
+    assert (dict_array_chunk_size["balanced"].max()
+            <= dict_array_chunk_size["greedy"].max()), "balanced bigger chunk"
+
+    for qt_videos in (1_000, 10_000, 100_000):
+        df = get_df_synthetic(qt_videos)
+        if qt_videos <= 10_000:
+            time_start = time.perf_counter()
+            get_list_chunk_videos_iterrows(df.copy(), max_size_mb,
+                                           duration_limit)
+            str_iterrows = f"{time.perf_counter() - time_start:8.3f}s"
+        else:
+            str_iterrows = "  skipped"
+        time_start = time.perf_counter()
+        list_chunk = get_list_chunk_videos(df.copy(), max_size_mb,
+                                           duration_limit)
+        elapsed = time.perf_counter() - time_start
+        time_start = time.perf_counter()
+        get_list_chunk_videos(df.copy(), max_size_mb, duration_limit,
+                              "balanced")
+        elapsed_balanced = time.perf_counter() - time_start
+        print(f"{qt_videos:>7} videos, {len(list_chunk):>6} chunks: "
+              f"numpy {elapsed:8.3f}s | balanced {elapsed_balanced:8.3f}s"
+              f" | iterrows {str_iterrows}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,11 +2,14 @@
 source: https://stackoverflow.com/a/63215561/10681595
 """
 
+import asyncio
 import json
 import logging
 import subprocess
 from pathlib import Path
 
+import probe_cache
+
 
 class FFProbeResult:
     def __init__(
@@ -51,25 +54,49 @@ class FFProbeResult:
             logging.debug("Dumped ffprobe output into %s", path)
 
 
-def ffprobe(
-    file_path, ffprobe_format="json", format_optn="", log_level="error"
-) -> FFProbeResult:
+def get_command_array_ffprobe(file_path, print_format, log_level):
 
-    assert ffprobe_format in ["json", "flat"], (
-        "format must be json or flat, not %s" % ffprobe_format
-    )
-    format_optn = "=" + format_optn if format_optn else format_optn
     command_array = [
         "ffprobe",
         "-v",
         log_level,
         "-print_format",
-        ffprobe_format + format_optn,
+        print_format,
         "-show_programs",
         "-show_format",
         "-show_streams",
         f"{file_path}",
     ]
+    return command_array
+
+
+def ffprobe(
+    file_path,
+    ffprobe_format="json",
+    format_optn="",
+    log_level="error",
+    use_cache=True,
+) -> FFProbeResult:
+    """
+    :param use_cache: reuse the output stored in probe_cache while the file
+                      keeps the same size and mtime
+    """
+
+    assert ffprobe_format in ["json", "flat"], (
+        "format must be json or flat, not %s" % ffprobe_format
+    )
+    format_optn = "=" + format_optn if format_optn else format_optn
+    print_format = ffprobe_format + format_optn
+    if use_cache:
+        output = probe_cache.get_output(file_path, print_format)
+        if output is not None:
+            return FFProbeResult(
+                return_code=0, output=output, format=ffprobe_format
+            )
+
+    command_array = get_command_array_ffprobe(
+        file_path, print_format, log_level
+    )
     try:
         result = subprocess.run(
             command_array,
@@ -88,9 +115,177 @@ def ffprobe(
         )
         raise e
 
+    if use_cache and result.returncode == 0:
+        probe_cache.set_output(file_path, print_format, result.stdout)
+
     return FFProbeResult(
         return_code=result.returncode,
         output=result.stdout,
         error=result.stderr,
         format=ffprobe_format,
     )
+
+
+async def run_process_async(command_array, semaphore=None):
+    """Run a command without blocking the event loop
+
+    :param semaphore: asyncio.Semaphore or SemaphoreShared limiting the
+                      processes running at the same time. None for no limit
+    :return: tuple: return_code, stdout, stderr
+    """
+
+    async def run(command_array):
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *command_array,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+        except Exception as e:
+            logging.critical(
+                "%s failed to run, check first that cmd is in your path",
+                command_array[0],
+                exc_info=True,
+            )
+            raise e
+        stdout, stderr = await process.communicate()
+        return (
+            process.returncode,
+            stdout.decode("utf8", errors="replace"),
+            stderr.decode("utf8", errors="replace"),
+        )
+
+    if semaphore is None:
+        return await run(command_array)
+    async with semaphore:
+        return await run(command_array)
+
+
+async def ffprobe_async(
+    file_path,
+    ffprobe_format="json",
+    format_optn="",
+    log_level="error",
+    use_cache=True,
+    semaphore=None,
+) -> FFProbeResult:
+    """Async counterpart of ffprobe()
+
+    :param semaphore: asyncio.Semaphore shared by the concurrent probes
+    """
+
+    assert ffprobe_format in ["json", "flat"], (
+        "format must be json or flat, not %s" % ffprobe_format
+    )
+    format_optn = "=" + format_optn if format_optn else format_optn
+    print_format = ffprobe_format + format_optn
+    # the sqlite calls of the probe cache run outside the event loop
+    if use_cache:
+        output = await asyncio.to_thread(
+            probe_cache.get_output, file_path, print_format
+        )
+        if output is not None:
+            return FFProbeResult(
+                return_code=0, output=output, format=ffprobe_format
+            )
+
+    command_array = get_command_array_ffprobe(
+        file_path, print_format, log_level
+    )
+    return_code, output, error = await run_process_async(
+        command_array, semaphore
+    )
+
+    if use_cache and return_code == 0:
+        await asyncio.to_thread(
+            probe_cache.set_output, file_path, print_format, output
+        )
+
+    return FFProbeResult(
+        return_code=return_code,
+        output=output,
+        error=error,
+        format=ffprobe_format,
+    )
+
+
+async def ffmpeg_async(
+    list_args, log_level="error", semaphore=None, output_format=None
+) -> FFProbeResult:
+    """Run ffmpeg without blocking the event loop
+
+    :param list_args: ffmpeg arguments, e.g.: ["-y", "-i", "in.mp4", ...]
+    :param semaphore: asyncio.Semaphore shared by the concurrent jobs
+    :param output_format: "flat" when stdout has key=value lines, as the
+                          ones generated by '-progress pipe:1'
+    """
+
+    command_array = [
+        "ffmpeg",
+        "-hide_banner",
+        "-nostdin",
+        "-v",
+        log_level,
+    ] + list(list_args)
+    return_code, output, error = await run_process_async(
+        command_array, semaphore
+    )
+    if return_code != 0:
+        logging.error("ffmpeg failed: %s\n%s", " ".join(command_array), error)
+
+    return FFProbeResult(
+        return_code=return_code,
+        output=output,
+        error=error,
+        format=output_format,
+    )
+
+
+class SemaphoreShared:
+    """Async context manager holding a slot of a local asyncio.Semaphore and
+    a slot of a threading.BoundedSemaphore shared with the event loops of
+    other threads. The thread slot is polled, so a cancelled task never
+    keeps it."""
+
+    def __init__(self, semaphore_local, semaphore_thread, poll_seconds=0.05):
+
+        self.semaphore_local = semaphore_local
+        self.semaphore_thread = semaphore_thread
+        self.poll_seconds = poll_seconds
+
+    async def __aenter__(self):
+
+        await self.semaphore_local.acquire()
+        try:
+            while not self.semaphore_thread.acquire(blocking=False):
+                await asyncio.sleep(self.poll_seconds)
+        except BaseException:
+            self.semaphore_local.release()
+            raise
+
+    async def __aexit__(self, exc_type, exc, tb):
+
+        self.semaphore_thread.release()
+        self.semaphore_local.release()
+
+
+async def gather_limited(
+    coroutine_function, list_args, max_concurrency, semaphore_thread=None
+):
+    """Run one coroutine per item of list_args, with at most max_concurrency
+    processes at the same time. The results keep the order of list_args.
+
+    :param coroutine_function: coroutine function that accepts the
+                                    keyword argument 'semaphore'
+    :param semaphore_thread: threading.BoundedSemaphore that also limits
+                             the processes, shared with other threads
+    """
+
+    semaphore = asyncio.Semaphore(max(1, int(max_concurrency)))
+    if semaphore_thread is not None:
+        semaphore = SemaphoreShared(semaphore, semaphore_thread)
+    list_coroutine = [
+        coroutine_function(*args, semaphore=semaphore)
+        for args in list_args
+    ]
+    return await asyncio.gather(*list_coroutine)
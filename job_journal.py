@@ -0,0 +1,317 @@
+"""
+    Create by: apenasrr
+    Source: https://github.com/apenasrr/mass_videojoin
+
+    Append-only journal of finished jobs (JSON lines, fsync after each
+    entry). The reencode and join loops record each job here, and
+    compact_journal folds the entries back into the report working state.
+    Rows are found by key columns, not by the df index, because the user
+    may edit the xlsx between an interrupted run and the next one.
+    Jobs that run long may also record their start, so the outputs left
+    half written by an interrupted run can be found.
+"""
+
+import datetime
+import json
+import logging
+import os
+import threading
+
+import pandas as pd
+
+import job_state
+
+# the workers of a pool may record the start of their jobs
+_lock = threading.Lock()
+
+# unique before the split, and not changed by the reencode
+LIST_COLUMN_KEY_ORIGIN = ["file_path_folder_origin", "file_name_origin"]
+# unique after the split, and not changed by the join
+LIST_COLUMN_KEY_FILE = ["file_path_folder", "file_name"]
+
+
+def get_path_file_journal(path_file_report):
+
+    path_file_journal = (
+        os.path.splitext(path_file_report)[0] + "_journal.jsonl"
+    )
+    return path_file_journal
+
+
+def append_entry(path_file_report, dict_entry):
+    """Append one entry and force it to disk
+
+    Args:
+        path_file_report (str): path_file of video_details.xlsx
+        dict_entry (dict): json serializable entry
+    """
+
+    path_file_journal = get_path_file_journal(path_file_report)
+    line = json.dumps(dict_entry, ensure_ascii=False) + "\n"
+    with _lock, open(path_file_journal, "a", encoding="utf-8") as f:
+        f.write(line)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def clear_journal(path_file_report):
+    """Remove the journal, once its entries are in the working state"""
+
+    path_file_journal = get_path_file_journal(path_file_report)
+    if os.path.isfile(path_file_journal):
+        os.remove(path_file_journal)
+
+
+def read_entries(path_file_report):
+    """
+    Returns:
+        list: journal entries. A line partially written by a crash is ignored
+    """
+
+    path_file_journal = get_path_file_journal(path_file_report)
+    if not os.path.isfile(path_file_journal):
+        return []
+
+    list_entry = []
+    with open(path_file_journal, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                list_entry.append(json.loads(line))
+            except ValueError:
+                logging.warning(
+                    f"Ignored incomplete journal line: {line.strip()}"
+                )
+    return list_entry
+
+
+def record_job_done(
+    df,
+    path_file_report,
+    stage,
+    index_rows,
+    list_column_name,
+    list_output=None,
+    elapsed_seconds=None,
+    list_column_key=None,
+):
+    """Record a finished job with the new values of its rows
+
+    Args:
+        df (dataframe): video_details dataframe, already updated
+        path_file_report (str): path_file of video_details.xlsx
+        stage (str): e.g.: reencode, join
+        index_rows (list): df index of the rows changed by the job
+        list_column_name (list): columns changed by the job
+        list_output (list, optional): path_file created by the job
+        elapsed_seconds (float, optional): job duration
+        list_column_key (list, optional): columns that identify each row,
+                                          not changed by the job. Defaults
+                                          to LIST_COLUMN_KEY_ORIGIN
+    """
+
+    list_column_key = list_column_key or LIST_COLUMN_KEY_ORIGIN
+    list_row = []
+    for index_row in index_rows:
+        list_row.append({
+            "key": [
+                job_state.to_sql_value(df.at[index_row, column_name])
+                for column_name in list_column_key
+            ],
+            "values": {
+                column_name: job_state.to_sql_value(
+                    df.at[index_row, column_name]
+                )
+                for column_name in list_column_name
+            },
+        })
+
+    dict_entry = {
+        "stage": stage,
+        "time": datetime.datetime.now().isoformat(timespec="seconds"),
+        "outputs": list_output or [],
+        "elapsed_seconds": elapsed_seconds,
+        "key_columns": list_column_key,
+        "rows": list_row,
+    }
+    append_entry(path_file_report, dict_entry)
+
+
+def record_job_started(path_file_report, stage, index_rows, list_output):
+    """Record the start of a job. Its rows are only changed by the entry
+    of record_job_done
+
+    Args:
+        path_file_report (str): path_file of video_details.xlsx
+        stage (str): e.g.: reencode
+        index_rows (list): df index of the rows of the job
+        list_output (list): path_file that the job will create
+    """
+
+    dict_entry = {
+        "stage": stage + "_started",
+        "time": datetime.datetime.now().isoformat(timespec="seconds"),
+        "outputs": list_output,
+        "index_rows": [str(index_row) for index_row in index_rows],
+        "rows": [],
+    }
+    append_entry(path_file_report, dict_entry)
+
+
+def get_list_output_interrupted(path_file_report, stage):
+    """
+    Args:
+        path_file_report (str): path_file of video_details.xlsx
+        stage (str): e.g.: reencode
+
+    Returns:
+        list: outputs of the jobs of the stage that were started, but not
+              recorded as done. Must be read before compact_journal
+    """
+
+    list_output_started = []
+    set_output_done = set()
+    for dict_entry in read_entries(path_file_report):
+        if dict_entry["stage"] == stage + "_started":
+            list_output_started.extend(dict_entry["outputs"])
+        elif dict_entry["stage"] == stage:
+            set_output_done.update(dict_entry["outputs"])
+
+    list_output_interrupted = [
+        output
+        for output in dict.fromkeys(list_output_started)
+        if output not in set_output_done
+    ]
+    return list_output_interrupted
+
+
+def record_chunk_joined(
+    path_file_report,
+    stage,
+    list_input,
+    file_output,
+    list_dict_videos_duration,
+    elapsed_seconds=None,
+):
+    """Record a joined file whose rows are not in the report yet, as the
+    chunks of the pipeline of menu option 4
+
+    Args:
+        path_file_report (str): path_file of video_details.xlsx
+        stage (str): e.g.: pipeline_join
+        list_input (list): video path_file joined
+        file_output (str): path_file of the joined video
+        list_dict_videos_duration (list): dict with keys: file_path_origin,
+                                          duration_real
+        elapsed_seconds (float, optional): job duration
+    """
+
+    dict_entry = {
+        "stage": stage,
+        "time": datetime.datetime.now().isoformat(timespec="seconds"),
+        "outputs": [file_output],
+        "elapsed_seconds": elapsed_seconds,
+        "inputs": list_input,
+        "result": list_dict_videos_duration,
+        "rows": [],
+    }
+    append_entry(path_file_report, dict_entry)
+
+
+def get_dict_chunk_joined(path_file_report, stage):
+    """
+    Args:
+        path_file_report (str): path_file of video_details.xlsx
+        stage (str): e.g.: pipeline_join
+
+    Returns:
+        dict: key: file_output. value: entry of record_chunk_joined.
+              Must be read before compact_journal
+    """
+
+    dict_chunk_joined = {}
+    for dict_entry in read_entries(path_file_report):
+        if dict_entry["stage"] == stage:
+            dict_chunk_joined[dict_entry["outputs"][0]] = dict_entry
+    return dict_chunk_joined
+
+
+def compact_journal(df, path_file_report):
+    """Apply the journal entries to df, save them in the working state
+    and clear the journal
+
+    Args:
+        df (dataframe): video_details dataframe, from the working state
+        path_file_report (str): path_file of video_details.xlsx
+
+    Returns:
+        dataframe: df updated with the journal entries
+    """
+
+    list_entry = read_entries(path_file_report)
+    if len(list_entry) == 0:
+        return df
+
+    logging.info(f"Compacting {len(list_entry)} journal entries")
+    set_index_rows = set()
+    list_column_name = []
+    dict_dict_index_key = {}
+    for dict_entry in list_entry:
+        if len(dict_entry["rows"]) == 0:
+            # entries of started jobs change no row
+            continue
+        list_column_key = dict_entry.get("key_columns")
+        if list_column_key is None or \
+                not set(list_column_key).issubset(df.columns):
+            logging.warning(
+                f"Ignored journal entry without the key columns: "
+                f"{dict_entry['stage']} {dict_entry['outputs']}"
+            )
+            continue
+        tuple_column_key = tuple(list_column_key)
+        if tuple_column_key not in dict_dict_index_key:
+            dict_dict_index_key[tuple_column_key] = get_dict_index_key(
+                df, list_column_key
+            )
+        dict_index_key = dict_dict_index_key[tuple_column_key]
+
+        for dict_row in dict_entry["rows"]:
+            index_row = dict_index_key.get(tuple(dict_row["key"]))
+            if index_row is None:
+                logging.warning(
+                    f"Ignored journal row not found in the report: "
+                    f"{dict_entry['stage']} {dict_row['key']}"
+                )
+                continue
+            set_index_rows.add(index_row)
+            for column_name, value in dict_row["values"].items():
+                df.loc[index_row, column_name] = value
+                if column_name not in list_column_name:
+                    list_column_name.append(column_name)
+
+    if len(list_column_name) > 0:
+        job_state.update_report_state(
+            df, path_file_report, sorted(set_index_rows), list_column_name
+        )
+    clear_journal(path_file_report)
+    return df
+
+
+def get_dict_index_key(df, list_column_key):
+    """
+    Returns:
+        dict: key: tuple of the key values of a row. value: df index.
+              Keys shared by more than one row are left out
+    """
+
+    serie_key = pd.Series(
+        list(zip(*[
+            [job_state.to_sql_value(value) for value in df[column_name]]
+            for column_name in list_column_key
+        ])),
+        index=df.index,
+        dtype=object,
+    )
+    mask_unique = ~serie_key.duplicated(keep=False)
+    for key in serie_key[~mask_unique].unique():
+        logging.warning(f"Journal key shared by more than one row: {key}")
+    return dict(zip(serie_key[mask_unique], serie_key.index[mask_unique]))
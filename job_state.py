@@ -0,0 +1,117 @@
+"""
+    Create by: apenasrr
+    Source: https://github.com/apenasrr/mass_videojoin
+
+    Working state of the project report, kept in a SQLite file next to
+    video_details.xlsx. The reencode and join loops read it once and update
+    only the rows of each finished job. The xlsx is exported only at the
+    checkpoints where the user reviews the report.
+"""
+
+import os
+import sqlite3
+from contextlib import closing
+
+import pandas as pd
+
+TABLE_NAME = "report"
+INDEX_LABEL = "row_id"
+
+
+def get_path_file_state(path_file_report):
+
+    path_file_state = os.path.splitext(path_file_report)[0] + ".sqlite"
+    return path_file_state
+
+
+def save_report_state(df, path_file_report):
+    """Replace the whole working state by df
+
+    Args:
+        df (dataframe): video_details dataframe
+        path_file_report (str): path_file of video_details.xlsx
+    """
+
+    path_file_state = get_path_file_state(path_file_report)
+    with closing(sqlite3.connect(path_file_state)) as conn:
+        df.to_sql(
+            TABLE_NAME,
+            conn,
+            if_exists="replace",
+            index=True,
+            index_label=INDEX_LABEL,
+        )
+
+
+def load_report_state(path_file_report):
+    """Load the working state. If the xlsx is newer, e.g. after a review
+    by the user, the state is rebuilt from the xlsx.
+
+    Args:
+        path_file_report (str): path_file of video_details.xlsx
+
+    Returns:
+        dataframe: video_details dataframe
+    """
+
+    path_file_state = get_path_file_state(path_file_report)
+    if os.path.isfile(path_file_state) and os.path.getmtime(
+        path_file_state
+    ) >= os.path.getmtime(path_file_report):
+        with closing(sqlite3.connect(path_file_state)) as conn:
+            df = pd.read_sql(
+                f"SELECT * FROM {TABLE_NAME}", conn, index_col=INDEX_LABEL
+            )
+        df.index.name = None
+        return df
+
+    df = pd.read_excel(path_file_report, engine="openpyxl")
+    save_report_state(df, path_file_report)
+    return df
+
+
+def to_sql_value(value):
+
+    if pd.isna(value):
+        return None
+    if hasattr(value, "item"):
+        # numpy scalar to python type
+        return value.item()
+    return value
+
+
+def update_report_state(df, path_file_report, index_rows, list_column_name):
+    """Write some columns of some rows of df in the working state
+
+    Args:
+        df (dataframe): video_details dataframe, already updated
+        path_file_report (str): path_file of video_details.xlsx
+        index_rows (list): df index of the rows to write
+        list_column_name (list): columns to write
+    """
+
+    path_file_state = get_path_file_state(path_file_report)
+    with closing(sqlite3.connect(path_file_state)) as conn:
+        set_column_state = {
+            row[1] for row in conn.execute(f"PRAGMA table_info({TABLE_NAME})")
+        }
+    if not set(list_column_name).issubset(set_column_state):
+        # new columns are written for all rows
+        save_report_state(df, path_file_report)
+        return
+
+    with closing(sqlite3.connect(path_file_state)) as conn:
+        with conn:
+            str_set = ", ".join(
+                f'"{column_name}" = ?' for column_name in list_column_name
+            )
+            sql = f"UPDATE {TABLE_NAME} SET {str_set} WHERE {INDEX_LABEL} = ?"
+            list_values = []
+            for index_row in index_rows:
+                values = [
+                    to_sql_value(df.at[index_row, column_name])
+                    for column_name in list_column_name
+                ]
+                values.append(int(index_row))
+                list_values.append(values)
+            conn.executemany(sql, list_values)
@@ -0,0 +1,160 @@
+"""
+    Create by: apenasrr
+    Source: https://github.com/apenasrr/mass_videojoin
+
+    Keyframe index of video files: timestamps and byte offsets of the
+    keyframes of the first video stream. Extracted once per file and stored
+    in the probe cache, so split points can be placed exactly on keyframes.
+"""
+
+import logging
+import subprocess
+
+import numpy as np
+
+import probe_cache
+from ffprobe_micro import ffprobe
+
+PRINT_FORMAT_KEYFRAME = "keyframe_index"
+
+
+def extract_keyframe_index(file_path):
+    """Read the packets of the first video stream, without decoding
+
+    Args:
+        file_path (str): video path file
+
+    Returns:
+        np.ndarray: shape (n, 2). columns: pts_time (seconds), pos (bytes).
+                    Sorted by pts_time. Empty if extraction fails
+    """
+
+    command_array = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-select_streams",
+        "v:0",
+        "-show_entries",
+        "packet=pts_time,pos,flags",
+        "-of",
+        "csv=p=0",
+        f"{file_path}",
+    ]
+    result = subprocess.run(
+        command_array,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        encoding="utf8",
+    )
+    if result.returncode != 0:
+        logging.error(f"Can't extract keyframes: {file_path}")
+        logging.error(result.stderr)
+        return np.empty((0, 2))
+
+    list_keyframe = []
+    for line in result.stdout.splitlines():
+        list_field = line.split(",")
+        if len(list_field) < 3 or "K" not in list_field[2]:
+            continue
+        pts_time, pos = list_field[0], list_field[1]
+        if pts_time == "N/A" or pos == "N/A":
+            continue
+        list_keyframe.append((float(pts_time), float(pos)))
+
+    array_keyframe = np.array(list_keyframe, dtype="<f8").reshape(-1, 2)
+    array_keyframe = array_keyframe[np.argsort(array_keyframe[:, 0])]
+    return array_keyframe
+
+
+def get_keyframe_index(file_path):
+    """Keyframe index from the probe cache, extracting it if necessary
+
+    Args:
+        file_path (str): video path file
+
+    Returns:
+        np.ndarray: shape (n, 2). columns: pts_time (seconds), pos (bytes)
+    """
+
+    blob = probe_cache.get_output(file_path, PRINT_FORMAT_KEYFRAME)
+    if blob is not None:
+        return np.frombuffer(blob, dtype="<f8").reshape(-1, 2)
+
+    array_keyframe = extract_keyframe_index(file_path)
+    if len(array_keyframe) > 0:
+        probe_cache.set_output(
+            file_path, PRINT_FORMAT_KEYFRAME, array_keyframe.tobytes()
+        )
+    return array_keyframe
+
+
+def get_start_time(file_path):
+    """
+    Returns:
+        float: start_time of the file, in seconds. The keyframe pts_time
+               are counted from it, while '-ss' after '-i' counts from 0
+    """
+
+    dict_inf = ffprobe(file_path).get_output_as_dict()
+    try:
+        return float(dict_inf["format"]["start_time"])
+    except (KeyError, ValueError):
+        return 0.0
+
+
+def get_list_cut_time(array_keyframe, file_size, limit_size, start_time=0):
+    """Choose keyframes where a file must be cut, so each part has
+    at most limit_size bytes and parts have similar sizes
+
+    Args:
+        array_keyframe (np.ndarray): keyframe index. See get_keyframe_index
+        file_size (int): file size in bytes
+        limit_size (int): size limit per part in bytes
+        start_time (float, optional): start_time of the file, subtracted
+                                      from the cut times. Defaults to 0.
+
+    Returns:
+        list: cut times in seconds, from the start of the file. Part n
+              starts at cut n-1 and ends at cut n. Empty if the file does
+              not need to be cut
+    """
+
+    array_time = array_keyframe[:, 0]
+    array_pos = array_keyframe[:, 1]
+    slices_qt = int(file_size // limit_size) + 1
+
+    list_cut_time = []
+    index_start = 0
+    pos_start = 0
+    while file_size - pos_start > limit_size:
+        slices_left = max(slices_qt - len(list_cut_time), 2)
+        pos_target = pos_start + min(
+            (file_size - pos_start) / slices_left, limit_size
+        )
+        # last keyframe before the target, so the part fits in the limit
+        index_cut = int(np.searchsorted(array_pos, pos_target, "right")) - 1
+        if index_cut <= index_start:
+            # keyframes too sparse. Cut on the next one
+            index_cut = index_start + 1
+            if (
+                index_cut < len(array_pos)
+                and array_pos[index_cut] - pos_start > limit_size
+            ):
+                logging.warning(
+                    "No keyframe inside the size limit. Part of "
+                    f"{(array_pos[index_cut] - pos_start) / 1024 ** 2:.1f}"
+                    " MB is bigger than the limit"
+                )
+        if index_cut >= len(array_pos):
+            logging.warning(
+                "No keyframe left to cut. Last part of "
+                f"{(file_size - pos_start) / 1024 ** 2:.1f} MB is bigger "
+                "than the limit"
+            )
+            break
+        list_cut_time.append(float(array_time[index_cut]) - start_time)
+        index_start = index_cut
+        pos_start = array_pos[index_cut]
+    return list_cut_time
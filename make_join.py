@@ -0,0 +1,996 @@
+"""
+    Create by: apenasrr
+    Source: https://github.com/apenasrr/mass_videojoin
+
+    Step 3 of mass_videojoin: group the videos by codec, resolution and
+    folder, plan the join chunks and join them. Also used by the pipeline
+    of menu option 4 (pipeline_dag).
+"""
+
+import contextlib
+import datetime
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+import job_journal
+import job_state
+import size_model
+from ffprobe_micro import ffprobe
+from transition import (check_transition_resolution,
+                        get_dict_transition_resolution,
+                        get_video_resolution_format)
+from utils_mass_videojoin import (create_report_backup,
+                                  ensure_folder_existence,
+                                  get_serie_sub_folder, place_file)
+from video_tools import (float_seconds_from_string, get_dict_video_duration,
+                         join_mp4, timedelta_to_string)
+
+
+def set_mark_group_encode(df):
+
+    df["key_join_checker"] = (
+        df["audio_codec"]
+        + "-"
+        + df["video_codec"]
+        + "-"
+        + df["video_resolution_width"].astype(str)
+        + "-"
+        + df["video_resolution_height"].astype(str)
+    )
+    serie_group_encode_bool = df["key_join_checker"] != df["key_join_checker"].shift(1)
+    return serie_group_encode_bool
+
+
+def set_mask_group_per_folder(serie_folder_path):
+
+    serie_first_column = get_serie_sub_folder(serie_folder_path)
+    df_first_column = serie_first_column.to_frame("folder")
+    df_first_column["folder_prior"] = df_first_column["folder"].shift(1)
+    serie_change_folder_bool = (
+        df_first_column["folder_prior"] != df_first_column["folder"]
+    )
+    return serie_change_folder_bool
+
+
+def get_serie_group(serie_change_bool):
+    """
+    from boolean serie, make cumulative sum returning serie int
+    true, false, false, true, false
+    1, 1, 1, 2, 2
+    """
+
+    return serie_change_bool.cumsum()
+
+
+def get_video_details_with_group(df):
+
+    # set mask group per encode
+    serie_group_encode_bool = set_mark_group_encode(df)
+
+    # set mask group per folder
+    serie_folder_path = df["file_path_folder_origin"]
+    serie_change_folder_bool = set_mask_group_per_folder(serie_folder_path)
+
+    # agregate group masks
+    serie_change_bool = serie_group_encode_bool | serie_change_folder_bool
+
+    # create group_encode column
+    df["group_encode"] = get_serie_group(serie_change_bool)
+    return df
+
+
+def get_array_duration_us(serie_duration):
+    """Parse durations in format hh:mm:ss.ms to integer microseconds, so the
+    chunk sums are exact
+
+    Args:
+        serie_duration (serie): durations in format hh:mm:ss.ms
+
+    Returns:
+        array: int64 durations in microseconds
+    """
+
+    df_hh_mm_ss = serie_duration.astype(str).str.split(":", expand=True)
+    array_hh_mm_ss = df_hh_mm_ss.astype(float).to_numpy()
+    array_seconds = array_hh_mm_ss @ np.array([3600.0, 60.0, 1.0])
+    return np.round(array_seconds * 1_000_000).astype(np.int64)
+
+
+def get_list_chunk_end(array_size, array_duration_us, array_group_end,
+                       max_size_bytes, duration_limit_us):
+    """Greedy cut of the videos in chunks, in a single pass over all groups.
+    A chunk closes before the video that would exceed the size or the
+    duration limit, or at the end of its group.
+
+    Args:
+        array_size (array): int64 file sizes, sorted by group
+        array_duration_us (array): int64 durations, sorted by group
+        array_group_end (array): for each video, the position after the last
+                                 video of its group
+        max_size_bytes (int): size limit of each chunk
+        duration_limit_us (int): duration limit of each chunk
+
+    Returns:
+        list: position after the last video of each chunk.
+              None if a single video is bigger than the limits
+    """
+
+    cumsum_size = np.concatenate(([0], np.cumsum(array_size)))
+    cumsum_duration = np.concatenate(([0], np.cumsum(array_duration_us)))
+
+    list_chunk_end = []
+    start = 0
+    qt_videos = len(array_size)
+    while start < qt_videos:
+        # last position whose partial sum still fits in the limit
+        end_size = np.searchsorted(
+            cumsum_size, cumsum_size[start] + max_size_bytes, side="right"
+        ) - 1
+        end_duration = np.searchsorted(
+            cumsum_duration,
+            cumsum_duration[start] + duration_limit_us,
+            side="right",
+        ) - 1
+        end = min(end_size, end_duration, array_group_end[start])
+        if end == start:
+            return None, start
+        list_chunk_end.append(end)
+        start = end
+    return list_chunk_end, None
+
+
+def get_list_chunk_end_partition(array_size, array_duration_us, qt_chunk,
+                                 max_size_bytes, duration_limit_us):
+    """Linear partition of the videos of one group in exactly qt_chunk
+    chunks within the limits, with the smallest sum of squared chunk sizes,
+    i.e. the sizes closest to each other. Dynamic programming over the
+    chunk ends, vectorized over all the ends for each chunk width.
+
+    Args:
+        array_size (array): int64 file sizes of the group
+        array_duration_us (array): int64 durations of the group
+        qt_chunk (int): number of chunks
+        max_size_bytes (int): size limit of each chunk
+        duration_limit_us (int): duration limit of each chunk
+
+    Returns:
+        list: position after the last video of each chunk.
+              None if there is no partition within the limits
+    """
+
+    qt_videos = len(array_size)
+    cumsum_size = np.concatenate(([0], np.cumsum(array_size)))
+    cumsum_duration = np.concatenate(([0], np.cumsum(array_duration_us)))
+
+    # for each chunk end, the first start that keeps the chunk in the limits
+    array_end = np.arange(1, qt_videos + 1)
+    array_start_min = np.maximum(
+        np.searchsorted(cumsum_size, cumsum_size[1:] - max_size_bytes,
+                        side="left"),
+        np.searchsorted(cumsum_duration,
+                        cumsum_duration[1:] - duration_limit_us,
+                        side="left"),
+    )
+    width_max = int((array_end - array_start_min).max())
+    cumsum_size_float = cumsum_size.astype(np.float64)
+
+    # cost[end]: smallest sum of squares of the chunks up to end
+    array_cost_previous = np.full(qt_videos + 1, np.inf)
+    array_cost_previous[0] = 0
+    list_array_start = []
+    for _ in range(qt_chunk):
+        array_cost = np.full(qt_videos + 1, np.inf)
+        array_start_best = np.zeros(qt_videos + 1, dtype=np.int64)
+        for width in range(1, width_max + 1):
+            array_start = array_end - width
+            mask_valid = array_start >= array_start_min
+            array_start_valid = array_start[mask_valid]
+            array_end_valid = array_end[mask_valid]
+            array_cost_candidate = array_cost_previous[array_start_valid] + (
+                cumsum_size_float[array_end_valid]
+                - cumsum_size_float[array_start_valid]
+            ) ** 2
+            mask_better = array_cost_candidate < array_cost[array_end_valid]
+            array_cost[array_end_valid[mask_better]] = \
+                array_cost_candidate[mask_better]
+            array_start_best[array_end_valid[mask_better]] = \
+                array_start_valid[mask_better]
+        list_array_start.append(array_start_best)
+        array_cost_previous = array_cost
+
+    if not np.isfinite(array_cost_previous[qt_videos]):
+        return None
+
+    list_chunk_end = []
+    end = qt_videos
+    for array_start_best in reversed(list_array_start):
+        list_chunk_end.append(end)
+        end = int(array_start_best[end])
+    return list_chunk_end[::-1]
+
+
+def get_list_chunk_end_balanced(array_size, array_duration_us,
+                                array_group_end, max_size_bytes,
+                                duration_limit_us):
+    """Cut of the videos in chunks with the minimum number of chunks per
+    group and sizes as even as possible. Keeping the order, the greedy cut
+    already gives the minimum number of chunks. So, for each group, the
+    smallest size limit that still gives that number of chunks is found by
+    binary search, and the group is partitioned within it with the sizes
+    closest to each other (get_list_chunk_end_partition).
+
+    Args:
+        same as get_list_chunk_end
+
+    Returns:
+        list: position after the last video of each chunk.
+              None if a single video is bigger than the limits
+    """
+
+    list_chunk_end, position_error = get_list_chunk_end(
+        array_size, array_duration_us, array_group_end,
+        max_size_bytes, duration_limit_us
+    )
+    if list_chunk_end is None:
+        return None, position_error
+
+    list_chunk_end_balanced = []
+    array_chunk_end = np.array(list_chunk_end)
+    start = 0
+    while start < len(array_size):
+        end_group = array_group_end[start]
+        qt_chunk = np.count_nonzero(
+            (array_chunk_end > start) & (array_chunk_end <= end_group)
+        )
+        array_size_group = array_size[start:end_group]
+        array_duration_group = array_duration_us[start:end_group]
+        array_group_end_group = np.full(end_group - start, end_group - start)
+
+        # smallest size limit that keeps qt_chunk chunks
+        size_low = max(int(array_size_group.max()),
+                       -(-int(array_size_group.sum()) // qt_chunk))
+        size_high = max_size_bytes
+        while size_low < size_high:
+            size_middle = (size_low + size_high) // 2
+            list_end, _ = get_list_chunk_end(
+                array_size_group, array_duration_group, array_group_end_group,
+                size_middle, duration_limit_us
+            )
+            if list_end is not None and len(list_end) <= qt_chunk:
+                size_high = size_middle
+            else:
+                size_low = size_middle + 1
+
+        list_end = get_list_chunk_end_partition(
+            array_size_group, array_duration_group, qt_chunk,
+            size_low, duration_limit_us
+        )
+        list_chunk_end_balanced += [start + end for end in list_end]
+        start = end_group
+    return list_chunk_end_balanced, None
+
+
+def get_list_chunk_videos(df, max_size_mb, duration_limit="00:00:00.00",
+                          join_planner="greedy", column_size="file_size"):
+    """Plan the join of the videos in chunks, respecting the size and the
+    duration limits, without mixing groups. The groups are planned in order
+    of first appearance and the videos keep the df order inside each group.
+
+    Args:
+        df (dataframe): video_details dataframe. Required columns:
+                        [file_path_folder, file_name, file_size, duration,
+                         group_encode]
+        max_size_mb (int): max size of each chunk
+        duration_limit (str, optional): max duration of each chunk, in
+                                        format hh:mm:ss.ms. "00:00:00.00"
+                                        for no limit.
+        join_planner (str, optional): 'greedy' to fill each chunk up to the
+                                      limits. 'balanced' to get the same
+                                      number of chunks with even sizes.
+                                      Defaults to 'greedy'.
+        column_size (str, optional): column with the size of each video
+                                     inside the joined file.
+                                     Defaults to 'file_size'.
+
+    Returns:
+        list: list of chunk_videos. Chunk_videos are list of video path_file
+    """
+
+    max_size_bytes = max_size_mb * 1024 ** 2
+    if duration_limit != "00:00:00.00":
+        duration_limit_us = int(
+            round(float_seconds_from_string(duration_limit) * 1_000_000)
+        )
+    else:
+        # symbolic limit not attainable
+        duration_limit_us = np.iinfo(np.int64).max // 2
+
+    df["file_path"] = df["file_path_folder"] + "\\" + df["file_name"]
+
+    # group codes in order of first appearance. The stable sort keeps the
+    # df order inside each group
+    array_group_code, array_group = pd.factorize(df["group_encode"])
+    array_order = np.argsort(array_group_code, kind="stable")
+    array_group_code = array_group_code[array_order]
+    array_path = df["file_path"].to_numpy()[array_order]
+    array_size = df[column_size].to_numpy(dtype=np.int64)[array_order]
+    array_duration_us = get_array_duration_us(df["duration"])[array_order]
+
+    array_group_start = np.flatnonzero(
+        np.diff(array_group_code, prepend=-1)
+    )
+    array_group_bound = np.append(array_group_start, len(array_group_code))
+    array_group_end = np.repeat(array_group_bound[1:],
+                                np.diff(array_group_bound))
+
+    if join_planner == "balanced":
+        function_chunk_end = get_list_chunk_end_balanced
+    else:
+        function_chunk_end = get_list_chunk_end
+    list_chunk_end, position_error = function_chunk_end(
+        array_size, array_duration_us, array_group_end,
+        max_size_bytes, duration_limit_us
+    )
+    if list_chunk_end is None:
+        logging.error(
+            "There is a video bigger than limit, " + "after split process."
+        )
+        logging.error(df.iloc[array_order[position_error]])
+        sys.exit()
+
+    list_final = []
+    start = 0
+    for end in list_chunk_end:
+        list_final.append(array_path[start:end].tolist())
+        start = end
+
+    array_chunk_group = array_group_code[np.array(list_chunk_end, dtype=int)
+                                         - 1]
+    array_qt_chunk = np.bincount(array_chunk_group,
+                                 minlength=len(array_group))
+    for group_no, qt_chunk in zip(array_group, array_qt_chunk):
+        logging.info(f"group {group_no} will generate {qt_chunk} videos")
+    return list_final
+
+
+def join_videos_process_df(
+    df,
+    list_dict_videos_duration,
+    transition_effect=False,
+):
+    """"update video_details dataframe with columns:
+         file_output, video_duration_real"
+
+    Args:
+        df (dataframe): video_details dataframe. Required columns:
+                    file_path
+        list_dict_videos_duration (list):
+            list of dicts, with keys:
+                file_path_origin (string). file_path of original video,
+                duration_real (string). real video duration, Format hh:mm:ss
+        transition_effect {bol}: True if list_file_path contain
+                                 transition effects
+
+    Returns:
+        dataframe: dataframe updated with columns:
+                    file_output, video_duration_real
+    """
+
+    # add column video_duration_real
+    index_video_in_df = 0
+    if transition_effect:
+        transition_duration_str = list_dict_videos_duration[0]["duration_real"]
+        # convert to timedelta
+        transition_duration = strptimedelta_hh_mm_ss_ms(
+            str_hh_mm_ss_ms=transition_duration_str
+        )
+    else:
+        transition_duration = strptimedelta_hh_mm_ss_ms(str_hh_mm_ss_ms="00:00:00")
+
+    for dict_videos_duration in list_dict_videos_duration:
+        file_path_origin = dict_videos_duration["file_path_origin"]
+
+        mask_file = df["file_path"].isin([file_path_origin])
+        # if video_path is in dataframe, instead of being a transition video
+        if mask_file.any():
+            dict_videos_duration = update_dict_videos_duration(
+                dict_videos_duration, index_video_in_df, transition_duration
+            )
+
+            index_video_in_df += 1
+            string_video_duration_real = dict_videos_duration["duration_real"]
+
+            df.loc[mask_file, "video_duration_real"] = string_video_duration_real
+    return df
+
+
+def join_videos_update_col_duration(df):
+    """rename columns durations of video_details dataframe.
+        from 'duration' to 'video_origin_duration_pre_join'},
+        from 'video_duration_real' to 'duration'
+    If a previous join already renamed them, e.g. before the retry of
+    quarantined blocks, the new 'video_duration_real' is merged into
+    'duration'
+
+    Args:
+        df (dataframe): video_details with columns:
+                            duration, video_duration_real
+
+    Returns:
+        dataframe: video_details with duration columns renamed
+    """
+
+    if "video_origin_duration_pre_join" in df.columns:
+        if "video_duration_real" in df.columns:
+            serie_duration_real = df["video_duration_real"]
+            mask_joined = serie_duration_real.notna() & ~(
+                serie_duration_real.astype(str).isin([""])
+            )
+            df["duration"] = df["duration"].where(
+                ~mask_joined, serie_duration_real
+            )
+            df = df.drop(columns=["video_duration_real"])
+        return df
+
+    list_dict_replace = [
+        {"duration": "video_origin_duration_pre_join"},
+        {"video_duration_real": "duration"},
+    ]
+    for dict_ in list_dict_replace:
+        df = df.rename(columns=dict_)
+    return df
+
+
+def transition_update_chunk_videos(list_chunk_videos):
+    """includes transition effect in the video join plan
+
+    Args:
+        list_chunk_videos (list): list of groups.
+                                  Each group is a list of video path_files
+    """
+
+    def get_transition_path_file(video_path_file):
+
+        video_resolution = get_video_resolution_format(video_path_file)
+        dict_transition_resolution = get_dict_transition_resolution()
+        transition_path_file = dict_transition_resolution[video_resolution]
+        return transition_path_file
+
+    list_chunk_videos_update = []
+    for chunk_videos in list_chunk_videos:
+        # find transition_path_file based on the resolution of first video_path
+        video_path_file = chunk_videos[0]
+        transition_path_file = get_transition_path_file(video_path_file)
+
+        for index, video_path in enumerate(chunk_videos):
+            if index == 0:
+                chunk_videos_update = []
+                chunk_videos_update.append(transition_path_file)
+            chunk_videos_update.append(video_path)
+            chunk_videos_update.append(transition_path_file)
+        list_chunk_videos_update.append(chunk_videos_update)
+    return list_chunk_videos_update
+
+
+def strptimedelta_hh_mm_ss_ms(str_hh_mm_ss_ms):
+
+    hr, min, sec = map(float, str_hh_mm_ss_ms.split(":"))
+    duration_timedelta = datetime.timedelta(hours=hr, minutes=min, seconds=sec)
+    return duration_timedelta
+
+
+def ensure_transitions(list_chunk_videos):
+    """ensures that there is an appropriate transition, based on resolution,
+        for each chunk_videos
+
+    Args:
+        list_chunk_videos (list): list of chunk_videos.
+                                  Chunk_videos are list of video path_file
+    """
+
+    list_path_file_chunk_representatives = []
+    for chunk_videos in list_chunk_videos:
+        first_path_file = chunk_videos[0]
+        list_path_file_chunk_representatives.append(first_path_file)
+
+    check_transition_resolution(list_path_file_chunk_representatives)
+
+
+def do_videos_join(
+    list_file_path, file_path_output, path_folder_videos_cache,
+    join_mode="file", ts_workers=1, semaphore_cpu=None, semaphore_disk=None,
+):
+    """Process videos join from a list of video path
+
+    Args:
+        list_file_path (list): list of video path
+        join_mode (str, optional): 'file' or 'pipe'. Defaults to 'file'.
+        ts_workers (int, optional): parallel TS conversions. Defaults to 1.
+        semaphore_cpu (threading.BoundedSemaphore, optional): TS conversions
+            running at the same time in all the blocks. Defaults to None.
+        semaphore_disk (threading.BoundedSemaphore, optional): held while
+            the output is written. Defaults to None.
+
+    Returns:
+        list: dict with keys: file_path_origin, duration_real
+    """
+
+    # remove file_path_output if already exists
+    if os.path.exists(file_path_output):
+        os.remove(file_path_output)
+
+    if len(list_file_path) == 1:
+        # Block with 1 video is not necessary to join
+        single_video_file_path = list_file_path[0]
+        dict_videos_duration = get_dict_video_duration(
+            single_video_file_path, single_video_file_path
+        )
+        list_dict_videos_duration = [dict_videos_duration]
+
+        # reencoded and splitted videos are in the project folder, the
+        # parent of output_videos, and can share the inode of the output
+        path_folder_project = os.path.dirname(
+            os.path.dirname(os.path.abspath(file_path_output))
+        )
+        is_intermediate = os.path.abspath(single_video_file_path).startswith(
+            path_folder_project + os.sep
+        )
+        with semaphore_disk or contextlib.nullcontext():
+            place_file(single_video_file_path, file_path_output,
+                       allow_hardlink=is_intermediate)
+
+    else:
+        # make video join
+        list_dict_videos_duration = join_mp4(
+            list_file_path, file_path_output, path_folder_videos_cache,
+            join_mode, ts_workers, semaphore_cpu, semaphore_disk
+        )
+    return list_dict_videos_duration
+
+
+def get_video_nb_frames(dict_inf_ffprobe):
+    """
+    Returns:
+        int: nb_frames of the first video stream. None if not available
+    """
+
+    for stream in dict_inf_ffprobe.get("streams", []):
+        if stream.get("codec_type") == "video":
+            try:
+                return int(stream["nb_frames"])
+            except (KeyError, ValueError):
+                return None
+    return None
+
+
+def verify_join_output(file_output, list_file_path_to_join,
+                       list_dict_videos_duration):
+    """Check the streams of a joined video against its parts: the duration
+    must match the sum of the parts durations and, when the containers
+    report it, the video frames must match the sum of the parts frames.
+
+    Args:
+        file_output (str): path_file of the joined video
+        list_file_path_to_join (list): video path_file of the block
+        list_dict_videos_duration (list): dict with keys: file_path_origin,
+                                          duration_real
+
+    Returns:
+        str: reason of the failure. None if the joined video is consistent
+    """
+
+    if not os.path.isfile(file_output) or os.path.getsize(file_output) == 0:
+        return "joined video not created"
+
+    ffprobe_result = ffprobe(file_output)
+    if ffprobe_result.return_code != 0:
+        return f"ffprobe failed: {ffprobe_result.error.strip()}"
+    dict_inf_ffprobe = ffprobe_result.get_output_as_dict()
+
+    # duration sum
+    try:
+        float_duration = float(dict_inf_ffprobe["format"]["duration"])
+    except (KeyError, ValueError):
+        return "joined video without duration"
+    float_duration_parts = sum(
+        float_seconds_from_string(d["duration_real"])
+        for d in list_dict_videos_duration
+    )
+    tolerance = max(1.0, float_duration_parts * 0.01)
+    if abs(float_duration - float_duration_parts) > tolerance:
+        return (f"duration {float_duration:.2f}s, "
+                f"expected {float_duration_parts:.2f}s")
+
+    # video frames sum
+    nb_frames = get_video_nb_frames(dict_inf_ffprobe)
+    if nb_frames is None:
+        return None
+    list_nb_frames_parts = []
+    for file_path in list_file_path_to_join:
+        ffprobe_result = ffprobe(file_path)
+        if ffprobe_result.return_code != 0:
+            return None
+        list_nb_frames_parts.append(
+            get_video_nb_frames(ffprobe_result.get_output_as_dict())
+        )
+    if None in list_nb_frames_parts:
+        return None
+    nb_frames_parts = sum(list_nb_frames_parts)
+    tolerance = max(len(list_nb_frames_parts), nb_frames_parts * 0.01)
+    if abs(nb_frames - nb_frames_parts) > tolerance:
+        return f"{nb_frames} video frames, expected {nb_frames_parts}"
+    return None
+
+
+def quarantine_join_output(file_output):
+    """Move a joined video that failed the verification to the subfolder
+    'quarantine', next to the joined videos
+
+    Returns:
+        str: path_file in quarantine. None if there was no file to move
+    """
+
+    if not os.path.isfile(file_output):
+        return None
+    path_folder_quarantine = os.path.join(os.path.dirname(file_output),
+                                          "quarantine")
+    ensure_folder_existence([path_folder_quarantine])
+    path_file_quarantine = os.path.join(path_folder_quarantine,
+                                        os.path.basename(file_output))
+    os.replace(file_output, path_file_quarantine)
+    return path_file_quarantine
+
+
+def run_join_job(
+    list_file_path_to_join, file_output, path_folder_videos_cache,
+    semaphore_disk, join_mode="file", ts_workers=1,
+    join_attempts=3, join_retry_backoff=5, semaphore_cpu=None,
+):
+    """Join one video block in its own cache subfolder. Runs in a worker
+    thread, so it does not touch the report.
+
+    Args:
+        list_file_path_to_join (list): video path_file of the block
+        file_output (str): path_file of the joined video
+        path_folder_videos_cache (str): path_folder for cache data
+        semaphore_disk (threading.BoundedSemaphore): limits the blocks
+                                                     writing at the same time,
+                                                     held only while the
+                                                     output is written
+        join_mode (str, optional): 'file' or 'pipe'. Defaults to 'file'.
+        ts_workers (int, optional): parallel TS conversions. Defaults to 1.
+        join_attempts (int, optional): joins tried before the quarantine.
+                                       Defaults to 3.
+        join_retry_backoff (float, optional): seconds waited after the first
+                                              failure, doubled at each one.
+                                              Defaults to 5.
+        semaphore_cpu (threading.BoundedSemaphore, optional): limits the TS
+                                                              conversions of
+                                                              all the blocks.
+                                                              Defaults to
+                                                              None.
+
+    Returns:
+        tuple: list of dict with keys: file_path_origin, duration_real
+               (None if the block was quarantined); elapsed seconds
+    """
+
+    time_start = time.perf_counter()
+    file_name_output = os.path.splitext(os.path.basename(file_output))[0]
+    path_folder_cache_job = os.path.join(path_folder_videos_cache,
+                                         file_name_output)
+    ensure_folder_existence([path_folder_cache_job])
+
+    join_attempts = max(1, int(join_attempts))
+    for attempt in range(1, join_attempts + 1):
+        try:
+            # Do videos join
+            list_dict_videos_duration = do_videos_join(
+                list_file_path_to_join, file_output,
+                path_folder_cache_job,
+                join_mode,
+                ts_workers,
+                semaphore_cpu,
+                semaphore_disk,
+            )
+            msg_err = verify_join_output(file_output,
+                                         list_file_path_to_join,
+                                         list_dict_videos_duration)
+        except Exception as e:
+            logging.exception(e)
+            msg_err = f"{type(e).__name__}: {e}"
+
+        if msg_err is None:
+            break
+
+        logging.warning(f"Join attempt {attempt}/{join_attempts} failed. "
+                        f"{msg_err}. File: {file_output}")
+        if attempt < join_attempts:
+            time.sleep(join_retry_backoff * 2 ** (attempt - 1))
+    else:
+        path_file_quarantine = quarantine_join_output(file_output)
+        logging.error(f"Video block quarantined: {file_output}\n"
+                      f"Joined file moved to: {path_file_quarantine}")
+        list_dict_videos_duration = None
+
+    shutil.rmtree(path_folder_cache_job, ignore_errors=True)
+    return list_dict_videos_duration, time.perf_counter() - time_start
+
+
+def join_videos(
+    file_path_report,
+    max_size_mb,
+    filename_output,
+    path_folder_videos_joined,
+    path_folder_videos_cache,
+    start_index_output,
+    duration_limit="00:00:00.00",
+    transition_status=False,
+    join_mode="file",
+    ts_workers=1,
+    join_workers=1,
+    join_disk_slots=1,
+    join_cpu_slots=1,
+    join_attempts=3,
+    join_retry_backoff=5,
+    join_planner="greedy",
+):
+    """join videos according to column 'group_encode' in df dataframe
+
+    Args:
+        file_path_report (string): file path of video_details report.
+                                   Required columns:
+                                       [file_dolder, file_name, group_encode]
+        max_size_mb (int): max size of each block of videos joined
+        path_folder_videos_joined (str): destination path_folder
+                                          for grouped videos
+        path_folder_videos_cache (str): path_folder for cache data
+        start_index_output (int): initial number that the exported video files
+                                   will receive as a suffix
+        duration_limit (str): duration limit in format: hh:mm:ss.ms
+        transition_status (bol): true to activate transition effect
+        join_mode (str): 'file' to join by TS files in the cache folder,
+                         'pipe' to stream the TS remux without files
+        ts_workers (int): TS conversions running at the same time
+        join_workers (int): video blocks joined at the same time
+        join_disk_slots (int): video blocks writing at the same time
+        join_cpu_slots (int): TS conversions running at the same time,
+                              shared by all the blocks
+        join_attempts (int): joins tried before a block is quarantined
+        join_retry_backoff (float): seconds waited after the first failed
+                                    join of a block, doubled at each one
+        join_planner (str): 'greedy' or 'balanced' chunk planner
+
+    Returns:
+        dataframe: video_details dataframe updated with new columns:
+                    [file_output, video_origin_duration_pre_join]
+    """
+
+    def create_column_number_block_file_output(df,
+                                                list_chunk_videos,
+                                                start_index_output):
+
+        for index, chunk_videos in enumerate(list_chunk_videos):
+
+            mask = df["file_path"].isin(chunk_videos)
+
+            # add column number_block
+            df.loc[mask, "number_block"] = index + start_index_output
+
+            # add column file_output
+            file_count = index + start_index_output
+            file_name_output = f"{filename_output}-%03d.mp4" % file_count
+            file_path_output = os.path.join(path_folder_videos_joined,
+                                            file_name_output)
+            df.loc[mask, "file_output"] = file_path_output
+
+            # df.loc["file_path_output"] = os.path.abspath(file_path_output)
+
+        return df
+
+    def get_list_join_job(df):
+
+        # create mask to join
+        mask_df_to_join = df["join_done"].isin([0])
+
+        # filter df to join
+        df_to_join = df.loc[mask_df_to_join, :]
+
+        # one job per file_output, in the order of the join plan
+        list_join_job = []
+        for file_output, df_job in df_to_join.groupby("file_output",
+                                                      sort=False):
+            list_file_path = df_job['file_path'].to_list()
+            list_join_job.append([file_output, list_file_path])
+
+        return list_join_job
+
+    def mark_join_job_done(df, file_output):
+
+        mask = df['file_output'].isin([file_output])
+        df.loc[mask, 'join_done'] = 1
+        return df
+
+    def mark_join_job_quarantined(df, file_output):
+
+        mask = df['file_output'].isin([file_output])
+        df.loc[mask, 'join_done'] = -1
+        return df
+
+    df = job_state.load_report_state(file_path_report)
+    # apply jobs finished by an interrupted run
+    df = job_journal.compact_journal(df, file_path_report)
+
+    # if it's the first time running the join process
+    if "join_done" not in df.columns:
+        # Create columns: join_done, file_path, number_block, file_output
+        df['join_done'] = 0
+        df["file_path"] = df["file_path_folder"] + "\\" + df["file_name"]
+
+        # plan with the sizes expected inside the joined files
+        # before the first join, the TS remux of the duration correction
+        # calibrate the prediction
+        dict_size_model = size_model.load_model(file_path_report)
+        dict_size_model_ts = size_model.get_dict_model_ts(df)
+        df["file_size_predicted"] = size_model.get_serie_size_predicted(
+            df, dict_size_model, max_size_mb * 1024 ** 2, dict_size_model_ts
+        )
+        list_chunk_videos = get_list_chunk_videos(df,
+                                                  max_size_mb,
+                                                  duration_limit,
+                                                  join_planner,
+                                                  "file_size_predicted")
+
+        df = create_column_number_block_file_output(df,
+                                                    list_chunk_videos,
+                                                    start_index_output)
+
+        create_report_backup(df=df,
+                             path_file_report=file_path_report,
+                             tag="6_join_plan")
+        df.to_excel(file_path_report, index=False)
+        job_state.save_report_state(df, file_path_report)
+
+    # blocks quarantined by a previous run are tried again
+    mask_quarantined = df['join_done'].isin([-1])
+    if mask_quarantined.any():
+        logging.info(f"Retrying {mask_quarantined.sum()} quarantined videos")
+        df.loc[mask_quarantined, 'join_done'] = 0
+
+    # process the video blocks, join_workers at the same time
+    list_join_job = get_list_join_job(df)
+    join_workers = max(1, int(join_workers))
+    # the TS conversions of all blocks share the cpu slots, the writes of
+    # the joined files share the disk slots
+    semaphore_cpu = threading.BoundedSemaphore(max(1, int(join_cpu_slots)))
+    semaphore_disk = threading.BoundedSemaphore(max(1, int(join_disk_slots)))
+    with ThreadPoolExecutor(max_workers=join_workers) as executor:
+        dict_future_job = {}
+        for file_output, list_file_path in list_join_job:
+
+            # add transition effect if applicable
+            list_file_path_to_join = list_file_path.copy()
+            if transition_status:
+                list_file_path_to_join = \
+                    transition_update_chunk_videos([list_file_path])[0]
+
+            future = executor.submit(run_join_job,
+                                     list_file_path_to_join,
+                                     file_output,
+                                     path_folder_videos_cache,
+                                     semaphore_disk,
+                                     join_mode,
+                                     ts_workers,
+                                     join_attempts,
+                                     join_retry_backoff,
+                                     semaphore_cpu)
+            dict_future_job[future] = file_output
+
+        # the report, the journal and the size model are only changed by
+        # this thread
+        dict_size_model = size_model.load_model(file_path_report)
+        for future in as_completed(dict_future_job):
+            file_output = dict_future_job[future]
+            list_dict_videos_duration, elapsed_seconds = future.result()
+
+            if list_dict_videos_duration is None:
+                # keep the queue flowing, the block is retried next run
+                df = mark_join_job_quarantined(df, file_output)
+                index_rows = df.index[df['file_output'].isin([file_output])]
+                job_journal.record_job_done(df,
+                                            file_path_report,
+                                            'join_quarantine',
+                                            index_rows,
+                                            ['join_done'],
+                                            [file_output],
+                                            elapsed_seconds,
+                                            job_journal.LIST_COLUMN_KEY_FILE)
+                continue
+
+            # Update report
+            df = join_videos_process_df(
+                df,
+                list_dict_videos_duration,
+                transition_status,
+            )
+
+            df = mark_join_job_done(df, file_output)
+
+            # calibrate the size prediction with the real joined size.
+            # Transitions are not in the report and single videos are copied
+            mask_block = df['file_output'].isin([file_output])
+            if not transition_status and mask_block.sum() > 1:
+                dict_size_model = size_model.update_model(
+                    dict_size_model,
+                    df.loc[mask_block, :],
+                    os.path.getsize(file_output),
+                )
+                size_model.save_model(dict_size_model, file_path_report)
+
+            # Record the rows joined in the journal
+            index_rows = df.index[df['file_output'].isin([file_output])]
+            job_journal.record_job_done(df,
+                                        file_path_report,
+                                        'join',
+                                        index_rows,
+                                        ['video_duration_real', 'join_done'],
+                                        [file_output],
+                                        elapsed_seconds,
+                                        job_journal.LIST_COLUMN_KEY_FILE)
+
+            create_report_backup(df=df,
+                                 path_file_report=file_path_report,
+                                 tag="7_joined")
+
+    qt_quarantined = df['join_done'].isin([-1]).sum()
+    if qt_quarantined > 0:
+        logging.error(f"{qt_quarantined} videos in quarantined blocks "
+                      "(join_done = -1). Run the join again to retry them.")
+    logging.info("\nThere are no more videos to join")
+
+    df = job_journal.compact_journal(df, file_path_report)
+
+    # update col duration name after adjust by join
+    df = join_videos_update_col_duration(df)
+
+    return df
+
+
+def update_dict_videos_duration(dict_videos_duration, index, transition_duration):
+    """update video_duration key in dict, with duration if transition effects
+
+    Args:
+        dict_videos_duration (dict): required key 'duration_real'
+        index (int): index position in group videos
+        transition_duration (timedelta): video transition duration
+
+    Returns:
+        dict: dict_videos_duration updated
+    """
+
+    if index == 0:
+        plus_timedelta = transition_duration + transition_duration
+    else:
+        plus_timedelta = transition_duration
+
+    duration_pre_transition = dict_videos_duration["duration_real"]
+
+    duration_pre_transition_timedelta = strptimedelta_hh_mm_ss_ms(
+        str_hh_mm_ss_ms=duration_pre_transition
+    )
+
+    duration_pos_transition_timedelta = (
+        duration_pre_transition_timedelta + plus_timedelta
+    )
+
+    duration_pos_transition_str = timedelta_to_string(duration_pos_transition_timedelta)
+    dict_videos_duration["duration_real"] = duration_pos_transition_str
+    return dict_videos_duration
@@ -1,9 +1,13 @@
 import logging
 import os
 import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 import pandas as pd
 
+import job_journal
+import job_state
 import video_report
 from ffprobe_micro import ffprobe
 from utils_mass_videojoin import (
@@ -11,7 +15,31 @@ from utils_mass_videojoin import (
     exclude_all_files_from_folder,
     get_file_name_dest,
 )
-from video_tools import change_width_height_mp4, convert_mp4_wo_reencode
+from video_tools import (
+    change_width_height_mp4,
+    convert_mp4_audio_to_aac,
+    convert_mp4_wo_reencode,
+)
+
+
+# columns changed by update_file_report
+LIST_COLUMN_REENCODE_UPDATE = [
+    "file_path_folder",
+    "file_name",
+    "file_size",
+    "video_resolution",
+    "video_resolution_width",
+    "video_resolution_height",
+    "total_bitrate",
+    "video_bitrate",
+    "video_codec",
+    "video_profile",
+    "is_avc",
+    "audio_codec",
+    "duration",
+    "duration_seconds",
+    "reencode_done",
+]
 
 
 def logging_config():
@@ -65,35 +93,126 @@ def create_backup_metadata_columns(df):
     return df
 
 
-def get_next_video_to_reencode(path_file_report):
+def get_df_to_reencode(df):
+    """
+    Args:
+        df (dataframe): video_details dataframe
 
-    # load dataframe
-    try:
-        df = pd.read_excel(path_file_report, engine="openpyxl")
-    except Exception as e:
-        logging.error(f"Can't open file: {path_file_report}")
-        logging.error(e)
+    Returns:
+        dataframe: rows marked to reencode and not reencoded yet
+    """
 
-    # create mask to reencode
-    mask_df_to_reencode = ~df["video_resolution_to_change"].isna()
+    serie_resolution_to_change = df["video_resolution_to_change"]
+    mask_df_to_reencode = ~(
+        serie_resolution_to_change.isna()
+        | serie_resolution_to_change.isin([""])
+    )
     mask_df_reencode_not_done = df["reencode_done"].isin([0])
-    mask_df_to_reencode = mask_df_to_reencode & mask_df_reencode_not_done
+    return df.loc[mask_df_to_reencode & mask_df_reencode_not_done, :]
 
-    # filter df to reencode
-    df_to_reencode = df.loc[mask_df_to_reencode, :]
 
-    # check if there is videos to reencode. Return False if note
-    qt_videos_to_reencode = df_to_reencode.shape[0]
-    if qt_videos_to_reencode == 0:
-        return False
+def get_serie_reencode_cost(df):
+    """Estimate the work of each reencode as duration x pixels of the
+    output resolution. Reencodes that keep the video stream, by column
+    reencode_mode, cost only their duration
+
+    Args:
+        df (dataframe): columns: duration_seconds, video_resolution_to_change.
+                        Optional: reencode_mode
+
+    Returns:
+        serie: estimated cost. 0 when it can't be estimated
+    """
+
+    df_resolution = (
+        df["video_resolution_to_change"]
+        .astype(str)
+        .str.split("x", n=1, expand=True)
+        .reindex(columns=[0, 1])
+    )
+    serie_pixels = pd.to_numeric(df_resolution[0], errors="coerce") * \
+        pd.to_numeric(df_resolution[1], errors="coerce")
+    serie_duration = pd.to_numeric(df["duration_seconds"], errors="coerce")
+    serie_cost = serie_duration * serie_pixels
+    # without video encode, the cost follows only the duration
+    if "reencode_mode" in df.columns:
+        mask_wo_video_encode = df["reencode_mode"].isin(["copy", "audio"])
+        serie_cost[mask_wo_video_encode] = serie_duration[mask_wo_video_encode]
+    return serie_cost.fillna(0)
+
+
+def sort_df_longest_first(df_to_reencode):
+    """Order the reencodes from the most costly, so a long video at the end
+    of the report doesn't run alone after all the others. The report and
+    the output files keep their order
+
+    Args:
+        df_to_reencode (dataframe): from get_df_to_reencode
+
+    Returns:
+        dataframe: df_to_reencode sorted by get_serie_reencode_cost
+    """
+
+    serie_cost = get_serie_reencode_cost(df_to_reencode)
+    list_index_sorted = serie_cost.sort_values(
+        ascending=False, kind="stable"
+    ).index
+    return df_to_reencode.loc[list_index_sorted, :]
+
+
+def get_threads_per_reencode(reencode_workers):
+    """Share the cpus between the reencodes running at the same time
+
+    Args:
+        reencode_workers (int): reencodes running at the same time
+
+    Returns:
+        int: value for the ffmpeg -threads of each reencode
+    """
 
-    # get first line as dict
-    df_to_reencode = df_to_reencode.reset_index(drop=True)
-    dict_first_line = df_to_reencode.loc[0, :]
-    return dict_first_line
+    cpu_count = os.cpu_count() or 1
+    return max(1, cpu_count // max(1, reencode_workers))
 
 
-def reencode_video(dict_, path_folder_encoded):
+def get_path_file_reencoded(dict_, path_folder_encoded):
+    """
+    Args:
+        dict_ (dataframe): columns: [file_path_folder_origin,
+                                     file_name_origin]
+        path_folder_encoded (str): path_folder destination for reencoded videos
+
+    Returns:
+        str: absolute path_file of the reencoded video
+    """
+
+    file_name_dest = get_file_name_dest(
+        dict_["file_path_folder_origin"],
+        dict_["file_name_origin"],
+        "reencode_",
+        "mp4",
+    )
+    return os.path.join(os.path.abspath(path_folder_encoded), file_name_dest)
+
+
+def remove_reencode_interrupted(path_file_report):
+    """Remove the outputs of the reencodes that were running when the last
+    run was interrupted. Their rows keep reencode_done = 0, so they are
+    reencoded again
+
+    Args:
+        path_file_report (str): path_file of video_details.xlsx
+    """
+
+    list_path_file_interrupted = job_journal.get_list_output_interrupted(
+        path_file_report, "reencode"
+    )
+    for path_file in list_path_file_interrupted:
+        if os.path.isfile(path_file):
+            logging.info(f"Removing interrupted reencode: {path_file}")
+            os.remove(path_file)
+
+
+def reencode_video(dict_, path_folder_encoded, threads=0):
     """reencode videos
 
     Args:
@@ -101,6 +220,7 @@ def reencode_video(dict_, path_folder_encoded):
                                      file_path_folder_origin,
                                      file_name_origin]
         path_folder_encoded (str): path_folder destination for reencoded videos
+        threads (int, optional): ffmpeg encoder threads. 0 for all the cpus
     Return:
         (boolean): False if error.
     """
@@ -135,21 +255,52 @@ def reencode_video(dict_, path_folder_encoded):
 
     video_codec = dict_["video_codec"]
     audio_codec = dict_["audio_codec"]
-    video_height = dict_["video_resolution_height"]
-    video_width = dict_["video_resolution_width"]
-    if (
+    # the report may hold the resolution as number or text
+    video_height = str(dict_["video_resolution_height"])
+    video_width = str(dict_["video_resolution_width"])
+    is_video_ok = (
         video_codec == "h264"
-        and audio_codec == "aac"
         and video_height == size_height
         and video_width == size_width
-    ):
+    )
+    if is_video_ok and audio_codec == "aac":
         convert_mp4_wo_reencode(path_file_origin, path_file_dest)
+    elif is_video_ok:
+        convert_mp4_audio_to_aac(path_file_origin, path_file_dest)
     else:
         change_width_height_mp4(
-            path_file_origin, size_height, size_width, path_file_dest
+            path_file_origin, size_height, size_width, path_file_dest, threads
         )
 
 
+def run_reencode_job(dict_, path_folder_encoded, threads=0,
+                     path_file_report=None):
+    """Reencode one video in a worker thread. Its start is recorded in the
+    journal, so an interrupted run can find the output left half written
+
+    Args:
+        dict_ (dataframe): report row, labeled with its df index
+        path_folder_encoded (str): path_folder destination for reencoded videos
+        threads (int, optional): ffmpeg encoder threads. 0 for all the cpus
+        path_file_report (str, optional): path_file of video_details.xlsx.
+                                          None to not record the start
+
+    Returns:
+        tuple: return of reencode_video, elapsed seconds
+    """
+
+    if path_file_report is not None:
+        job_journal.record_job_started(
+            path_file_report,
+            "reencode",
+            [dict_.name],
+            [get_path_file_reencoded(dict_, path_folder_encoded)],
+        )
+    time_start = time.perf_counter()
+    return_reencode_video = reencode_video(dict_, path_folder_encoded, threads)
+    return return_reencode_video, time.perf_counter() - time_start
+
+
 def ask_for_delete_old_videos_encode(path_folder_encoded):
 
     for _, _, files in os.walk(path_folder_encoded):
@@ -175,13 +326,7 @@ def ask_for_delete_old_videos_encode(path_folder_encoded):
                 pass
 
 
-def update_file_report(path_file_report, dict_video_data, path_folder_encoded):
-
-    try:
-        df = pd.read_excel(path_file_report, engine="openpyxl")
-    except Exception as e:
-        logging.error(f"Can't open file: {path_file_report}")
-        logging.error(e)
+def update_file_report(df, dict_video_data, path_folder_encoded):
 
     # find path_folder_dest and path_file_dest
     file_folder_origin = dict_video_data["file_path_folder_origin"]
@@ -225,12 +370,14 @@ def update_file_report(path_file_report, dict_video_data, path_folder_encoded):
 
     df.loc[index_video, "file_size"] = file_size
     df.loc[index_video, "video_resolution"] = video_resolution_to_change
-    df.loc[
-        index_video, "video_resolution_width"
-    ] = video_resolution_to_change.split("x")[0]
-    df.loc[
-        index_video, "video_resolution_height"
-    ] = video_resolution_to_change.split("x")[1]
+    # keep the type of the columns, number or text
+    for column_name, size in zip(
+        ["video_resolution_width", "video_resolution_height"],
+        video_resolution_to_change.split("x"),
+    ):
+        if pd.api.types.is_numeric_dtype(df[column_name]):
+            size = int(size)
+        df.loc[index_video, column_name] = size
 
     # get video metadata
     dict_inf_ffprobe = {}
@@ -251,52 +398,140 @@ def update_file_report(path_file_report, dict_video_data, path_folder_encoded):
     return df
 
 
-def make_reencode(path_file_report, path_folder_videos_encoded):
+def make_reencode(
+    path_file_report, path_folder_videos_encoded, reencode_workers=1
+):
+    """Reencode the videos marked in column video_resolution_to_change
+
+    Args:
+        path_file_report (str): path_file of video_details.xlsx
+        path_folder_videos_encoded (str): destination of the reencodes
+        reencode_workers (int, optional): reencodes running at the same time.
+                                          The cpus are shared between them
+
+    Returns:
+        dataframe: video_details dataframe updated
+    """
 
     path_folder_encoded = path_folder_videos_encoded
 
     ask_for_delete_old_videos_encode(path_folder_encoded)
 
-    df = pd.read_excel(path_file_report, engine="openpyxl")
+    # reencodes cut by an interrupted run are started over
+    remove_reencode_interrupted(path_file_report)
+
+    df = job_state.load_report_state(path_file_report)
+    # apply jobs finished by an interrupted run
+    df = job_journal.compact_journal(df, path_file_report)
     # Ensure creation of column 'reencode_done'.
     if "reencode_done" not in df.columns:
         df["reencode_done"] = 0
         df = create_backup_metadata_columns(df)
         # Save reports
         df.to_excel(path_file_report, index=False)
+        job_state.save_report_state(df, path_file_report)
 
     create_report_backup(
         df=df, path_file_report=path_file_report, tag="2_reencode"
     )
 
-    need_reencode = True
-    while need_reencode:
-        return_next_video_to_reencode = get_next_video_to_reencode(
-            path_file_report
-        )
-        if return_next_video_to_reencode is False:
-            logging.info("\nThere are no videos to reencode")
-            need_reencode = False
-            continue
-
-        # run reencode
-        dict_video_data = return_next_video_to_reencode
-        return_reencode_video = reencode_video(
-            dict_video_data, path_folder_encoded
-        )
-        # if fails, terminate
-        if return_reencode_video is False:
-            sys.exit()
-            return
-
-        # after reencode, update metadata in report, with new videos generated
-        df = update_file_report(
-            path_file_report, dict_video_data, path_folder_encoded
-        )
+    # longest job first, to reduce the time of the whole queue
+    df_to_reencode = sort_df_longest_first(get_df_to_reencode(df))
+    if df_to_reencode.shape[0] == 0:
+        logging.info("\nThere are no videos to reencode")
+        return df
+
+    reencode_workers = max(1, int(reencode_workers))
+    threads = get_threads_per_reencode(reencode_workers)
+    logging.info(
+        f"Reencoding {df_to_reencode.shape[0]} videos, "
+        f"{reencode_workers} at the same time, {threads} threads each"
+    )
 
-        # Save reports
-        df.to_excel(path_file_report, index=False)
-        create_report_backup(
-            df=df, path_file_report=path_file_report, tag="2_reencode"
-        )
+    reencode_failed = False
+    with ThreadPoolExecutor(max_workers=reencode_workers) as executor:
+        try:
+            dict_future_index = {}
+            for index_video, dict_video_data in df_to_reencode.iterrows():
+                future = executor.submit(
+                    run_reencode_job,
+                    dict_video_data,
+                    path_folder_encoded,
+                    threads,
+                    path_file_report,
+                )
+                dict_future_index[future] = index_video
+
+            # the report is only changed by this thread. The workers only add
+            # the start of their jobs to the journal
+            set_future_pending = set(dict_future_index)
+            while set_future_pending:
+                set_future_done, set_future_pending = wait(
+                    set_future_pending, return_when=FIRST_COMPLETED
+                )
+                # reencodes cancelled after a failure never complete
+                set_future_pending = {
+                    future
+                    for future in set_future_pending
+                    if not future.cancelled()
+                }
+                for future in set_future_done:
+                    if future.cancelled():
+                        continue
+                    index_video = dict_future_index[future]
+                    dict_video_data = df_to_reencode.loc[index_video, :]
+                    try:
+                        return_reencode_video, elapsed_seconds = \
+                            future.result()
+                    except Exception as e:
+                        logging.exception(e)
+                        return_reencode_video = False
+
+                    # if fails, drop the queued reencodes, record the running
+                    # ones and terminate
+                    if return_reencode_video is False:
+                        reencode_failed = True
+                        executor.shutdown(wait=False, cancel_futures=True)
+                        set_future_pending = {
+                            future
+                            for future in set_future_pending
+                            if not future.cancelled()
+                        }
+                        continue
+
+                    # after reencode, update metadata in report, with new video
+                    df = update_file_report(
+                        df, dict_video_data, path_folder_encoded
+                    )
+
+                    # Record the updated row in the journal
+                    path_file_dest = os.path.join(
+                        df.at[index_video, "file_path_folder"],
+                        df.at[index_video, "file_name"],
+                    )
+                    job_journal.record_job_done(
+                        df,
+                        path_file_report,
+                        "reencode",
+                        [index_video],
+                        LIST_COLUMN_REENCODE_UPDATE,
+                        [path_file_dest],
+                        elapsed_seconds,
+                    )
+                    create_report_backup(
+                        df=df,
+                        path_file_report=path_file_report,
+                        tag="2_reencode",
+                    )
+        except BaseException:
+            # sys.exit of update_file_report or Ctrl+C: drop the queued
+            # reencodes, instead of running them all before leaving
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    if reencode_failed:
+        sys.exit()
+
+    logging.info("\nThere are no videos to reencode")
+    df = job_journal.compact_journal(df, path_file_report)
     return df
@@ -171,7 +171,7 @@ def get_list_dict_path_file_mb_limit(df, size_limit,
         # col mb_limit: convert size_split from bytes to mb
         df_to_split['mb_limit'] = df_to_split['size_split'] // (1024 ** 2)
     else:
-        df_to_split['mb_limit'] = df_to_split['size_limit'] // (1024 ** 2)
+        df_to_split['mb_limit'] = size_limit // (1024 ** 2)
 
     list_dict = []
     for _, row in df_to_split.iterrows():
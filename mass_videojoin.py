@@ -5,32 +5,33 @@
     A smart tool to optimize and make turbo join in a massive video collection
 """
 
-import datetime
 import json
 import logging
 import os
-import shutil
-import sys
 from configparser import ConfigParser
 
 import pandas as pd
 import unidecode
 
 import make_reencode
+import pipeline_dag
+import probe_cache
+import ts_cache
 import video_report
+from make_join import get_video_details_with_group, join_videos
 from make_split import search_to_split_videos
-from reencode_plan import prefill
-from transition import (check_transition_resolution,
-                        get_dict_transition_resolution,
-                        get_video_resolution_format)
+from reencode_plan import prefill, prefill_utils
 from utils_mass_videojoin import (create_report_backup,
+                                  ensure_folder_existence,
                                   exclude_all_files_from_folder,
-                                  get_folder_script_path, get_serie_sub_folder,
+                                  export_report_backup,
+                                  get_folder_script_path,
+                                  get_list_backup_tag,
+                                  get_transition_effect_status,
                                   normalize_string, sort_df_column_from_list,
                                   sort_human, time_is_hh_mm_ss_ms)
-from video_tools import (float_seconds_from_string, float_seconds_to_string,
-                         get_dict_video_duration, get_duration, join_mp4,
-                         timedelta_to_string)
+from video_tools import (convert_to_ts_cached, float_seconds_from_string,
+                         float_seconds_to_string, get_duration)
 
 
 def logging_config():
@@ -82,132 +83,6 @@ def df_sort_human(df, key_column_name):
     return df
 
 
-def set_mark_group_encode(df):
-
-    df["key_join_checker"] = (
-        df["audio_codec"]
-        + "-"
-        + df["video_codec"]
-        + "-"
-        + df["video_resolution_width"].astype(str)
-        + "-"
-        + df["video_resolution_height"].astype(str)
-    )
-    serie_group_encode_bool = df["key_join_checker"] != df["key_join_checker"].shift(1)
-    return serie_group_encode_bool
-
-
-def set_mask_group_per_folder(serie_folder_path):
-
-    serie_first_column = get_serie_sub_folder(serie_folder_path)
-    df_first_column = serie_first_column.to_frame("folder")
-    df_first_column["folder_prior"] = df_first_column["folder"].shift(1)
-    serie_change_folder_bool = (
-        df_first_column["folder_prior"] != df_first_column["folder"]
-    )
-    return serie_change_folder_bool
-
-
-def get_serie_group(serie_change_bool):
-    """
-    from boolean serie, make cumulative sum returning serie int
-    true, false, false, true, false
-    1, 1, 1, 2, 2
-    """
-
-    return serie_change_bool.cumsum()
-
-
-def get_video_details_with_group(df):
-
-    # set mask group per encode
-    serie_group_encode_bool = set_mark_group_encode(df)
-
-    # set mask group per folder
-    serie_folder_path = df["file_path_folder_origin"]
-    serie_change_folder_bool = set_mask_group_per_folder(serie_folder_path)
-
-    # agregate group masks
-    serie_change_bool = serie_group_encode_bool | serie_change_folder_bool
-
-    # create group_encode column
-    df["group_encode"] = get_serie_group(serie_change_bool)
-    return df
-
-
-def get_list_chunk_videos_from_group(
-    df, group_no, max_size_mb, duration_limit="00:00:00.00"
-):
-
-    max_size_bytes = max_size_mb * 1024 ** 2
-    mask = df["group_encode"].isin([int(group_no)])
-
-    df["file_path"] = df["file_path_folder"] + "\\" + df["file_name"]
-
-    df_group = df.loc[mask, :]
-    df_group["float_duration"] = df_group["duration"].apply(float_seconds_from_string)
-
-    if duration_limit != "00:00:00.00":
-        float_duration_limit = float_seconds_from_string(duration_limit)
-    else:
-        # symbolic limit not attainable
-        float_duration_limit = float_seconds_from_string("99:99:99")
-
-    list_chunk_videos = []
-    chunk_size = 0
-    chunk_duration = 0
-    list_videos = []
-    for _, row in df_group.iterrows():
-        chunk_size_after = chunk_size + row["file_size"]
-        chunk_duration_after = chunk_duration + row["float_duration"]
-
-        if (chunk_size_after > max_size_bytes) or (
-            chunk_duration_after > float_duration_limit
-        ):
-
-            logging.info(f"join video from {len(list_videos)} files")
-            if len(list_videos) == 0:
-                logging.error(
-                    "There is a video bigger than limit, " + "after split process."
-                )
-                logging.error(row)
-                sys.exit()
-            list_chunk_videos.append(list_videos)
-
-            list_videos = []
-            chunk_size = 0
-            chunk_duration = 0
-
-        list_videos.append(row["file_path"])
-        chunk_size += row["file_size"]
-        chunk_duration += row["float_duration"]
-
-    if len(list_videos) > 0:
-        logging.info(f"join video from {len(list_videos)} files")
-        list_chunk_videos.append(list_videos)
-        list_videos = []
-
-    logging.info(
-        f"group {group_no} will generate " + f"{len(list_chunk_videos)} videos"
-    )
-    return list_chunk_videos
-
-
-def get_list_chunk_videos(df, max_size_mb, duration_limit="00:00:00.00"):
-
-    list_group = df["group_encode"].unique().tolist()
-    list_final = []
-
-    for group_no in list_group:
-        group_no = str(group_no)
-        list_chunk_videos = get_list_chunk_videos_from_group(
-            df, group_no, max_size_mb, duration_limit
-        )
-        list_final += list_chunk_videos
-        print("")
-    return list_final
-
-
 def get_path_folder_cache(path_dir):
 
     dir_name_normalize = get_folder_name_normalized(path_dir)
@@ -219,361 +94,16 @@ def get_path_folder_cache(path_dir):
     return path_folder_cache
 
 
-def join_videos_process_df(
-    df,
-    list_dict_videos_duration,
-    transition_effect=False,
-):
-    """"update video_details dataframe with columns:
-         file_output, video_duration_real"
-
-    Args:
-        df (dataframe): video_details dataframe. Required columns:
-                    file_path
-        list_dict_videos_duration (list):
-            list of dicts, with keys:
-                file_path_origin (string). file_path of original video,
-                duration_real (string). real video duration, Format hh:mm:ss
-        transition_effect {bol}: True if list_file_path contain
-                                 transition effects
-
-    Returns:
-        dataframe: dataframe updated with columns:
-                    file_output, video_duration_real
-    """
-
-    # add column video_duration_real
-    index_video_in_df = 0
-    if transition_effect:
-        transition_duration_str = list_dict_videos_duration[0]["duration_real"]
-        # convert to timedelta
-        transition_duration = strptimedelta_hh_mm_ss_ms(
-            str_hh_mm_ss_ms=transition_duration_str
-        )
-    else:
-        transition_duration = strptimedelta_hh_mm_ss_ms(str_hh_mm_ss_ms="00:00:00")
-
-    for dict_videos_duration in list_dict_videos_duration:
-        file_path_origin = dict_videos_duration["file_path_origin"]
-
-        mask_file = df["file_path"].isin([file_path_origin])
-        # if video_path is in dataframe, instead of being a transition video
-        if mask_file.any():
-            dict_videos_duration = update_dict_videos_duration(
-                dict_videos_duration, index_video_in_df, transition_duration
-            )
-
-            index_video_in_df += 1
-            string_video_duration_real = dict_videos_duration["duration_real"]
-
-            df.loc[mask_file, "video_duration_real"] = string_video_duration_real
-    return df
-
-
-def join_videos_update_col_duration(df):
-    """rename columns durations of video_details dataframe.
-        from 'duration' to 'video_origin_duration_pre_join'},
-        from 'video_duration_real' to 'duration'
-
-    Args:
-        df (dataframe): video_details with columns:
-                            duration, video_duration_real
-
-    Returns:
-        dataframe: video_details with duration columns renamed
-    """
-
-    list_dict_replace = [
-        {"duration": "video_origin_duration_pre_join"},
-        {"video_duration_real": "duration"},
-    ]
-    for dict_ in list_dict_replace:
-        df = df.rename(columns=dict_)
-    return df
-
-
-def transition_update_chunk_videos(list_chunk_videos):
-    """includes transition effect in the video join plan
-
-    Args:
-        list_chunk_videos (list): list of groups.
-                                  Each group is a list of video path_files
-    """
-
-    def get_transition_path_file(video_path_file):
-
-        video_resolution = get_video_resolution_format(video_path_file)
-        dict_transition_resolution = get_dict_transition_resolution()
-        transition_path_file = dict_transition_resolution[video_resolution]
-        return transition_path_file
-
-    list_chunk_videos_update = []
-    for chunk_videos in list_chunk_videos:
-        # find transition_path_file based on the resolution of first video_path
-        video_path_file = chunk_videos[0]
-        transition_path_file = get_transition_path_file(video_path_file)
-
-        for index, video_path in enumerate(chunk_videos):
-            if index == 0:
-                chunk_videos_update = []
-                chunk_videos_update.append(transition_path_file)
-            chunk_videos_update.append(video_path)
-            chunk_videos_update.append(transition_path_file)
-        list_chunk_videos_update.append(chunk_videos_update)
-    return list_chunk_videos_update
-
-
-def strptimedelta_hh_mm_ss_ms(str_hh_mm_ss_ms):
-
-    hr, min, sec = map(float, str_hh_mm_ss_ms.split(":"))
-    duration_timedelta = datetime.timedelta(hours=hr, minutes=min, seconds=sec)
-    return duration_timedelta
-
-
-def ensure_transitions(list_chunk_videos):
-    """ensures that there is an appropriate transition, based on resolution,
-        for each chunk_videos
-
-    Args:
-        list_chunk_videos (list): list of chunk_videos.
-                                  Chunk_videos are list of video path_file
-    """
-
-    list_path_file_chunk_representatives = []
-    for chunk_videos in list_chunk_videos:
-        first_path_file = chunk_videos[0]
-        list_path_file_chunk_representatives.append(first_path_file)
-
-    check_transition_resolution(list_path_file_chunk_representatives)
-
-
-def do_videos_join(
-    list_file_path, file_path_output, path_folder_videos_cache,
-):
-    """Process videos join from a list of video path
-
-    Args:
-        list_file_path (list): list of video path
-
-    Returns:
-        list: dict with keys: file_path_origin, duration_real
-    """
-
-    # remove file_path_output if already exists
-    if os.path.exists(file_path_output):
-        os.remove(file_path_output)
-
-    if len(list_file_path) == 1:
-        # Block with 1 video is not necessary to join
-        single_video_file_path = list_file_path[0]
-        dict_videos_duration = get_dict_video_duration(
-            single_video_file_path, single_video_file_path
-        )
-        list_dict_videos_duration = [dict_videos_duration]
-
-        shutil.copyfile(list_file_path[0], file_path_output)
-
-    else:
-        # make video join
-        list_dict_videos_duration = join_mp4(
-            list_file_path, file_path_output, path_folder_videos_cache
-        )
-    return list_dict_videos_duration
-
-
-def join_videos(
-    file_path_report,
-    max_size_mb,
-    filename_output,
-    path_folder_videos_joined,
-    path_folder_videos_cache,
-    start_index_output,
-    duration_limit="00:00:00.00",
-    transition_status=False,
-):
-    """join videos according to column 'group_encode' in df dataframe
-
-    Args:
-        file_path_report (string): file path of video_details report.
-                                   Required columns:
-                                       [file_dolder, file_name, group_encode]
-        max_size_mb (int): max size of each block of videos joined
-        path_folder_videos_joined (str): destination path_folder
-                                          for grouped videos
-        path_folder_videos_cache (str): path_folder for cache data
-        start_index_output (int): initial number that the exported video files
-                                   will receive as a suffix
-        duration_limit (str): duration limit in format: hh:mm:ss.ms
-        transition_status (bol): true to activate transition effect
-
-    Returns:
-        dataframe: video_details dataframe updated with new columns:
-                    [file_output, video_origin_duration_pre_join]
-    """
-
-    def create_column_number_block_file_output(df,
-                                                list_chunk_videos,
-                                                start_index_output):
-
-        for index, chunk_videos in enumerate(list_chunk_videos):
-
-            mask = df["file_path"].isin(chunk_videos)
-
-            # add column number_block
-            df.loc[mask, "number_block"] = index + start_index_output
-
-            # add column file_output
-            file_count = index + start_index_output
-            file_name_output = f"{filename_output}-%03d.mp4" % file_count
-            file_path_output = os.path.join(path_folder_videos_joined,
-                                            file_name_output)
-            df.loc[mask, "file_output"] = file_path_output
-
-            # df.loc["file_path_output"] = os.path.abspath(file_path_output)
-
-        return df
-
-    def get_next_join_job(file_path_report):
-
-        # load dataframe
-        try:
-            df = pd.read_excel(file_path_report, engine="openpyxl")
-        except Exception as e:
-            logging.error(f"Can't open file: {file_path_report}")
-            logging.error(e)
-
-        # create mask to join
-        mask_df_to_join = df["join_done"].isin([0])
-
-        # filter df to join
-        df_to_join = df.loc[mask_df_to_join, :].reset_index(drop=True)
-        if df_to_join.shape[0] == 0:
-            return False
-
-        # check if there is videos to join. Return False if note
-        file_output = df_to_join.loc[0, "file_output"]
-
-        mask_job = df_to_join['file_output'].isin([file_output])
-        list_file_path = df_to_join.loc[mask_job, 'file_path'].to_list()
-
-        list_join_job = [file_output, list_file_path]
-
-        return list_join_job
-
-    def mark_join_job_done(df, file_output):
-
-        mask = df['file_output'].isin([file_output])
-        df.loc[mask, 'join_done'] = 1
-        return df
-
-    df = pd.read_excel(file_path_report, engine="openpyxl")
-
-    # if it's the first time running the join process
-    if "join_done" not in df.columns:
-        # Create columns: join_done, file_path, number_block, file_output
-        df['join_done'] = 0
-        df["file_path"] = df["file_path_folder"] + "\\" + df["file_name"]
-        list_chunk_videos = get_list_chunk_videos(df,
-                                                  max_size_mb,
-                                                  duration_limit)
-
-        df = create_column_number_block_file_output(df,
-                                                    list_chunk_videos,
-                                                    start_index_output)
-
-        create_report_backup(df=df,
-                             path_file_report=file_path_report,
-                             tag="6_join_plan")
-        df.to_excel(file_path_report, index=False)
-
-    # process each video block
-    need_join = True
-    while need_join:
-        list_join_job = get_next_join_job(file_path_report)
-        if list_join_job is False:
-            logging.info("\nThere are no more videos to join")
-            need_join = False
-            continue
-
-        file_output, list_file_path = list_join_job
-
-        # add transition effect if applicable
-        list_file_path_to_join = list_file_path.copy()
-        if transition_status:
-            list_file_path_to_join = transition_update_chunk_videos(list_file_path)
-
-        while True:
-            # Do videos join
-            list_dict_videos_duration = do_videos_join(
-                list_file_path_to_join, file_output, path_folder_videos_cache,
-            )
-
-            # check consistency of file_output
-            size_origin = sum([os.path.getsize(x) for x in list_file_path_to_join])
-            size_final = os.path.getsize(file_output)
-            if size_final > size_origin*0.9:
-                break
-
-        # Update report
-        df = join_videos_process_df(
-            df,
-            list_dict_videos_duration,
-            transition_status,
-        )
-
-        df = mark_join_job_done(df, file_output)
-
-
-        create_report_backup(df=df,
-                             path_file_report=file_path_report,
-                             tag="7_joined")
-        df.to_excel(file_path_report, index=False)
-
-    # update col duration name after adjust by join
-    df = join_videos_update_col_duration(df)
-
-    return df
-
-
-def update_dict_videos_duration(dict_videos_duration, index, transition_duration):
-    """update video_duration key in dict, with duration if transition effects
-
-    Args:
-        dict_videos_duration (dict): required key 'duration_real'
-        index (int): index position in group videos
-        transition_duration (timedelta): video transition duration
-
-    Returns:
-        dict: dict_videos_duration updated
-    """
-
-    if index == 0:
-        plus_timedelta = transition_duration + transition_duration
-    else:
-        plus_timedelta = transition_duration
-
-    duration_pre_transition = dict_videos_duration["duration_real"]
-
-    duration_pre_transition_timedelta = strptimedelta_hh_mm_ss_ms(
-        str_hh_mm_ss_ms=duration_pre_transition
-    )
-
-    duration_pos_transition_timedelta = (
-        duration_pre_transition_timedelta + plus_timedelta
-    )
-
-    duration_pos_transition_str = timedelta_to_string(duration_pos_transition_timedelta)
-    dict_videos_duration["duration_real"] = duration_pos_transition_str
-    return dict_videos_duration
-
-
-def correct_duration(path_file_report):
-    """Corrects the duration metadata in the project report
+def correct_duration(path_file_report, ts_workers=1):
+    """Corrects the duration metadata in the project report. When the
+    ts_cache is enabled, the TS remux is kept there for the join step.
 
     Args:
         path_file_report (str): absolute report path file.
             Required columns in report: [file_path_folder, file_name,
                                          duration, duration_seconds]
+        ts_workers (int, optional): TS conversions running at the same time,
+                                    with ts_cache enabled. Defaults to 1.
 
     Returns:
         dataframe: updated with:
@@ -599,6 +129,24 @@ def correct_duration(path_file_report):
     # iterate through video files
     series_file_path = df["file_path_folder"] + "\\" + df["file_name"]
     list_file_path = series_file_path.tolist()
+
+    if ts_cache.is_enabled():
+        convert_ts_return = convert_to_ts_cached(list_file_path,
+                                                 ts_workers,
+                                                 pin=False)
+        list_dict_videos_duration = \
+            convert_ts_return["list_dict_videos_duration"]
+        for index, dict_videos_duration in enumerate(
+            list_dict_videos_duration
+        ):
+            string_duration = dict_videos_duration["duration_real"]
+            if string_duration == "":
+                continue
+            df.loc[index, "duration"] = string_duration
+            df.loc[index, "duration_seconds"] = \
+                float_seconds_from_string(string_duration)
+        return df
+
     for index, file_path in enumerate(list_file_path):
 
         # convert file
@@ -634,6 +182,9 @@ def menu_ask():
           '"video_resolution_to_change"')
     print("3-Group videos into groups up to 1 gb with the same codec "
           "and resolution")
+    print("4-Run steps 2 and 3 as a pipeline, joining each group of videos "
+          "as soon as it is ready")
+    print("5-Export a backup of the worksheet to xlsx")
 
     msg_type_answer = "Type your answer: "
     make_report = int(input(f"\n{msg_type_answer}"))
@@ -643,6 +194,10 @@ def menu_ask():
         return 2
     elif make_report == 3:
         return 3
+    elif make_report == 4:
+        return 4
+    elif make_report == 5:
+        return 5
     else:
         msg_invalid_option = "Invalid option"
         raise msg_invalid_option
@@ -667,15 +222,6 @@ def userpref_size_per_file_mb(size_per_file_mb, path_file_config):
     return new_size_per_file_mb
 
 
-def get_transition_effect_status(activate_transition):
-
-    if activate_transition == "true":
-        transition_effect_status = True
-    else:
-        transition_effect_status = False
-    return transition_effect_status
-
-
 def get_duration_limit(duration_limit):
 
     # ensure duration_limit is valid or raise error
@@ -683,17 +229,6 @@ def get_duration_limit(duration_limit):
     return duration_limit
 
 
-def ensure_folder_existence(folders_path):
-    """
-    :input: folders_path: List
-    """
-
-    for folder_path in folders_path:
-        existence = os.path.isdir(folder_path)
-        if existence is False:
-            os.mkdir(folder_path)
-
-
 def get_folder_name_normalized(path_dir):
     def normalize_string_to_link(string_actual):
 
@@ -712,37 +247,211 @@ def get_folder_name_normalized(path_dir):
     return dir_name_normalize
 
 
-def save_metadata_json_files(list_dict_inf_ffprobe, path_file_report):
-    """save in project_folder/metadata/ , the metadata of each video file
-    in json format
+def get_path_file_metadata_json(path_file_origin, path_file_report):
+    """get the path_file of the metadata json of a video file
 
     Args:
-        list_dict_inf_ffprobe (list): list of dict of metadata
+        path_file_origin (str): video path_file
         path_file_report (str): path_file if videodetails.xlsx
+
+    Returns:
+        str: json path_file in project_folder/metadata/
     """
 
     path_folder_report = os.path.dirname(path_file_report)
     path_folder_metadata = os.path.join(path_folder_report, "metadata")
-    ensure_folder_existence([path_folder_metadata])
 
-    for dict_inf_ffprobe in list_dict_inf_ffprobe:
-        path_file_origin = dict_inf_ffprobe["path_file"]
-        file_name_origin = os.path.basename(path_file_origin)
-        file_path_folder_origin = os.path.dirname(path_file_origin)
+    file_name_origin = os.path.basename(path_file_origin)
+    file_path_folder_origin = os.path.dirname(path_file_origin)
 
-        file_name_origin_without_ext = os.path.splitext(file_name_origin)[0]
-        file_name_json = file_name_origin_without_ext + ".json"
+    file_name_origin_without_ext = os.path.splitext(file_name_origin)[0]
+    file_name_json = file_name_origin_without_ext + ".json"
 
-        file_name_dest = make_reencode.get_file_name_dest(
-            file_path_folder_origin, file_name_json, "video_metadata_"
-        )
-        json_path_file = os.path.join(path_folder_metadata, file_name_dest)
-        dict_metadata = dict_inf_ffprobe["metadata"]
-        with open(json_path_file, "w") as fout:
-            json.dump(dict_metadata, fout, indent=2)
+    file_name_dest = make_reencode.get_file_name_dest(
+        file_path_folder_origin, file_name_json, "video_metadata_"
+    )
+    json_path_file = os.path.join(path_folder_metadata, file_name_dest)
+    return json_path_file
+
+
+def save_metadata_json_file(dict_inf_ffprobe, path_file_report):
+    """save in project_folder/metadata/ , the metadata of a video file
+    in json format
+
+    Args:
+        dict_inf_ffprobe (dict): keys: path_file, metadata
+        path_file_report (str): path_file if videodetails.xlsx
+    """
+
+    path_file_origin = dict_inf_ffprobe["path_file"]
+    json_path_file = get_path_file_metadata_json(path_file_origin,
+                                                 path_file_report)
+    dict_metadata = dict_inf_ffprobe["metadata"]
+    with open(json_path_file, "w") as fout:
+        json.dump(dict_metadata, fout, indent=2)
+
+
+def iter_metadata_json_files(list_path_file, path_file_report):
+    """load, one by one, the metadata saved by save_metadata_json_file
+
+    Args:
+        list_path_file (list): list of video path_file
+        path_file_report (str): path_file if videodetails.xlsx
+
+    Yields:
+        dict: keys: path_file, metadata
+    """
+
+    for path_file in list_path_file:
+        json_path_file = get_path_file_metadata_json(path_file,
+                                                     path_file_report)
+        with open(json_path_file, "r") as fin:
+            dict_metadata = json.load(fin)
+        yield {"path_file": path_file, "metadata": dict_metadata}
+
+
+def iter_report_row(iter_dict_inf_ffprobe, path_file_report=None):
+    """parse each video metadata into a report row as soon as it is probed.
+    The raw metadata is saved in json and released.
+
+    Args:
+        iter_dict_inf_ffprobe (iterable): dicts with keys: path_file, metadata
+        path_file_report (str, optional): path_file if videodetails.xlsx.
+            None to not save the metadata json files
+
+    Yields:
+        dict: report row
+    """
+
+    if path_file_report is not None:
+        path_folder_report = os.path.dirname(path_file_report)
+        path_folder_metadata = os.path.join(path_folder_report, "metadata")
+        ensure_folder_existence([path_folder_metadata])
+
+    for dict_inf_ffprobe in iter_dict_inf_ffprobe:
+        if path_file_report is not None:
+            save_metadata_json_file(dict_inf_ffprobe, path_file_report)
+        dict_row = video_report.gen_report_row(dict_inf_ffprobe)
+        if dict_row is not None:
+            yield dict_row
+
+
+def get_dict_rescan_diff(list_file_selected, df_report, path_file_report):
+    """compare the current video list with the report and the
+    metadata json files from the previous scan
+
+    Args:
+        list_file_selected (list): current list of video path_file
+        df_report (dataframe): report from previous scan.
+                               Required columns: [path_file, file_size]
+        path_file_report (str): path_file if videodetails.xlsx
+
+    Returns:
+        dict: keys: unchanged, changed, removed. Values are lists of
+              path_file. 'changed' includes added and modified files
+    """
+
+    dict_file_size = dict(zip(df_report["path_file"], df_report["file_size"]))
+
+    list_unchanged = []
+    list_changed = []
+    for path_file in list_file_selected:
+        json_path_file = get_path_file_metadata_json(path_file,
+                                                     path_file_report)
+        if path_file not in dict_file_size or \
+                not os.path.isfile(json_path_file):
+            list_changed.append(path_file)
+            continue
+
+        stat_file = os.stat(path_file)
+        is_same_size = stat_file.st_size == dict_file_size[path_file]
+        is_older_than_json = \
+            stat_file.st_mtime <= os.path.getmtime(json_path_file)
+        if is_same_size and is_older_than_json:
+            list_unchanged.append(path_file)
+        else:
+            list_changed.append(path_file)
+
+    set_file_selected = set(list_file_selected)
+    list_removed = [path_file for path_file in df_report["path_file"]
+                    if path_file not in set_file_selected]
 
+    dict_rescan_diff = {"unchanged": list_unchanged,
+                        "changed": list_changed,
+                        "removed": list_removed}
+    return dict_rescan_diff
 
-def step_create_report_filled(path_dir, path_file_report, video_extensions, reencode_plan='group'):
+
+def keep_prefill_unaffected(df, df_report, list_path_file_affected,
+                            list_path_file_removed):
+    """keep the reencode plan from the previous report, that may have been
+    reviewed by the user, for subfolders without added, modified or
+    removed files
+
+    Args:
+        df (dataframe): report rebuilt and prefilled.
+                        Required columns: [path_file, subfolder_n1,
+                                           video_resolution_to_change]
+        df_report (dataframe): report from previous scan
+        list_path_file_affected (list): added and modified path_file
+        list_path_file_removed (list): removed path_file
+
+    Returns:
+        dataframe: df with column video_resolution_to_change restored
+                   for unaffected subfolders
+    """
+
+    mask_affected = df["path_file"].isin(list_path_file_affected)
+    mask_removed = df_report["path_file"].isin(list_path_file_removed)
+    set_subfolder_affected = \
+        set(df.loc[mask_affected, "subfolder_n1"]) | \
+        set(df_report.loc[mask_removed, "subfolder_n1"])
+    logging.info(f"Subfolders to review: {sorted(set_subfolder_affected)}")
+
+    serie_resolution_to_change_previous = \
+        df_report.set_index("path_file")["video_resolution_to_change"]
+    serie_resolution_to_change_previous = \
+        serie_resolution_to_change_previous.fillna("")
+
+    mask_keep = ~df["subfolder_n1"].isin(set_subfolder_affected) & \
+        df["path_file"].isin(serie_resolution_to_change_previous.index)
+    df.loc[mask_keep, "video_resolution_to_change"] = \
+        df.loc[mask_keep, "path_file"].map(serie_resolution_to_change_previous)
+    return df
+
+
+def report_allow_rescan(path_file_report):
+    """check if the report exists and was not processed by step 2"""
+
+    if not os.path.isfile(path_file_report):
+        return False
+    df = pd.read_excel(path_file_report, engine="openpyxl")
+    list_column_required = ["path_file", "file_size", "subfolder_n1",
+                            "video_resolution_to_change"]
+    if not set(list_column_required).issubset(df.columns):
+        return False
+    if "reencode_done" in df.columns:
+        return False
+    return True
+
+
+def userpref_incremental_rescan(path_file_report):
+
+    if report_allow_rescan(path_file_report) is False:
+        return False
+    print(f"\n{path_file_report}\n"
+          "There is a report from a previous scan. "
+          "Update only new, changed and removed files?")
+    answer_use = input("(None for yes) Answer: ")
+    if answer_use == "":
+        return True
+    else:
+        return False
+
+
+def step_create_report_filled(path_dir, path_file_report, video_extensions,
+                              reencode_plan='group', probe_workers=1,
+                              fast_probe=False):
     """
     - create report with path_file video list
     - prefill reencode plan
@@ -751,18 +460,25 @@ def step_create_report_filled(path_dir, path_file_report, video_extensions, reen
         path_dir (str): project folder path
         path_file_report (str): output path_file report
         video_extensions (list): list of video extensions to consider
+        reencode_plan (str): 'group' or 'single'
+        probe_workers (int): ffprobe processes running at the same time
+        fast_probe (bool): read mp4/mov headers without ffprobe
     """
 
-    list_file_selected = \
-        video_report.get_list_path_video(path_dir, video_extensions)
-
-    list_dict_inf_ffprobe = \
-        video_report.get_list_dict_inf_ffprobe(list_file_selected)
+    # walk, probe, save metadata json and parse, file by file
+    iter_file_selected = \
+        video_report.iter_path_video(path_dir, video_extensions)
 
-    save_metadata_json_files(list_dict_inf_ffprobe, path_file_report)
+    iter_dict_inf_ffprobe = \
+        video_report.iter_dict_inf_ffprobe(iter_file_selected,
+                                           probe_workers,
+                                           fast_probe)
 
-    list_dict = video_report.gen_report(list_dict_inf_ffprobe)
+    list_dict = list(iter_report_row(iter_dict_inf_ffprobe, path_file_report))
     df = pd.DataFrame(list_dict)
+    dict_stats = probe_cache.get_stats()
+    logging.info(f"Probe cache: {dict_stats['hit']} hits, "
+                 f"{dict_stats['miss']} misses")
 
     # sort path_file by natural human way
     df = df_sort_human(df, key_column_name="path_file")
@@ -780,10 +496,78 @@ def step_create_report_filled(path_dir, path_file_report, video_extensions, reen
                          tag="1_origin")
 
 
-def set_make_reencode(path_file_report, path_folder_videos_encoded):
+def step_update_report_filled(path_dir, path_file_report, video_extensions,
+                              reencode_plan='group', probe_workers=1,
+                              fast_probe=False):
+    """
+    - update report probing only new or changed files
+    - drop rows of removed files
+    - prefill reencode plan only for the affected subfolders
+
+    Args:
+        path_dir (str): project folder path
+        path_file_report (str): path_file report from previous scan
+        video_extensions (list): list of video extensions to consider
+        reencode_plan (str): 'group' or 'single'
+        probe_workers (int): ffprobe processes running at the same time
+        fast_probe (bool): read mp4/mov headers without ffprobe
+    """
+
+    df_report = pd.read_excel(path_file_report, engine="openpyxl")
+
+    list_file_selected = \
+        video_report.get_list_path_video(path_dir, video_extensions)
+
+    dict_rescan_diff = get_dict_rescan_diff(list_file_selected, df_report,
+                                            path_file_report)
+    list_changed = dict_rescan_diff["changed"]
+    list_removed = dict_rescan_diff["removed"]
+    logging.info(f"Rescan: {len(dict_rescan_diff['unchanged'])} unchanged, "
+                 f"{len(list_changed)} new or changed, "
+                 f"{len(list_removed)} removed")
+
+    for path_file in list_removed:
+        json_path_file = get_path_file_metadata_json(path_file,
+                                                     path_file_report)
+        if os.path.isfile(json_path_file):
+            os.remove(json_path_file)
+
+    iter_dict_inf_ffprobe_unchanged = \
+        iter_metadata_json_files(dict_rescan_diff["unchanged"],
+                                 path_file_report)
+    list_dict = list(iter_report_row(iter_dict_inf_ffprobe_unchanged))
+
+    iter_dict_inf_ffprobe_changed = \
+        video_report.iter_dict_inf_ffprobe(list_changed,
+                                           probe_workers,
+                                           fast_probe)
+    list_dict += list(iter_report_row(iter_dict_inf_ffprobe_changed,
+                                      path_file_report))
+    df = pd.DataFrame(list_dict)
+
+    # sort path_file by natural human way
+    df = df_sort_human(df, key_column_name="path_file")
+
+    # prefill column video_resolution_to_change
+    df = prefill.load(df, reencode_plan)
+    df = keep_prefill_unaffected(df, df_report, list_changed, list_removed)
+    df = prefill_utils.include_reencode_mode(df)
+
+    # save
+    df.to_excel(path_file_report, index=False)
+
+    # Make backup. _origin
+    create_report_backup(df=df,
+                         path_file_report=path_file_report,
+                         tag="1_origin")
+
+
+def set_make_reencode(path_file_report, path_folder_videos_encoded,
+                      reencode_workers=1):
 
     df = make_reencode.make_reencode(path_file_report,
-                                     path_folder_videos_encoded)
+                                     path_folder_videos_encoded,
+                                     reencode_workers)
 
     df.to_excel(path_file_report, index=False)
 
@@ -795,9 +579,9 @@ def set_make_reencode(path_file_report, path_folder_videos_encoded):
     print("\nReencode finished")
 
 
-def set_correct_duration(path_file_report):
+def set_correct_duration(path_file_report, ts_workers=1):
 
-    df = correct_duration(path_file_report)
+    df = correct_duration(path_file_report, ts_workers)
     df.to_excel(path_file_report, index=False)
     # make backup
     create_report_backup(df=df,
@@ -805,6 +589,20 @@ def set_correct_duration(path_file_report):
                          tag="3_correct_duration")
 
 
+def set_export_report_backup(path_file_report):
+
+    list_tag = get_list_backup_tag(path_file_report)
+    if len(list_tag) == 0:
+        print("There is no backup of this project")
+        return
+    for index, tag in enumerate(list_tag):
+        print(f"{index+1}-{tag}")
+    answer = int(input("\nType the number of the backup: "))
+    path_file_backup = export_report_backup(path_file_report,
+                                            list_tag[answer - 1])
+    print(f"Backup exported to: {path_file_backup}")
+
+
 def set_group_column(path_file_report):
 
     # update video_details with group_encode column
@@ -856,6 +654,14 @@ def set_join_videos(
     duration_limit="00:00:00,00",
     start_index_output=1,
     activate_transition="false",
+    join_mode="file",
+    ts_workers=1,
+    join_workers=1,
+    join_disk_slots=1,
+    join_cpu_slots=1,
+    join_attempts=3,
+    join_retry_backoff=5,
+    join_planner="greedy",
 ):
 
     transition_status = get_transition_effect_status(activate_transition)
@@ -868,6 +674,14 @@ def set_join_videos(
         start_index_output,
         duration_limit,
         transition_status,
+        join_mode,
+        ts_workers,
+        join_workers,
+        join_disk_slots,
+        join_cpu_slots,
+        join_attempts,
+        join_retry_backoff,
+        join_planner,
     )
     df.to_excel(path_file_report, index=False)
 
@@ -986,6 +800,53 @@ def join_process_has_started(path_file_report):
         return False
 
 
+def set_pipeline(
+    path_file_report,
+    mb_limit,
+    filename_output,
+    path_folder_videos_encoded,
+    path_folder_videos_splitted,
+    path_folder_videos_joined,
+    path_folder_videos_cache,
+    duration_limit="00:00:00,00",
+    start_index_output=1,
+    activate_transition="false",
+    dag_cpu_workers=1,
+    dag_io_workers=4,
+    join_mode="file",
+    join_disk_slots=1,
+    join_attempts=3,
+    join_retry_backoff=5,
+    ts_workers=1,
+):
+
+    df = pipeline_dag.run_pipeline(
+        path_file_report,
+        mb_limit,
+        filename_output,
+        path_folder_videos_encoded,
+        path_folder_videos_splitted,
+        path_folder_videos_joined,
+        path_folder_videos_cache,
+        duration_limit,
+        start_index_output,
+        activate_transition,
+        dag_cpu_workers,
+        dag_io_workers,
+        join_mode,
+        join_disk_slots,
+        join_attempts,
+        join_retry_backoff,
+        ts_workers,
+    )
+    df.to_excel(path_file_report, index=False)
+
+    # backup joined
+    create_report_backup(df=df,
+                         path_file_report=path_file_report,
+                         tag="7_joined")
+
+
 def main():
 
     folder_script_path = get_folder_script_path()
@@ -997,6 +858,20 @@ def main():
     video_extensions = config_data["video_extensions"].split(",")
     start_index = int(config_data["start_index"])
     reencode_plan = config_data["reencode_plan"]
+    probe_workers = int(config_data["probe_workers"])
+    fast_probe = config_data["fast_probe"] == "true"
+    join_mode = config_data["join_mode"]
+    ts_workers = int(config_data["ts_workers"])
+    join_workers = int(config_data["join_workers"])
+    join_disk_slots = int(config_data["join_disk_slots"])
+    join_cpu_slots = int(config_data["join_cpu_slots"])
+    join_attempts = int(config_data["join_attempts"])
+    join_retry_backoff = float(config_data["join_retry_backoff"])
+    ts_cache.set_max_size_mb(config_data["ts_cache_size_mb"])
+    join_planner = config_data["join_planner"]
+    dag_cpu_workers = int(config_data["dag_cpu_workers"])
+    dag_io_workers = int(config_data["dag_io_workers"])
+    reencode_workers = int(config_data["reencode_workers"])
     path_file_report = None
     path_dir = None
     ensure_folder_existence(["projects"])
@@ -1006,10 +881,20 @@ def main():
             # create Dataframe of video details
             path_dir = get_path_dir(path_dir)
             path_file_report = set_path_file_report(path_dir)
-            step_create_report_filled(path_dir,
-                                      path_file_report,
-                                      video_extensions,
-                                      reencode_plan)
+            if userpref_incremental_rescan(path_file_report):
+                step_update_report_filled(path_dir,
+                                          path_file_report,
+                                          video_extensions,
+                                          reencode_plan,
+                                          probe_workers,
+                                          fast_probe)
+            else:
+                step_create_report_filled(path_dir,
+                                          path_file_report,
+                                          video_extensions,
+                                          reencode_plan,
+                                          probe_workers,
+                                          fast_probe)
 
             print(
                 "\nIf necessary, change the reencode plan in the column "
@@ -1033,12 +918,13 @@ def main():
 
             ensure_folder_existence([path_folder_videos_encoded])
             # reencode videos mark in column video_resolution_to_change
-            set_make_reencode(path_file_report, path_folder_videos_encoded)
+            set_make_reencode(path_file_report, path_folder_videos_encoded,
+                              reencode_workers)
 
             print("start correcting the duration metadata")
 
             # correct videos duration
-            set_correct_duration(path_file_report)
+            set_correct_duration(path_file_report, ts_workers)
             print("\nDuration metadata corrected.")
 
             # break_point
@@ -1101,8 +987,76 @@ def main():
                 duration_limit,
                 start_index,
                 activate_transition,
+                join_mode,
+                ts_workers,
+                join_workers,
+                join_disk_slots,
+                join_cpu_slots,
+                join_attempts,
+                join_retry_backoff,
+                join_planner,
+            )
+            return
+
+        elif menu_answer == 4:
+
+            # define variables
+            path_dir = get_path_dir(path_dir)
+            path_file_report = get_path_file_report(path_file_report, path_dir)
+
+            path_folder_videos_encoded = \
+                set_path_folder_videos_encoded(path_dir)
+            path_folder_videos_splitted = \
+                set_path_folder_videos_splitted(path_dir)
+            path_folder_videos_joined = set_path_folder_videos_joined(path_dir)
+            path_folder_videos_cache = set_path_folder_videos_cache(path_dir)
+            ensure_folder_existence([path_folder_videos_encoded,
+                                     path_folder_videos_splitted,
+                                     path_folder_videos_joined,
+                                     path_folder_videos_cache])
+
+            filename_output = get_folder_name_normalized(path_dir)
+            mb_limit = int(
+                userpref_size_per_file_mb(size_per_file_mb, path_file_config)
+            )
+            duration_limit = get_duration_limit(duration_limit)
+
+            # the groups are planned with the codecs and resolution after
+            # the reencode, without the manual review of the step 3
+            make_reencode.ask_for_delete_old_videos_encode(
+                path_folder_videos_encoded
+            )
+            set_pipeline(
+                path_file_report,
+                mb_limit,
+                filename_output,
+                path_folder_videos_encoded,
+                path_folder_videos_splitted,
+                path_folder_videos_joined,
+                path_folder_videos_cache,
+                duration_limit,
+                start_index,
+                activate_transition,
+                dag_cpu_workers,
+                dag_io_workers,
+                join_mode,
+                join_disk_slots,
+                join_attempts,
+                join_retry_backoff,
+                ts_workers,
             )
             return
+
+        elif menu_answer == 5:
+            # export a stage snapshot, e.g. 1_origin, to xlsx
+            path_dir = get_path_dir(path_dir)
+            path_file_report = get_path_file_report(path_file_report, path_dir)
+            set_export_report_backup(path_file_report)
+
+            # break_point
+            input("Type Enter to continue")
+            clean_cmd()
+            continue
         else:
             return
 
@@ -0,0 +1,340 @@
+"""
+    Create by: apenasrr
+    Source: https://github.com/apenasrr/mass_videojoin
+
+    In-process reader of MP4/MOV headers (moov atom).
+    Builds the subset of the ffprobe json output consumed by
+    video_report.gen_report, without spawning a ffprobe process.
+    Returns None whenever the file is out of the supported cases,
+    so the caller can fall back to ffprobe.
+"""
+
+import logging
+import os
+import struct
+
+MP4_EXTENSIONS = (".mp4", ".m4v", ".mov")
+
+FORMAT_NAME_MOV = "mov,mp4,m4a,3gp,3g2,mj2"
+
+# source: libavcodec/profiles.c
+DICT_H264_PROFILE = {
+    66: "Baseline",
+    77: "Main",
+    88: "Extended",
+    100: "High",
+    110: "High 10",
+    122: "High 4:2:2",
+    244: "High 4:4:4 Predictive",
+}
+
+DICT_AUDIO_CODEC = {
+    ".mp3": "mp3",
+    "ac-3": "ac3",
+    "ec-3": "eac3",
+    "Opus": "opus",
+    "fLaC": "flac",
+    "alac": "alac",
+    "sowt": "pcm_s16le",
+    "twos": "pcm_s16be",
+}
+
+# mp4a objectTypeIndication. source: ISO/IEC 14496-1, mp4ra.org
+DICT_AUDIO_OBJECT_TYPE = {
+    0x40: "aac",
+    0x66: "aac",
+    0x67: "aac",
+    0x68: "aac",
+    0x69: "mp3",
+    0x6B: "mp3",
+}
+
+
+def iter_box(data, start, end):
+    """Iterate over the boxes placed between start and end of data
+
+    Yields:
+        tuple: box_type (str), body start (int), box end (int)
+    """
+
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from(">I4s", data, offset)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", data, offset + 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size or offset + size > end:
+            raise ValueError("Invalid box size")
+        yield box_type.decode("latin-1"), offset + header_size, offset + size
+        offset += size
+
+
+def find_box(data, start, end, box_type_target):
+
+    for box_type, body_start, box_end in iter_box(data, start, end):
+        if box_type == box_type_target:
+            return body_start, box_end
+    return None
+
+
+def read_moov(path_file):
+    """Read the moov atom body, seeking over the top level boxes
+
+    Returns:
+        bytes: moov body. None if not found
+    """
+
+    with open(path_file, "rb") as f:
+        file_size = os.fstat(f.fileno()).st_size
+        offset = 0
+        while offset + 8 <= file_size:
+            f.seek(offset)
+            header = f.read(16)
+            size, box_type = struct.unpack_from(">I4s", header)
+            header_size = 8
+            if size == 1:
+                size = struct.unpack_from(">Q", header, 8)[0]
+                header_size = 16
+            elif size == 0:
+                size = file_size - offset
+            if size < header_size:
+                return None
+            if box_type == b"moov":
+                f.seek(offset + header_size)
+                return f.read(size - header_size)
+            offset += size
+    return None
+
+
+def get_timescale_duration(data, body_start):
+    """Parse mvhd and mdhd boxes. Both share the same initial layout"""
+
+    version = data[body_start]
+    if version == 1:
+        timescale, duration = struct.unpack_from(">IQ", data, body_start + 20)
+    else:
+        timescale, duration = struct.unpack_from(">II", data, body_start + 12)
+    return timescale, duration
+
+
+def get_sample_count_size(data, body_start):
+    """Parse stsz box
+
+    Returns:
+        tuple: sample count, sum of the sample sizes in bytes
+    """
+
+    sample_size, sample_count = struct.unpack_from(">II", data, body_start + 4)
+    if sample_size != 0:
+        return sample_count, sample_size * sample_count
+    list_sample_size = struct.unpack_from(
+        f">{sample_count}I", data, body_start + 12
+    )
+    return sample_count, sum(list_sample_size)
+
+
+def read_descriptor_length(data, offset):
+
+    length = 0
+    for _ in range(4):
+        byte = data[offset]
+        offset += 1
+        length = (length << 7) | (byte & 0x7F)
+        if byte & 0x80 == 0:
+            break
+    return length, offset
+
+
+def get_object_type_indication(data, body_start):
+    """Parse esds box, returning the DecoderConfigDescriptor object type"""
+
+    offset = body_start + 4
+    if data[offset] != 0x03:
+        return None
+    _, offset = read_descriptor_length(data, offset + 1)
+    es_flags = data[offset + 2]
+    offset += 3
+    if es_flags & 0x80:
+        offset += 2
+    if es_flags & 0x40:
+        offset += 1 + data[offset]
+    if es_flags & 0x20:
+        offset += 2
+    if data[offset] != 0x04:
+        return None
+    _, offset = read_descriptor_length(data, offset + 1)
+    return data[offset]
+
+
+def get_dict_stream_video(data, entry_type, entry_start, entry_end):
+
+    if entry_type not in ("avc1", "avc3"):
+        return None
+    width, height = struct.unpack_from(">HH", data, entry_start + 24)
+    box_avcc = find_box(data, entry_start + 78, entry_end, "avcC")
+    if box_avcc is None:
+        return None
+    avcc_start = box_avcc[0]
+    profile_idc = data[avcc_start + 1]
+    constraint_flags = data[avcc_start + 2]
+    if profile_idc not in DICT_H264_PROFILE:
+        return None
+    profile = DICT_H264_PROFILE[profile_idc]
+    if profile_idc == 66 and constraint_flags & 0x40:
+        profile = "Constrained Baseline"
+    elif profile_idc in (110, 122, 244) and constraint_flags & 0x10:
+        profile += " Intra"
+
+    d = {}
+    d["codec_name"] = "h264"
+    d["profile"] = profile
+    d["codec_type"] = "video"
+    d["width"] = width
+    d["height"] = height
+    d["is_avc"] = "true"
+    return d
+
+
+def get_dict_stream_audio(data, entry_type, entry_start, entry_end):
+
+    if entry_type == "mp4a":
+        # QuickTime sound sample description version 1 and 2
+        version = struct.unpack_from(">H", data, entry_start + 8)[0]
+        children_start = entry_start + {0: 28, 1: 44, 2: 64}.get(version, 28)
+        box_esds = find_box(data, children_start, entry_end, "esds")
+        if box_esds is None:
+            box_wave = find_box(data, children_start, entry_end, "wave")
+            if box_wave is None:
+                return None
+            box_esds = find_box(data, box_wave[0], box_wave[1], "esds")
+            if box_esds is None:
+                return None
+        object_type = get_object_type_indication(data, box_esds[0])
+        codec_name = DICT_AUDIO_OBJECT_TYPE.get(object_type)
+    else:
+        codec_name = DICT_AUDIO_CODEC.get(entry_type)
+    if codec_name is None:
+        return None
+
+    d = {}
+    d["codec_name"] = codec_name
+    d["codec_type"] = "audio"
+    return d
+
+
+def get_dict_stream(data, trak_start, trak_end):
+    """Parse a trak box
+
+    Returns:
+        dict: ffprobe-like stream dict. False for tracks that are neither
+              video nor audio. None if the track can not be parsed
+    """
+
+    box_mdia = find_box(data, trak_start, trak_end, "mdia")
+    if box_mdia is None:
+        return None
+    box_hdlr = find_box(data, box_mdia[0], box_mdia[1], "hdlr")
+    box_mdhd = find_box(data, box_mdia[0], box_mdia[1], "mdhd")
+    box_minf = find_box(data, box_mdia[0], box_mdia[1], "minf")
+    if box_hdlr is None or box_mdhd is None or box_minf is None:
+        return None
+    handler_type = data[box_hdlr[0] + 8:box_hdlr[0] + 12].decode("latin-1")
+    if handler_type not in ("vide", "soun"):
+        return False
+
+    box_stbl = find_box(data, box_minf[0], box_minf[1], "stbl")
+    if box_stbl is None:
+        return None
+    box_stsd = find_box(data, box_stbl[0], box_stbl[1], "stsd")
+    box_stsz = find_box(data, box_stbl[0], box_stbl[1], "stsz")
+    if box_stsd is None or box_stsz is None:
+        return None
+
+    # first sample description
+    entry = next(iter_box(data, box_stsd[0] + 8, box_stsd[1]), None)
+    if entry is None:
+        return None
+    entry_type, entry_start, entry_end = entry
+    if handler_type == "vide":
+        d = get_dict_stream_video(data, entry_type, entry_start, entry_end)
+    else:
+        d = get_dict_stream_audio(data, entry_type, entry_start, entry_end)
+    if d is None:
+        return None
+
+    timescale, duration = get_timescale_duration(data, box_mdhd[0])
+    sample_count, data_size = get_sample_count_size(data, box_stsz[0])
+    if timescale == 0 or duration == 0:
+        return None
+    duration_seconds = duration / timescale
+    d["duration"] = f"{duration_seconds:.6f}"
+    d["bit_rate"] = str(int(data_size * 8 / duration_seconds))
+    d["nb_frames"] = str(sample_count)
+    return d
+
+
+def get_dict_inf(path_file):
+    """Build a ffprobe-like metadata dict reading only the moov atom
+
+    Args:
+        path_file (str): video path file. Only MP4_EXTENSIONS are parsed
+
+    Returns:
+        dict: keys: streams, format. Same shape as ffprobe json output.
+              None if the file can not be parsed by this fast path.
+    """
+
+    if not path_file.lower().endswith(MP4_EXTENSIONS):
+        return None
+
+    try:
+        data = read_moov(path_file)
+        if data is None:
+            return None
+        end = len(data)
+
+        # fragmented mp4 keeps samples outside the moov atom
+        if find_box(data, 0, end, "mvex") is not None:
+            return None
+        box_mvhd = find_box(data, 0, end, "mvhd")
+        if box_mvhd is None:
+            return None
+        timescale, duration = get_timescale_duration(data, box_mvhd[0])
+        if timescale == 0 or duration == 0:
+            return None
+
+        list_stream = []
+        for box_type, body_start, box_end in iter_box(data, 0, end):
+            if box_type != "trak":
+                continue
+            dict_stream = get_dict_stream(data, body_start, box_end)
+            if dict_stream is None:
+                return None
+            if dict_stream is False:
+                continue
+            dict_stream["index"] = len(list_stream)
+            list_stream.append(dict_stream)
+    except (ValueError, IndexError, struct.error, OSError) as e:
+        logging.info(f"Fast probe can't parse: {path_file}. {e}")
+        return None
+
+    if len(list_stream) == 0:
+        return None
+
+    file_size = os.path.getsize(path_file)
+    duration_seconds = duration / timescale
+    dict_format = {}
+    dict_format["filename"] = path_file
+    dict_format["nb_streams"] = len(list_stream)
+    dict_format["format_name"] = FORMAT_NAME_MOV
+    dict_format["duration"] = f"{duration_seconds:.6f}"
+    dict_format["size"] = str(file_size)
+    dict_format["bit_rate"] = str(int(file_size * 8 / duration_seconds))
+
+    dict_inf = {}
+    dict_inf["streams"] = list_stream
+    dict_inf["format"] = dict_format
+    return dict_inf
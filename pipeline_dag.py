@@ -0,0 +1,501 @@
+"""
+    Create by: apenasrr
+    Source: https://github.com/apenasrr/mass_videojoin
+
+    Optional pipeline that overlaps the steps 2 and 3 of the menu.
+    Each video is a chain of tasks: reencode (if marked), duration
+    correction and split (if too big). The chunks are cut with the same
+    greedy rule of the join plan, in the report order, and each chunk is
+    joined as soon as all of its videos finished their chain. Reencodes run
+    in a CPU pool, while the remux, split and join tasks run in an I/O pool.
+"""
+
+import logging
+import os
+import shutil
+import sys
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import pandas as pd
+
+import job_journal
+import job_state
+import make_join
+import make_reencode
+import size_model
+import ts_cache
+from make_split import (get_dict_row_dest, get_list_dict_path_file_mb_limit,
+                        get_mask_to_be_split, preprocess_df_split)
+from utils_mass_videojoin import (create_report_backup,
+                                  exclude_all_files_from_folder,
+                                  get_transition_effect_status)
+from video_tools import (convert_to_ts, convert_to_ts_cached,
+                         float_seconds_from_string, split_mp4)
+
+# Same values of make_split.search_to_split_videos
+RECOIL_SEC = 10
+RECOIL_MBSIZE = 10
+
+
+def get_serie_group_planned(df):
+    """Group the videos by the codecs and resolution they will have after
+    the reencode, so the join plan is known before any reencode
+
+    Args:
+        df (dataframe): video_details dataframe, with the _origin columns
+
+    Returns:
+        serie: group_encode
+    """
+
+    df_planned = df.copy()
+    serie_resolution_to_change = df_planned["video_resolution_to_change"]
+    mask_reencode = ~(
+        serie_resolution_to_change.isna()
+        | serie_resolution_to_change.isin([""])
+    ) & df_planned["reencode_done"].isin([0])
+    if mask_reencode.any():
+        df_resolution = serie_resolution_to_change[mask_reencode].astype(
+            str
+        ).str.split("x", expand=True)
+        # the group key compares the resolution as text
+        for column_name in ("video_resolution_width",
+                            "video_resolution_height"):
+            df_planned[column_name] = df_planned[column_name].astype(str)
+        # reencode output: see video_tools.change_width_height_mp4
+        df_planned.loc[mask_reencode, "video_resolution_width"] = \
+            df_resolution[0]
+        df_planned.loc[mask_reencode, "video_resolution_height"] = \
+            df_resolution[1]
+        df_planned.loc[mask_reencode, "video_codec"] = "h264"
+        df_planned.loc[mask_reencode, "audio_codec"] = "aac"
+    df_planned = make_join.get_video_details_with_group(df_planned)
+    return df_planned["group_encode"]
+
+
+def get_duration_corrected(file_path, path_folder_cache_task):
+    """Real duration of a video, measured by its TS remux
+
+    Returns:
+        str: duration in format hh:mm:ss.ms. "" if it can't be measured
+    """
+
+    if ts_cache.is_enabled():
+        convert_ts_return = convert_to_ts_cached([file_path], pin=False)
+    else:
+        os.makedirs(path_folder_cache_task, exist_ok=True)
+        convert_ts_return = convert_to_ts([file_path], path_folder_cache_task)
+        shutil.rmtree(path_folder_cache_task, ignore_errors=True)
+    return convert_ts_return["list_dict_videos_duration"][0]["duration_real"]
+
+
+def split_video(dict_row, size_limit, duration_limit,
+                path_folder_videos_splitted):
+    """Split a video if it is bigger than the limits
+
+    Args:
+        dict_row (serie): report row of the video
+        size_limit (int): size limit in bytes, already with the recoil
+        duration_limit (str): duration limit in format hh:mm:ss.ms
+        path_folder_videos_splitted (str): destination of the parts
+
+    Returns:
+        list: report rows of the parts. The row itself if not splitted
+    """
+
+    df_row = dict_row.to_frame().T
+    if not get_mask_to_be_split(df_row, size_limit, duration_limit).any():
+        return [dict_row]
+
+    list_dict_path_file_mb_limit = get_list_dict_path_file_mb_limit(
+        df=df_row, size_limit=size_limit, duration_limit=duration_limit
+    )
+    dict_path_file_mb_limit = list_dict_path_file_mb_limit[0]
+    list_filepath_output = split_mp4(
+        largefile_path=dict_path_file_mb_limit["path_file"],
+        recoil=RECOIL_SEC,
+        output_folder_path=path_folder_videos_splitted,
+        mb_limit=dict_path_file_mb_limit["mb_limit"],
+        original_video_duration_sec=dict_path_file_mb_limit[
+            "float_duration_sec"
+        ],
+    )
+    list_dict_row = [
+        get_dict_row_dest(dict_row, os.path.abspath(filepath_output))
+        for filepath_output in list_filepath_output
+    ]
+    return list_dict_row
+
+
+class ChunkCutter:
+    """Greedy cut of the join plan, fed with the videos in the report order.
+    Same rule of make_join.get_list_chunk_end: a chunk closes before
+    the video that would exceed a limit, or when the group changes."""
+
+    def __init__(self, max_size_bytes, duration_limit, dict_size_model):
+
+        self.max_size_bytes = max_size_bytes
+        if duration_limit != "00:00:00.00":
+            self.float_duration_limit = float_seconds_from_string(
+                duration_limit
+            )
+        else:
+            # symbolic limit not attainable
+            self.float_duration_limit = float("inf")
+        self.dict_size_model = dict_size_model
+        # TS remux measures of the videos already added
+        self.dict_size_model_ts = {}
+        self.list_videos = []
+        self.group_no = None
+        self.chunk_size = 0
+        self.chunk_duration = 0
+
+    def get_size_predicted(self, dict_row):
+
+        df_row = dict_row.to_frame().T
+        df_row["file_size"] = df_row["file_size"].astype("int64")
+        self.dict_size_model_ts = size_model.merge_model(
+            self.dict_size_model_ts, size_model.get_dict_model_ts(df_row)
+        )
+        serie_size_predicted = size_model.get_serie_size_predicted(
+            df_row,
+            self.dict_size_model,
+            self.max_size_bytes,
+            self.dict_size_model_ts,
+        )
+        return int(serie_size_predicted.iloc[0])
+
+    def add(self, dict_row, group_no):
+        """
+        Returns:
+            list: video path_file of the chunk closed by this video.
+                  None if no chunk was closed
+        """
+
+        size = self.get_size_predicted(dict_row)
+        duration = float_seconds_from_string(dict_row["duration"])
+        if size > self.max_size_bytes or duration > self.float_duration_limit:
+            logging.error(
+                "There is a video bigger than limit, " + "after split process."
+            )
+            logging.error(dict_row)
+            sys.exit()
+
+        list_chunk_closed = None
+        if self.list_videos and (
+            group_no != self.group_no
+            or self.chunk_size + size > self.max_size_bytes
+            or self.chunk_duration + duration > self.float_duration_limit
+        ):
+            list_chunk_closed = self.close()
+
+        self.list_videos.append(dict_row["file_path"])
+        self.group_no = group_no
+        self.chunk_size += size
+        self.chunk_duration += duration
+        return list_chunk_closed
+
+    def close(self):
+        """
+        Returns:
+            list: video path_file of the open chunk. None if it is empty
+        """
+
+        if not self.list_videos:
+            return None
+        list_chunk_closed = self.list_videos
+        self.list_videos = []
+        self.chunk_size = 0
+        self.chunk_duration = 0
+        return list_chunk_closed
+
+
+def run_pipeline(
+    path_file_report,
+    mb_limit,
+    filename_output,
+    path_folder_videos_encoded,
+    path_folder_videos_splitted,
+    path_folder_videos_joined,
+    path_folder_videos_cache,
+    duration_limit="00:00:00.00",
+    start_index_output=1,
+    activate_transition="false",
+    dag_cpu_workers=1,
+    dag_io_workers=4,
+    join_mode="file",
+    join_disk_slots=1,
+    join_attempts=3,
+    join_retry_backoff=5,
+    ts_workers=1,
+):
+    """Reencode, correct the duration, split and join the videos of the
+    report, starting each task as soon as its inputs are ready.
+    Each finished reencode and join is recorded in the journal, so a run
+    interrupted keeps them. The remux and the splits are done again
+
+    Args:
+        path_file_report (str): path_file of video_details.xlsx
+        mb_limit (int): max size of each joined video
+        filename_output (str): prefix of the joined videos
+        path_folder_videos_encoded (str): destination of the reencodes
+        path_folder_videos_splitted (str): destination of the splits
+        path_folder_videos_joined (str): destination of the joined videos
+        path_folder_videos_cache (str): path_folder for cache data
+        duration_limit (str, optional): max duration of each joined video,
+                                        in format hh:mm:ss.ms
+        start_index_output (int, optional): suffix of the first joined video
+        activate_transition (str, optional): 'true' to add transitions
+        dag_cpu_workers (int, optional): reencodes at the same time
+        dag_io_workers (int, optional): remux, split and join tasks at the
+                                        same time
+        join_mode (str, optional): 'file' or 'pipe'
+        join_disk_slots (int, optional): joins writing at the same time
+        join_attempts (int, optional): joins tried before the quarantine
+        join_retry_backoff (float, optional): seconds waited after the first
+                                              failed join, doubled each time
+        ts_workers (int, optional): TS conversions of each join
+
+    Returns:
+        dataframe: video_details dataframe, as after the step 3
+    """
+
+    transition_status = get_transition_effect_status(
+        activate_transition
+    )
+    max_size_bytes = mb_limit * 1024 ** 2
+    size_limit_split = (mb_limit - RECOIL_MBSIZE) * 1024 ** 2
+
+    # reencodes cut by an interrupted run are started over
+    make_reencode.remove_reencode_interrupted(path_file_report)
+    dict_chunk_joined = job_journal.get_dict_chunk_joined(
+        path_file_report, "pipeline_join"
+    )
+
+    df = job_state.load_report_state(path_file_report)
+    # apply jobs finished by an interrupted run
+    df = job_journal.compact_journal(df, path_file_report)
+    # the joins are only applied to the report at the end
+    for dict_entry in dict_chunk_joined.values():
+        job_journal.append_entry(path_file_report, dict_entry)
+
+    if "reencode_done" not in df.columns:
+        df["reencode_done"] = 0
+        df = make_reencode.create_backup_metadata_columns(df)
+        job_state.save_report_state(df, path_file_report)
+    if "duration_original" not in df.columns:
+        df["duration_original"] = df["duration"]
+        df["duration_seconds_original"] = df["duration_seconds"]
+    df = preprocess_df_split(df)
+    df["group_encode"] = get_serie_group_planned(df)
+    create_report_backup(df=df,
+                         path_file_report=path_file_report,
+                         tag="4_grouped")
+
+    exclude_all_files_from_folder(path_folder_videos_splitted)
+    dict_size_model = size_model.load_model(path_file_report)
+    chunk_cutter = ChunkCutter(max_size_bytes, duration_limit,
+                               dict_size_model)
+    semaphore_disk = threading.BoundedSemaphore(max(1, int(join_disk_slots)))
+
+    list_index = df.index.tolist()
+    dict_list_row_ready = {}
+    list_dict_row_final = []
+    position_next = 0
+    list_chunk = []
+    dict_list_dict_videos_duration = {}
+    dict_list_file_path_to_join = {}
+
+    executor_cpu = ThreadPoolExecutor(max_workers=max(1, dag_cpu_workers))
+    threads_reencode = make_reencode.get_threads_per_reencode(dag_cpu_workers)
+    executor_io = ThreadPoolExecutor(max_workers=max(1, dag_io_workers))
+    dict_future_task = {}
+
+    def submit_duration(index):
+
+        df.loc[index, "file_path"] = (
+            df.loc[index, "file_path_folder"] + "\\"
+            + df.loc[index, "file_name"]
+        )
+        path_folder_cache_task = os.path.join(path_folder_videos_cache,
+                                              f"duration_{index}")
+        future = executor_io.submit(get_duration_corrected,
+                                    df.loc[index, "file_path"],
+                                    path_folder_cache_task)
+        dict_future_task[future] = ("duration", index)
+
+    def submit_join(list_file_path):
+
+        number_block = len(list_chunk) + start_index_output
+        file_name_output = f"{filename_output}-%03d.mp4" % number_block
+        file_output = os.path.join(path_folder_videos_joined,
+                                   file_name_output)
+        list_chunk.append((number_block, file_output, list_file_path))
+
+        list_file_path_to_join = list_file_path.copy()
+        if transition_status:
+            list_file_path_to_join = \
+                make_join.transition_update_chunk_videos(
+                    [list_file_path]
+                )[0]
+
+        # joined by an interrupted run
+        dict_entry = dict_chunk_joined.get(file_output)
+        if (
+            dict_entry is not None
+            and dict_entry["inputs"] == list_file_path_to_join
+            and os.path.isfile(file_output)
+        ):
+            logging.info(f"Already joined: {file_output}")
+            dict_list_dict_videos_duration[file_output] = \
+                dict_entry["result"]
+            return
+
+        future = executor_io.submit(make_join.run_join_job,
+                                    list_file_path_to_join,
+                                    file_output,
+                                    path_folder_videos_cache,
+                                    semaphore_disk,
+                                    join_mode,
+                                    ts_workers,
+                                    join_attempts,
+                                    join_retry_backoff)
+        dict_future_task[future] = ("join", file_output)
+        dict_list_file_path_to_join[file_output] = list_file_path_to_join
+
+    try:
+        # start the chain of each video. Longest reencodes first
+        df_to_reencode = make_reencode.sort_df_longest_first(
+            make_reencode.get_df_to_reencode(df)
+        )
+        for index, dict_row in df_to_reencode.iterrows():
+            future = executor_cpu.submit(make_reencode.run_reencode_job,
+                                         dict_row,
+                                         path_folder_videos_encoded,
+                                         threads_reencode,
+                                         path_file_report)
+            dict_future_task[future] = ("reencode", index)
+        for index in list_index:
+            if index not in df_to_reencode.index:
+                submit_duration(index)
+
+        # the report is only changed by this thread
+        while dict_future_task:
+            set_future_done, _ = wait(dict_future_task,
+                                      return_when=FIRST_COMPLETED)
+            for future in set_future_done:
+                task, key = dict_future_task.pop(future)
+                result = future.result()
+
+                if task == "reencode":
+                    return_reencode_video, elapsed_seconds = result
+                    if return_reencode_video is False:
+                        sys.exit()
+                    df = make_reencode.update_file_report(
+                        df, df.loc[key, :], path_folder_videos_encoded
+                    )
+                    job_journal.record_job_done(
+                        df,
+                        path_file_report,
+                        "reencode",
+                        [key],
+                        make_reencode.LIST_COLUMN_REENCODE_UPDATE,
+                        [os.path.join(df.at[key, "file_path_folder"],
+                                      df.at[key, "file_name"])],
+                        elapsed_seconds,
+                    )
+                    submit_duration(key)
+
+                elif task == "duration":
+                    if result != "":
+                        df.loc[key, "duration"] = result
+                        df.loc[key, "duration_seconds"] = \
+                            float_seconds_from_string(result)
+                    future_split = executor_io.submit(
+                        split_video, df.loc[key, :].copy(), size_limit_split,
+                        duration_limit, path_folder_videos_splitted
+                    )
+                    dict_future_task[future_split] = ("split", key)
+
+                elif task == "split":
+                    list_dict_row_split = []
+                    for dict_row in result:
+                        dict_row = dict_row.copy()
+                        dict_row["file_path"] = (
+                            dict_row["file_path_folder"] + "\\"
+                            + dict_row["file_name"]
+                        )
+                        list_dict_row_split.append(dict_row)
+                    dict_list_row_ready[key] = list_dict_row_split
+
+                    # feed the chunk cutter in the report order
+                    while (
+                        position_next < len(list_index)
+                        and list_index[position_next] in dict_list_row_ready
+                    ):
+                        index = list_index[position_next]
+                        for dict_row in dict_list_row_ready.pop(index):
+                            list_dict_row_final.append(dict_row)
+                            list_chunk_closed = chunk_cutter.add(
+                                dict_row, dict_row["group_encode"]
+                            )
+                            if list_chunk_closed is not None:
+                                submit_join(list_chunk_closed)
+                        position_next += 1
+                        if position_next == len(list_index):
+                            list_chunk_closed = chunk_cutter.close()
+                            if list_chunk_closed is not None:
+                                submit_join(list_chunk_closed)
+
+                elif task == "join":
+                    list_dict_videos_duration, elapsed_seconds = result
+                    dict_list_dict_videos_duration[key] = \
+                        list_dict_videos_duration
+                    if list_dict_videos_duration is not None:
+                        job_journal.record_chunk_joined(
+                            path_file_report,
+                            "pipeline_join",
+                            dict_list_file_path_to_join[key],
+                            key,
+                            list_dict_videos_duration,
+                            elapsed_seconds,
+                        )
+    except BaseException:
+        # drop the queued tasks. The running ones finish, already recorded
+        # in the journal when done
+        executor_cpu.shutdown(wait=False, cancel_futures=True)
+        executor_io.shutdown(wait=False, cancel_futures=True)
+        raise
+
+    executor_cpu.shutdown()
+    executor_io.shutdown()
+
+    # report rows in the report order, with the splitted parts
+    df_final = pd.DataFrame(list_dict_row_final).reset_index(drop=True)
+
+    df_final["join_done"] = 0
+    df_final["video_duration_real"] = ""
+    for number_block, file_output, list_file_path in list_chunk:
+        mask = df_final["file_path"].isin(list_file_path)
+        df_final.loc[mask, "number_block"] = number_block
+        df_final.loc[mask, "file_output"] = file_output
+        list_dict_videos_duration = dict_list_dict_videos_duration[
+            file_output
+        ]
+        if list_dict_videos_duration is None:
+            # quarantined, retried by the step 3
+            df_final.loc[mask, "join_done"] = -1
+            continue
+        df_final = make_join.join_videos_process_df(
+            df_final, list_dict_videos_duration, transition_status
+        )
+        df_final.loc[mask, "join_done"] = 1
+
+    # keep the working state for a step 3 retry of quarantined chunks.
+    # The journal entries are already in df_final and refer to the rows
+    # before the split: clear it only after the state is saved
+    job_state.save_report_state(df_final, path_file_report)
+    job_journal.clear_journal(path_file_report)
+    df_final = make_join.join_videos_update_col_duration(df_final)
+    return df_final
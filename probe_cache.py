@@ -0,0 +1,192 @@
+"""
+    Create by: apenasrr
+    Source: https://github.com/apenasrr/mass_videojoin
+
+    Persistent cache of ffprobe outputs, stored in a SQLite file.
+    Each entry is keyed by (absolute path, size, mtime_ns) of the probed file,
+    so any change in the file invalidates its entry automatically.
+    Each thread keeps its own connection, opened once. If the cache fails,
+    the lookups miss and ffprobe runs live.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+
+path_file_cache = os.path.join("projects", "probe_cache.sqlite")
+
+_lock_stats = threading.Lock()
+_dict_stats = {"hit": 0, "miss": 0}
+_local = threading.local()
+
+
+def set_path_file_cache(path_file):
+    """Change the SQLite file used as probe cache
+
+    Args:
+        path_file (str): path file of the SQLite cache
+    """
+
+    global path_file_cache
+    path_file_cache = path_file
+
+
+def get_connection():
+    """
+    Returns:
+        sqlite3.Connection: connection of the current thread to
+                            path_file_cache, with the table created
+    """
+
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.path_file == path_file_cache:
+        return conn
+    close_connection()
+
+    path_folder_cache = os.path.dirname(path_file_cache)
+    if path_folder_cache != "":
+        os.makedirs(path_folder_cache, exist_ok=True)
+    conn = sqlite3.connect(path_file_cache, timeout=30)
+    try:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS probe ("
+            "path_file TEXT, "
+            "print_format TEXT, "
+            "file_size INTEGER, "
+            "mtime_ns INTEGER, "
+            "output TEXT, "
+            "PRIMARY KEY (path_file, print_format))"
+        )
+    except sqlite3.Error:
+        conn.close()
+        raise
+    _local.conn = conn
+    _local.path_file = path_file_cache
+    return conn
+
+
+def close_connection():
+    """Close the connection of the current thread, if any"""
+
+    conn = getattr(_local, "conn", None)
+    _local.conn = None
+    if conn is not None:
+        conn.close()
+
+
+def get_file_fingerprint(path_file):
+    """
+    Returns:
+        tuple: (absolute path_file, size, mtime_ns).
+               None if the file does not exist.
+    """
+
+    try:
+        stat = os.stat(path_file)
+    except OSError:
+        return None
+    return os.path.abspath(path_file), stat.st_size, stat.st_mtime_ns
+
+
+def count_stats(key):
+
+    with _lock_stats:
+        _dict_stats[key] += 1
+
+
+def get_stats():
+    """
+    Returns:
+        dict: keys: hit, miss. Counters since the start or the last reset
+    """
+
+    with _lock_stats:
+        return dict(_dict_stats)
+
+
+def reset_stats():
+
+    with _lock_stats:
+        for key in _dict_stats:
+            _dict_stats[key] = 0
+
+
+def get_output(path_file, print_format):
+    """Get a cached ffprobe output
+
+    Args:
+        path_file (str): probed video path file
+        print_format (str): ffprobe print_format used, e.g.: json
+
+    Returns:
+        str: ffprobe output (bytes for binary entries).
+             None if there is no valid entry
+    """
+
+    fingerprint = get_file_fingerprint(path_file)
+    if fingerprint is None:
+        return None
+    path_file_abs, file_size, mtime_ns = fingerprint
+
+    try:
+        row = get_connection().execute(
+            "SELECT output FROM probe WHERE path_file = ? "
+            "AND print_format = ? AND file_size = ? AND mtime_ns = ?",
+            (path_file_abs, print_format, file_size, mtime_ns),
+        ).fetchone()
+    except sqlite3.Error as e:
+        logging.warning(f"Can't read probe cache of: {path_file}")
+        logging.warning(e)
+        close_connection()
+        row = None
+
+    if row is None:
+        count_stats("miss")
+        return None
+    count_stats("hit")
+    return row[0]
+
+
+def set_output(path_file, print_format, output):
+    """Store a ffprobe output, replacing any older entry of the same file
+
+    Args:
+        path_file (str): probed video path file
+        print_format (str): ffprobe print_format used, e.g.: json
+        output (str or bytes): ffprobe output
+    """
+
+    fingerprint = get_file_fingerprint(path_file)
+    if fingerprint is None:
+        return
+    path_file_abs, file_size, mtime_ns = fingerprint
+
+    try:
+        with get_connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO probe VALUES (?, ?, ?, ?, ?)",
+                (path_file_abs, print_format, file_size, mtime_ns, output),
+            )
+    except sqlite3.Error as e:
+        logging.warning(f"Can't save probe cache of: {path_file}")
+        logging.warning(e)
+        close_connection()
+
+
+def invalidate(path_file=None):
+    """Remove cached entries
+
+    Args:
+        path_file (str, optional): video path file to remove.
+                                   Defaults to None, to remove all entries.
+    """
+
+    with get_connection() as conn:
+        if path_file is None:
+            conn.execute("DELETE FROM probe")
+        else:
+            conn.execute(
+                "DELETE FROM probe WHERE path_file = ?",
+                (os.path.abspath(path_file),),
+            )
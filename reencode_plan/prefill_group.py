@@ -131,6 +131,9 @@ def get_df_prefill(df_update, df_key, df_main_profile_per_subfolder):
         mask_resolution_to_change, "video_resolution_to_change"
     ] = df_merged.loc[mask_resolution_to_change, "resolution_main"]
 
+    # fill column 'reencode_mode'
+    df = prefill_utils.include_reencode_mode(df)
+
     # reorder dataframe
     df_prefill = df.reindex(
         columns=[
@@ -149,6 +152,7 @@ def get_df_prefill(df_update, df_key, df_main_profile_per_subfolder):
             "file_path_folder",
             "resolution",
             "video_resolution_to_change",
+            "reencode_mode",
             "subfolder_n1",
             "file_name",
         ]
@@ -163,7 +167,7 @@ def run(df):
         - Homogen Video_Profile of each 'level 1 subfolder'
         - Maintain higher resolution profile to minimize need to reencode
         - Ensures that the resulting video_profile will be codec AVC (is_avc)
-    - add columns: 'subfolder_n1', 'resolution'
+    - add columns: 'subfolder_n1', 'resolution', 'reencode_mode'
     - reorder dataframe
     """
     df_update = prefill_utils.include_resolution(df)
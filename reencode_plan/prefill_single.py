@@ -45,7 +45,7 @@ def run(df):
     - Mount ReenCode Plan, filling column 'video_resolution_to_change'.
        Based on:
         - Ensures that video_profile will be codec AVC (is_avc) and audio AAC
-    - add columns: 'subfolder_n1', 'resolution'
+    - add columns: 'subfolder_n1', 'resolution', 'reencode_mode'
     - reorder dataframe
     """
 
@@ -53,6 +53,7 @@ def run(df):
 
     # create column 'video_resolution_to_change'
     df_filled = include_video_resolution_to_change(df_update)
+    df_filled = prefill_utils.include_reencode_mode(df_filled)
 
     # create column 'subfolder_n1'
     df_filled = include_sub_folder(df_filled)
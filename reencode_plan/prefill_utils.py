@@ -10,6 +10,46 @@ def include_resolution(df):
     return df_update
 
 
+def include_reencode_mode(df):
+    """Define how each video marked to reencode will be converted,
+    like make_reencode.reencode_video does.
+
+    Args:
+        df (pd.DataFrame): video_details dataframe.
+            Required columns: 'video_codec', 'audio_codec',
+                              'video_resolution_width',
+                              'video_resolution_height',
+                              'video_resolution_to_change'
+    Returns:
+        pd.DataFrame:
+            Original dataframe with new column 'reencode_mode':
+            'copy': h264 and aac in the target resolution. Only remuxed
+            'audio': h264 in the target resolution. Audio converted to aac
+            'video': video reencoded
+            '': not marked to reencode
+    """
+
+    serie_resolution_to_change = df["video_resolution_to_change"].fillna("")
+    serie_resolution = (
+        df["video_resolution_width"].astype(str)
+        + "x"
+        + df["video_resolution_height"].astype(str)
+    )
+    mask_to_reencode = ~serie_resolution_to_change.isin([""])
+    mask_video_ok = df["video_codec"].isin(["h264"]) & (
+        serie_resolution == serie_resolution_to_change.astype(str)
+    )
+    mask_audio_ok = df["audio_codec"].isin(["aac"])
+
+    df["reencode_mode"] = ""
+    df.loc[mask_to_reencode, "reencode_mode"] = "video"
+    df.loc[mask_to_reencode & mask_video_ok, "reencode_mode"] = "audio"
+    df.loc[
+        mask_to_reencode & mask_video_ok & mask_audio_ok, "reencode_mode"
+    ] = "copy"
+    return df
+
+
 def show_reencode_plan(df_filled):
 
     # step 1 - create aux columns
@@ -27,20 +67,37 @@ def show_reencode_plan(df_filled):
     df_show_draft2["minutes_to_reencode"] = df_show_draft1.loc[
         mask_to_reencode, "minutes"
     ]
+    # reencodes that keep the video stream: see include_reencode_mode
+    mask_wo_video_encode = df_show_draft1["reencode_mode"].isin(
+        ["copy", "audio"]
+    )
+    df_show_draft2["minutes_wo_video_encode"] = df_show_draft1.loc[
+        mask_wo_video_encode, "minutes"
+    ]
 
     # mount df_show
+    list_column_minutes = [
+        "minutes_ok",
+        "minutes_to_reencode",
+        "minutes_wo_video_encode",
+    ]
     df_groupby = df_show_draft2.groupby(["subfolder_n1"])
-    df_agg = df_groupby[["minutes_ok", "minutes_to_reencode"]].agg(sum)
+    df_agg = df_groupby[list_column_minutes].agg("sum")
     df_show = df_agg.reset_index()
 
     # calculate minutes and percent to reencode
     minutes_ok_sum = df_show["minutes_ok"].sum()
     minutes_to_reencode_sum = df_show["minutes_to_reencode"].sum()
-    percent_to_reencode = minutes_to_reencode_sum / minutes_ok_sum
+    minutes_wo_video_encode_sum = df_show["minutes_wo_video_encode"].sum()
+    minutes_sum = minutes_ok_sum + minutes_to_reencode_sum
+    if minutes_sum > 0:
+        percent_to_reencode = minutes_to_reencode_sum / minutes_sum
+    else:
+        percent_to_reencode = 0
 
     # round values
-    df_show["minutes_ok"] = df_show["minutes_ok"].round(1)
-    df_show["minutes_to_reencode"] = df_show["minutes_to_reencode"].round(1)
+    for column_name in list_column_minutes:
+        df_show[column_name] = df_show[column_name].round(1)
 
     # show reencode_plan and minutes to reencode
     print(df_show.to_string(index=False))
@@ -48,3 +105,7 @@ def show_reencode_plan(df_filled):
         f"\nThere is {minutes_to_reencode_sum:.1f} minutes "
         + f"({percent_to_reencode*100:.0f}%) to reencode"
     )
+    print(
+        f"{minutes_wo_video_encode_sum:.1f} minutes of them avoid a video "
+        + "encode (only remux or audio to aac)"
+    )
@@ -0,0 +1,235 @@
+"""
+    Create by: apenasrr
+    Source: https://github.com/apenasrr/mass_videojoin
+
+    Prediction of the size of the joined videos. The TS remux, the ADTS to
+    ASC audio conversion and the +faststart rewrite change the size of each
+    source. The ratio joined size / source size is measured after each join
+    and kept per container and codecs (e.g.: mp4-h264-aac) in the
+    size_model.json of the project, so the join planner sums the predicted
+    sizes instead of the source sizes.
+    Before the first join of a project, the sizes of the TS remux kept in
+    ts_cache are the prior. The TS overhead makes it an upper bound, so the
+    first blocks are planned below the limit instead of above it.
+"""
+
+import json
+import logging
+import os
+
+import ts_cache
+
+FILE_NAME_MODEL = "size_model.json"
+
+
+def get_path_file_model(path_file_report):
+
+    path_folder_project = os.path.dirname(path_file_report)
+    return os.path.join(path_folder_project, FILE_NAME_MODEL)
+
+
+def load_model(path_file_report):
+    """
+    Returns:
+        dict: key: size key. value: dict with keys: bytes_origin, bytes_final
+    """
+
+    path_file_model = get_path_file_model(path_file_report)
+    if not os.path.isfile(path_file_model):
+        return {}
+    try:
+        with open(path_file_model, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except ValueError:
+        logging.warning(f"Ignored corrupt size model: {path_file_model}")
+        return {}
+
+
+def save_model(dict_model, path_file_report):
+
+    path_file_model = get_path_file_model(path_file_report)
+    path_file_temp = path_file_model + ".tmp"
+    with open(path_file_temp, "w", encoding="utf-8") as f:
+        json.dump(dict_model, f, indent=4, sort_keys=True)
+    os.replace(path_file_temp, path_file_model)
+
+
+def get_serie_size_key(df):
+    """
+    Args:
+        df (dataframe): columns: file_name, video_codec, audio_codec
+
+    Returns:
+        serie: size key of each video, e.g.: mp4-h264-aac
+    """
+
+    serie_extension = (
+        df["file_name"].astype(str).str.rsplit(".", n=1).str[-1].str.lower()
+    )
+    serie_size_key = (
+        serie_extension
+        + "-"
+        + df["video_codec"].fillna("").astype(str)
+        + "-"
+        + df["audio_codec"].fillna("").astype(str)
+    )
+    return serie_size_key
+
+
+def get_ratio_measure(dict_measure):
+
+    if dict_measure["bytes_origin"] == 0:
+        return None
+    return dict_measure["bytes_final"] / dict_measure["bytes_origin"]
+
+
+def get_measure_total(dict_model):
+
+    bytes_origin = sum(d["bytes_origin"] for d in dict_model.values())
+    bytes_final = sum(d["bytes_final"] for d in dict_model.values())
+    return {"bytes_origin": bytes_origin, "bytes_final": bytes_final}
+
+
+def get_ratio(dict_model, size_key, dict_model_ts=None):
+    """
+    Args:
+        dict_model (dict): measures of the joins, from load_model
+        size_key (str): size key of the video
+        dict_model_ts (dict, optional): measures of the TS remux, from
+                                        get_dict_model_ts. Defaults to None
+
+    Returns:
+        float: ratio joined size / source size of the size_key. Without
+               join measures of the size_key, the ratio of its TS remux,
+               then the ratio of all join measures, of all TS remux, or 1
+    """
+
+    dict_model_ts = dict_model_ts or {}
+    list_dict_measure = [
+        dict_model.get(size_key),
+        dict_model_ts.get(size_key),
+        get_measure_total(dict_model),
+        get_measure_total(dict_model_ts),
+    ]
+    for dict_measure in list_dict_measure:
+        if dict_measure is None:
+            continue
+        ratio = get_ratio_measure(dict_measure)
+        if ratio is not None:
+            return ratio
+    return 1.0
+
+
+def get_dict_model_ts(df):
+    """Measures of the TS remux of the videos kept in ts_cache, e.g. by the
+    duration correction
+
+    Args:
+        df (dataframe): columns: file_path, file_name, file_size,
+                        video_codec, audio_codec
+
+    Returns:
+        dict: same format of load_model. Empty if ts_cache is disabled
+    """
+
+    dict_model_ts = {}
+    if not ts_cache.is_enabled():
+        return dict_model_ts
+
+    serie_size_key = get_serie_size_key(df)
+    for path_file, file_size, size_key in zip(
+        df["file_path"], df["file_size"], serie_size_key
+    ):
+        key = ts_cache.get_key(path_file)
+        if key is None:
+            continue
+        try:
+            size_ts = os.path.getsize(ts_cache.get_path_file_ts(key))
+        except OSError:
+            continue
+        dict_measure = dict_model_ts.setdefault(
+            size_key, {"bytes_origin": 0, "bytes_final": 0}
+        )
+        dict_measure["bytes_origin"] += int(file_size)
+        dict_measure["bytes_final"] += size_ts
+    return dict_model_ts
+
+
+def merge_model(dict_model, dict_model_add):
+    """
+    Returns:
+        dict: dict_model with the measures of dict_model_add summed
+    """
+
+    for size_key, dict_measure_add in dict_model_add.items():
+        dict_measure = dict_model.setdefault(
+            size_key, {"bytes_origin": 0, "bytes_final": 0}
+        )
+        dict_measure["bytes_origin"] += dict_measure_add["bytes_origin"]
+        dict_measure["bytes_final"] += dict_measure_add["bytes_final"]
+    return dict_model
+
+
+def get_serie_size_predicted(df, dict_model, max_size_bytes,
+                             dict_model_ts=None):
+    """Predict the size of each video inside a joined file
+
+    Args:
+        df (dataframe): columns: file_name, file_size, video_codec,
+                        audio_codec
+        dict_model (dict): model from load_model
+        max_size_bytes (int): size limit of each joined file. A video that
+                              fits in it alone is never predicted above it,
+                              because a single video is copied unchanged
+        dict_model_ts (dict, optional): measures of the TS remux, used
+                                        where dict_model has no measure.
+                                        Defaults to None
+
+    Returns:
+        serie: predicted size in bytes
+    """
+
+    serie_size_key = get_serie_size_key(df)
+    dict_ratio = {
+        size_key: get_ratio(dict_model, size_key, dict_model_ts)
+        for size_key in serie_size_key.unique()
+    }
+    serie_size_predicted = (
+        df["file_size"] * serie_size_key.map(dict_ratio)
+    ).round().astype("int64")
+
+    mask_fit_alone = df["file_size"] <= max_size_bytes
+    serie_size_predicted[mask_fit_alone] = serie_size_predicted[
+        mask_fit_alone
+    ].clip(upper=max_size_bytes)
+    return serie_size_predicted
+
+
+def update_model(dict_model, df_block, size_final):
+    """Add the measure of a joined file. The ratio of the block is credited
+    to each size key in proportion of its source bytes
+
+    Args:
+        dict_model (dict): model from load_model
+        df_block (dataframe): videos of the joined file. Columns:
+                              file_name, file_size, video_codec, audio_codec
+        size_final (int): size of the joined file
+
+    Returns:
+        dict: dict_model updated
+    """
+
+    size_origin = int(df_block["file_size"].sum())
+    if size_origin == 0:
+        return dict_model
+    ratio_block = size_final / size_origin
+
+    serie_size_key = get_serie_size_key(df_block)
+    serie_bytes_key = df_block["file_size"].groupby(serie_size_key).sum()
+    for size_key, bytes_origin in serie_bytes_key.items():
+        dict_measure = dict_model.setdefault(
+            size_key, {"bytes_origin": 0, "bytes_final": 0}
+        )
+        dict_measure["bytes_origin"] += int(bytes_origin)
+        dict_measure["bytes_final"] += int(round(bytes_origin * ratio_block))
+    return dict_model
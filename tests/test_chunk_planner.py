@@ -0,0 +1,158 @@
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import make_join
+
+MB = 1024 ** 2
+NO_DURATION_LIMIT = np.iinfo(np.int64).max // 2
+
+
+def get_df(list_size_mb, list_group=None, list_duration=None):
+
+    qt_videos = len(list_size_mb)
+    return pd.DataFrame(
+        {
+            "file_path_folder": ["c:\\videos"] * qt_videos,
+            "file_name": [f"{i}.mp4" for i in range(qt_videos)],
+            "file_size": [size_mb * MB for size_mb in list_size_mb],
+            "duration": list_duration or ["00:01:00.00"] * qt_videos,
+            "group_encode": list_group or [1] * qt_videos,
+        }
+    )
+
+
+def get_list_chunk_len(list_chunk_videos):
+
+    return [len(chunk_videos) for chunk_videos in list_chunk_videos]
+
+
+def get_list_chunk_size(list_size, list_chunk_end):
+
+    array_bound = np.concatenate(([0], list_chunk_end))
+    return [int(sum(list_size[start:end]))
+            for start, end in zip(array_bound[:-1], array_bound[1:])]
+
+
+def get_partition_best(list_size, qt_chunk, max_size):
+    """Brute force: smallest maximum, then smallest sum of squares"""
+
+    qt_videos = len(list_size)
+    best = None
+    for list_cut in combinations(range(1, qt_videos), qt_chunk - 1):
+        list_chunk_size = get_list_chunk_size(list_size,
+                                              list(list_cut) + [qt_videos])
+        if max(list_chunk_size) > max_size:
+            continue
+        key = (max(list_chunk_size), sum(x * x for x in list_chunk_size))
+        if best is None or key < best:
+            best = key
+    return best
+
+
+def test_greedy_fills_each_chunk_up_to_the_limit():
+
+    df = get_df([100] * 10)
+    list_chunk_videos = make_join.get_list_chunk_videos(df, 400)
+    assert get_list_chunk_len(list_chunk_videos) == [4, 4, 2]
+    assert list_chunk_videos[0][0] == "c:\\videos\\0.mp4"
+
+
+def test_greedy_respects_duration_limit_and_groups():
+
+    df = get_df([10] * 6, list_group=[1, 1, 1, 2, 2, 2],
+                list_duration=["00:40:00.00"] * 6)
+    list_chunk_videos = make_join.get_list_chunk_videos(
+        df, 1000, "01:30:00.00"
+    )
+    assert get_list_chunk_len(list_chunk_videos) == [2, 1, 2, 1]
+
+
+def test_groups_are_planned_in_order_of_first_appearance():
+
+    df = get_df([10] * 4, list_group=[2, 1, 2, 1])
+    list_chunk_videos = make_join.get_list_chunk_videos(df, 1000)
+    assert list_chunk_videos == [
+        ["c:\\videos\\0.mp4", "c:\\videos\\2.mp4"],
+        ["c:\\videos\\1.mp4", "c:\\videos\\3.mp4"],
+    ]
+
+
+def test_video_bigger_than_limit_exits():
+
+    df = get_df([100, 500, 100])
+    with pytest.raises(SystemExit):
+        make_join.get_list_chunk_videos(df, 400)
+
+
+def test_balanced_avoids_the_small_tail_chunk():
+
+    df = get_df([100] * 10)
+    list_chunk_videos = make_join.get_list_chunk_videos(df, 400, "00:00:00.00",
+                                                        "balanced")
+    assert get_list_chunk_len(list_chunk_videos) == [4, 3, 3]
+
+
+def test_balanced_mixed_sizes_are_more_even_than_greedy():
+
+    # greedy: 400, 450, 50 MB
+    list_size_mb = [200, 200, 200, 200, 50, 50]
+    df = get_df(list_size_mb)
+    list_greedy = make_join.get_list_chunk_videos(df.copy(), 450)
+    list_balanced = make_join.get_list_chunk_videos(df.copy(), 450,
+                                                    "00:00:00.00", "balanced")
+    list_size_greedy = get_list_chunk_size(
+        list_size_mb, np.cumsum(get_list_chunk_len(list_greedy))
+    )
+    list_size_balanced = get_list_chunk_size(
+        list_size_mb, np.cumsum(get_list_chunk_len(list_balanced))
+    )
+    assert len(list_balanced) == len(list_greedy)
+    assert max(list_size_balanced) <= 450
+    assert np.std(list_size_balanced) < np.std(list_size_greedy)
+    assert min(list_size_balanced) > min(list_size_greedy)
+
+
+def test_balanced_matches_brute_force_partition():
+
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        qt_videos = int(rng.integers(1, 10))
+        array_size = rng.integers(1, 100, qt_videos).astype(np.int64)
+        max_size = int(rng.integers(array_size.max(), 300))
+        array_duration = np.zeros(qt_videos, dtype=np.int64)
+        array_group_end = np.full(qt_videos, qt_videos)
+
+        list_greedy, _ = make_join.get_list_chunk_end(
+            array_size, array_duration, array_group_end, max_size,
+            NO_DURATION_LIMIT
+        )
+        list_balanced, _ = make_join.get_list_chunk_end_balanced(
+            array_size, array_duration, array_group_end, max_size,
+            NO_DURATION_LIMIT
+        )
+        assert len(list_balanced) == len(list_greedy)
+        list_chunk_size = get_list_chunk_size(array_size, list_balanced)
+        key = (max(list_chunk_size), sum(x * x for x in list_chunk_size))
+        assert key == get_partition_best(array_size, len(list_greedy),
+                                         max_size)
+
+
+def test_balanced_respects_duration_limit():
+
+    array_size = np.array([10, 10, 10, 10, 10, 10], dtype=np.int64)
+    array_duration = np.array([50, 40, 10, 10, 10, 10],
+                              dtype=np.int64) * 60 * 1_000_000
+    duration_limit_us = 60 * 60 * 1_000_000
+    array_group_end = np.full(6, 6)
+    list_greedy, _ = make_join.get_list_chunk_end(
+        array_size, array_duration, array_group_end, 60, duration_limit_us
+    )
+    list_balanced, _ = make_join.get_list_chunk_end_balanced(
+        array_size, array_duration, array_group_end, 60, duration_limit_us
+    )
+    assert len(list_balanced) == len(list_greedy) == 3
+    assert max(get_list_chunk_size(array_duration, list_balanced)) <= \
+        duration_limit_us
@@ -0,0 +1,41 @@
+import asyncio
+import threading
+
+from ffprobe_micro import gather_limited
+
+
+def test_thread_semaphore_shared_by_event_loops():
+
+    semaphore_thread = threading.BoundedSemaphore(2)
+    lock = threading.Lock()
+    dict_count = {"running": 0, "max": 0}
+
+    async def job(index, semaphore=None):
+        async with semaphore:
+            with lock:
+                dict_count["running"] += 1
+                dict_count["max"] = max(dict_count["max"],
+                                        dict_count["running"])
+            await asyncio.sleep(0.02)
+            with lock:
+                dict_count["running"] -= 1
+        return index
+
+    list_result = []
+
+    def run_loop():
+        list_result.append(asyncio.run(
+            gather_limited(job, [(i,) for i in range(6)], 4,
+                           semaphore_thread)
+        ))
+
+    list_thread = [threading.Thread(target=run_loop) for _ in range(2)]
+    for thread in list_thread:
+        thread.start()
+    for thread in list_thread:
+        thread.join()
+
+    assert dict_count["max"] == 2
+    assert list_result == [list(range(6))] * 2
+    # every slot was given back
+    assert all(semaphore_thread.acquire(blocking=False) for _ in range(2))
@@ -0,0 +1,118 @@
+import os
+
+import pandas as pd
+
+import job_journal
+import job_state
+
+
+def get_path_file_report(tmp_path):
+
+    path_file_report = str(tmp_path / "video_details.xlsx")
+    list_file_name = ["a.mp4", "b.mp4", "c.mp4"]
+    df = pd.DataFrame({"file_path_folder_origin": ["c:\\videos"] * 3,
+                       "file_name_origin": list_file_name,
+                       "file_path_folder": ["c:\\videos"] * 3,
+                       "file_name": list_file_name,
+                       "reencode_done": [0, 0, 0]})
+    df.to_excel(path_file_report, index=False)
+    job_state.save_report_state(df, path_file_report)
+    return path_file_report
+
+
+def test_replay_finished_jobs(tmp_path):
+
+    path_file_report = get_path_file_report(tmp_path)
+    df = job_state.load_report_state(path_file_report)
+    df.loc[[0, 2], "reencode_done"] = 1
+    df.loc[[0, 2], "file_name"] = ["a_encoded.mp4", "c_encoded.mp4"]
+    job_journal.record_job_done(df, path_file_report, "reencode", [0],
+                                ["reencode_done", "file_name"])
+    job_journal.record_job_done(df, path_file_report, "reencode", [2],
+                                ["reencode_done", "file_name"])
+    # line cut by a crash
+    path_file_journal = job_journal.get_path_file_journal(path_file_report)
+    with open(path_file_journal, "a", encoding="utf-8") as f:
+        f.write('{"stage": "reencode", "rows": {"1": ')
+
+    # the interrupted run left the state without the jobs
+    df_state = job_state.load_report_state(path_file_report)
+    df_state = job_journal.compact_journal(df_state, path_file_report)
+
+    assert df_state["reencode_done"].tolist() == [1, 0, 1]
+    assert df_state["file_name"].tolist() == ["a_encoded.mp4", "b.mp4",
+                                              "c_encoded.mp4"]
+    assert not os.path.exists(path_file_journal)
+    df_reloaded = job_state.load_report_state(path_file_report)
+    assert df_reloaded["reencode_done"].tolist() == [1, 0, 1]
+
+
+def test_started_job_without_done_is_interrupted(tmp_path):
+
+    path_file_report = get_path_file_report(tmp_path)
+    df = job_state.load_report_state(path_file_report)
+    job_journal.record_job_started(path_file_report, "reencode", [0],
+                                   ["a_encoded.mp4"])
+    job_journal.record_job_started(path_file_report, "reencode", [1],
+                                   ["b_encoded.mp4"])
+    df.loc[0, "reencode_done"] = 1
+    job_journal.record_job_done(df, path_file_report, "reencode", [0],
+                                ["reencode_done"], ["a_encoded.mp4"])
+
+    assert job_journal.get_list_output_interrupted(
+        path_file_report, "reencode"
+    ) == ["b_encoded.mp4"]
+
+    # only started entries: nothing to apply
+    df_state = job_state.load_report_state(path_file_report)
+    job_journal.compact_journal(df_state, path_file_report)
+    job_journal.record_job_started(path_file_report, "reencode", [1],
+                                   ["b_encoded.mp4"])
+    df_state = job_journal.compact_journal(df_state, path_file_report)
+    assert df_state["reencode_done"].tolist() == [1, 0, 0]
+
+
+def test_chunk_joined_replay(tmp_path):
+
+    path_file_report = get_path_file_report(tmp_path)
+    list_dict_videos_duration = [
+        {"file_path_origin": "a.mp4", "duration_real": "00:01:00.00"}
+    ]
+    job_journal.record_chunk_joined(path_file_report, "pipeline_join",
+                                    ["a.mp4"], "out-001.mp4",
+                                    list_dict_videos_duration, 1.5)
+
+    dict_chunk_joined = job_journal.get_dict_chunk_joined(path_file_report,
+                                                          "pipeline_join")
+
+    assert list(dict_chunk_joined) == ["out-001.mp4"]
+    assert dict_chunk_joined["out-001.mp4"]["inputs"] == ["a.mp4"]
+    assert dict_chunk_joined["out-001.mp4"]["result"] == \
+        list_dict_videos_duration
+
+
+def test_replay_after_xlsx_edited(tmp_path):
+
+    path_file_report = get_path_file_report(tmp_path)
+    df = job_state.load_report_state(path_file_report)
+    df.loc[2, "reencode_done"] = 1
+    df.loc[2, "file_name"] = "c_enc.mp4"
+    job_journal.record_job_done(df, path_file_report, "reencode", [2],
+                                ["reencode_done", "file_name"])
+    df.loc[1, "reencode_done"] = 1
+    job_journal.record_job_done(df, path_file_report, "reencode", [1],
+                                ["reencode_done"])
+
+    # the user removes "a" and "b" from the xlsx before resuming
+    df_xlsx = pd.read_excel(path_file_report)
+    df_xlsx = df_xlsx[df_xlsx["file_name"] == "c.mp4"]
+    df_xlsx.reset_index(drop=True).to_excel(path_file_report, index=False)
+    os.utime(job_state.get_path_file_state(path_file_report), (0, 0))
+
+    df_state = job_state.load_report_state(path_file_report)
+    df_state = job_journal.compact_journal(df_state, path_file_report)
+
+    assert len(df_state) == 1
+    assert df_state["file_name"].tolist() == ["c_enc.mp4"]
+    assert df_state["reencode_done"].tolist() == [1]
+    assert df_state["reencode_done"].dtype == "int64"
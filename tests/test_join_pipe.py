@@ -0,0 +1,36 @@
+import subprocess
+import sys
+
+import pytest
+
+import video_tools
+
+
+def test_muxer_death_leaves_no_child(tmp_path, monkeypatch):
+
+    list_process = []
+
+    class PopenRecorded(subprocess.Popen):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            list_process.append(self)
+
+    # the muxer exits at once, the part writes more than a pipe buffer
+    monkeypatch.setattr(video_tools.subprocess, "Popen", PopenRecorded)
+    monkeypatch.setattr(video_tools, "get_command_array_ts_muxer",
+                        lambda file_name_output: [sys.executable, "-c",
+                                                  "import sys; sys.exit(1)"])
+    monkeypatch.setattr(
+        video_tools, "get_command_array_ts_part",
+        lambda file_path: [sys.executable, "-c",
+                           "import sys, time\n"
+                           "sys.stdout.buffer.write(b'0' * 2 ** 22)\n"
+                           "time.sleep(60)"],
+    )
+
+    with pytest.raises(Exception, match="TS muxer"):
+        video_tools.join_mp4_pipe(["a.mp4", "b.mp4"],
+                                  str(tmp_path / "out.mp4"))
+
+    assert len(list_process) == 2
+    assert all(process.poll() is not None for process in list_process)
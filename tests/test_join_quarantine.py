@@ -0,0 +1,99 @@
+import os
+
+import pandas as pd
+
+import make_join
+
+
+def create_report(path_folder):
+    """Report of 4 videos already planned in 2 blocks"""
+
+    list_dict_row = []
+    for index in range(4):
+        path_file = os.path.join(path_folder, f"{index}.mp4")
+        number_block = index // 2 + 1
+        list_dict_row.append(
+            {
+                "file_path_folder": path_folder,
+                "file_name": f"{index}.mp4",
+                "file_path": path_file,
+                "file_size": 1000,
+                "video_codec": "h264",
+                "audio_codec": "aac",
+                "duration": "00:00:10.00",
+                "join_done": 0,
+                "number_block": number_block,
+                "file_output": os.path.join(
+                    path_folder, "output", f"o-{number_block:03d}.mp4"
+                ),
+            }
+        )
+    path_file_report = os.path.join(path_folder, "video_details.xlsx")
+    pd.DataFrame(list_dict_row).to_excel(path_file_report, index=False)
+    return path_file_report
+
+
+def get_run_join_job_fake(set_file_output_fail):
+    """run_join_job that quarantines the blocks of set_file_output_fail and
+    measures 12.5 seconds for each video of the others"""
+
+    def run_join_job_fake(list_file_path_to_join, file_output, *args):
+
+        if os.path.basename(file_output) in set_file_output_fail:
+            return None, 0.0
+        os.makedirs(os.path.dirname(file_output), exist_ok=True)
+        with open(file_output, "wb") as f:
+            f.write(b"\0" * 1000 * len(list_file_path_to_join))
+        list_dict_videos_duration = [
+            {"file_path_origin": file_path, "duration_real": "00:00:12.50"}
+            for file_path in list_file_path_to_join
+        ]
+        return list_dict_videos_duration, 0.0
+
+    return run_join_job_fake
+
+
+def run_join(path_file_report):
+    """Step 3 as called by set_join_videos"""
+
+    df = make_join.join_videos(
+        path_file_report,
+        max_size_mb=1000,
+        filename_output="o",
+        path_folder_videos_joined=os.path.dirname(path_file_report),
+        path_folder_videos_cache=os.path.dirname(path_file_report),
+        start_index_output=1,
+        join_workers=2,
+    )
+    df.to_excel(path_file_report, index=False)
+    return df
+
+
+def test_retry_of_quarantined_block_keeps_report_columns(tmp_path,
+                                                         monkeypatch):
+
+    path_file_report = create_report(str(tmp_path))
+
+    # first run: block 2 quarantined
+    monkeypatch.setattr(make_join, "run_join_job",
+                        get_run_join_job_fake({"o-002.mp4"}))
+    df = run_join(path_file_report)
+    assert df["join_done"].tolist() == [1, 1, -1, -1]
+    assert df["duration"].tolist()[:2] == ["00:00:12.50"] * 2
+    assert df["video_origin_duration_pre_join"].tolist() == \
+        ["00:00:10.00"] * 4
+
+    # second run: block 2 retried
+    monkeypatch.setattr(make_join, "run_join_job",
+                        get_run_join_job_fake(set()))
+    df = run_join(path_file_report)
+    assert list(df.columns).count("video_origin_duration_pre_join") == 1
+    assert "video_duration_real" not in df.columns
+    assert df["join_done"].tolist() == [1, 1, 1, 1]
+    assert df["duration"].tolist() == ["00:00:12.50"] * 4
+    assert df["video_origin_duration_pre_join"].tolist() == \
+        ["00:00:10.00"] * 4
+
+    # third run: nothing to join, nothing changes
+    df_third = run_join(path_file_report)
+    pd.testing.assert_frame_equal(df_third, df)
@@ -0,0 +1,53 @@
+import logging
+
+import numpy as np
+
+from keyframe_index import get_list_cut_time
+
+
+def get_array_keyframe(list_time, list_pos):
+
+    return np.array(list(zip(list_time, list_pos)), dtype="<f8")
+
+
+def get_list_part_size(array_keyframe, list_cut_time, file_size,
+                       start_time=0):
+
+    dict_pos = {time: pos for time, pos in array_keyframe}
+    list_pos = [0] + [dict_pos[time + start_time] for time in list_cut_time]
+    list_pos.append(file_size)
+    return [end - start for start, end in zip(list_pos[:-1], list_pos[1:])]
+
+
+def test_cut_time_from_start_time():
+
+    array_keyframe = get_array_keyframe([10, 11, 12, 13], [0, 25, 50, 75])
+
+    list_cut_time = get_list_cut_time(array_keyframe, 100, 60, start_time=10)
+
+    assert list_cut_time == [2.0]
+
+
+def test_cut_on_previous_keyframe_within_limit():
+
+    # after two small parts, the even cut of the remainder is 310 bytes,
+    # above the 300 limit. Its nearest keyframe, 685, would overshoot
+    list_pos = [0, 100, 200, 380, 600, 685, 860]
+    array_keyframe = get_array_keyframe(range(len(list_pos)), list_pos)
+
+    list_cut_time = get_list_cut_time(array_keyframe, 1000, 300)
+
+    list_part_size = get_list_part_size(array_keyframe, list_cut_time, 1000)
+    assert max(list_part_size) <= 300
+    assert sum(list_part_size) == 1000
+
+
+def test_warn_when_keyframes_too_sparse(caplog):
+
+    array_keyframe = get_array_keyframe([0, 1], [0, 300])
+
+    with caplog.at_level(logging.WARNING):
+        list_cut_time = get_list_cut_time(array_keyframe, 400, 200)
+
+    assert list_cut_time == [1.0]
+    assert "bigger than the limit" in caplog.text
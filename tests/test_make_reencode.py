@@ -0,0 +1,47 @@
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import make_reencode
+
+
+def test_exit_drops_queued_reencodes(tmp_path, monkeypatch):
+
+    df = pd.DataFrame({"video_resolution_to_change": ["640x360"] * 5,
+                       "reencode_done": [0] * 5})
+    list_index_started = []
+    lock = threading.Lock()
+
+    def run_reencode_job(dict_, path_folder_encoded, threads=0,
+                         path_file_report=None):
+        with lock:
+            list_index_started.append(dict_.name)
+        time.sleep(0.05)
+        return True, 0.05
+
+    def update_file_report(df, dict_video_data, path_folder_encoded):
+        # e.g. the metadata of the reencoded video can't be read
+        raise SystemExit
+
+    monkeypatch.setattr(make_reencode, "ask_for_delete_old_videos_encode",
+                        lambda path_folder_encoded: None)
+    monkeypatch.setattr(make_reencode, "remove_reencode_interrupted",
+                        lambda path_file_report: None)
+    monkeypatch.setattr(make_reencode.job_state, "load_report_state",
+                        lambda path_file_report: df)
+    monkeypatch.setattr(make_reencode, "create_report_backup",
+                        lambda **kwargs: None)
+    monkeypatch.setattr(make_reencode, "sort_df_longest_first",
+                        lambda df: df)
+    monkeypatch.setattr(make_reencode, "run_reencode_job", run_reencode_job)
+    monkeypatch.setattr(make_reencode, "update_file_report",
+                        update_file_report)
+
+    with pytest.raises(SystemExit):
+        make_reencode.make_reencode(str(tmp_path / "video_details.xlsx"),
+                                    str(tmp_path), reencode_workers=1)
+
+    # the running reencode finishes, the queued ones are dropped
+    assert len(list_index_started) <= 2
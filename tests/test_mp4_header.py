@@ -0,0 +1,134 @@
+import struct
+
+import pytest
+
+import mp4_header
+
+
+def box(box_type, body):
+
+    return struct.pack(">I4s", 8 + len(body), box_type.encode()) + body
+
+
+def box_64(box_type, body):
+
+    return struct.pack(">I4sQ", 1, box_type.encode(), 16 + len(body)) + body
+
+
+def get_body_header_time(timescale, duration):
+    """mvhd and mdhd version 0"""
+
+    return b"\0" * 12 + struct.pack(">II", timescale, duration) + b"\0" * 80
+
+
+def get_entry_avc1(width, height, profile_idc, entry_type="avc1"):
+
+    body_avcc = bytes([1, profile_idc, 0, 40]) + b"\0" * 8
+    body = (b"\0" * 24 + struct.pack(">HH", width, height) + b"\0" * 50
+            + box("avcC", body_avcc))
+    return box(entry_type, body)
+
+
+def get_entry_mp4a(object_type):
+
+    body_decoder_config = bytes([object_type]) + b"\0" * 12
+    body_es = (struct.pack(">HB", 1, 0) + bytes([0x04])
+               + bytes([len(body_decoder_config)]) + body_decoder_config)
+    body_esds = b"\0" * 4 + bytes([0x03, len(body_es)]) + body_es
+    return box("mp4a", b"\0" * 28 + box("esds", body_esds))
+
+
+def get_trak(handler_type, entry, timescale=1000, duration=10000,
+             function_box=box):
+
+    body_hdlr = b"\0" * 8 + handler_type.encode() + b"\0" * 12
+    body_stsd = struct.pack(">II", 0, 1) + entry
+    body_stsz = struct.pack(">III", 0, 1000, 300)
+    stbl = box("stbl", box("stsd", body_stsd) + box("stsz", body_stsz))
+    mdia = box(
+        "mdia",
+        box("mdhd", get_body_header_time(timescale, duration))
+        + box("hdlr", body_hdlr)
+        + box("minf", stbl),
+    )
+    return function_box("trak", mdia)
+
+
+def write_mp4(path_file, list_box_moov, function_box=box):
+
+    mvhd = box("mvhd", get_body_header_time(1000, 10000))
+    moov = function_box("moov", mvhd + b"".join(list_box_moov))
+    data = (box("ftyp", b"isom" + b"\0" * 4) + moov
+            + box("mdat", b"\0" * 100))
+    path_file.write_bytes(data)
+    return str(path_file)
+
+
+@pytest.fixture
+def list_trak():
+
+    return [
+        get_trak("vide", get_entry_avc1(1280, 720, 100)),
+        get_trak("soun", get_entry_mp4a(0x40)),
+    ]
+
+
+def test_avc1_and_mp4a(tmp_path, list_trak):
+
+    path_file = write_mp4(tmp_path / "a.mp4", list_trak)
+
+    dict_inf = mp4_header.get_dict_inf(path_file)
+
+    stream_video, stream_audio = dict_inf["streams"]
+    assert stream_video["codec_name"] == "h264"
+    assert stream_video["profile"] == "High"
+    assert stream_video["is_avc"] == "true"
+    assert (stream_video["width"], stream_video["height"]) == (1280, 720)
+    assert stream_video["nb_frames"] == "300"
+    assert stream_audio["codec_name"] == "aac"
+    assert dict_inf["format"]["format_name"] == mp4_header.FORMAT_NAME_MOV
+    assert dict_inf["format"]["duration"] == "10.000000"
+
+
+def test_box_64_bit_size(tmp_path):
+
+    list_trak = [
+        get_trak("vide", get_entry_avc1(640, 360, 66), function_box=box_64),
+        get_trak("soun", get_entry_mp4a(0x40)),
+    ]
+    path_file = write_mp4(tmp_path / "a.mp4", list_trak, function_box=box_64)
+
+    dict_inf = mp4_header.get_dict_inf(path_file)
+
+    stream_video = dict_inf["streams"][0]
+    assert stream_video["profile"] == "Baseline"
+    assert (stream_video["width"], stream_video["height"]) == (640, 360)
+
+
+def test_fragmented_is_not_parsed(tmp_path, list_trak):
+
+    mvex = box("mvex", box("trex", b"\0" * 24))
+    path_file = write_mp4(tmp_path / "a.mp4", list_trak + [mvex])
+
+    assert mp4_header.get_dict_inf(path_file) is None
+
+
+def test_not_avc_is_not_parsed(tmp_path):
+
+    list_trak = [
+        get_trak("vide", get_entry_avc1(1280, 720, 1, entry_type="hvc1")),
+        get_trak("soun", get_entry_mp4a(0x40)),
+    ]
+    path_file = write_mp4(tmp_path / "a.mp4", list_trak)
+
+    assert mp4_header.get_dict_inf(path_file) is None
+
+
+def test_truncated_box_is_not_parsed(tmp_path, list_trak):
+
+    path_file = write_mp4(tmp_path / "a.mp4", list_trak)
+    data = (tmp_path / "a.mp4").read_bytes()
+    # cut inside the second trak
+    (tmp_path / "a.mp4").write_bytes(data[:len(data) - 100 - 40])
+
+    assert mp4_header.get_dict_inf(path_file) is None
@@ -0,0 +1,261 @@
+import os
+import random
+import time
+
+import pandas as pd
+import pytest
+
+import job_journal
+import make_join
+import make_reencode
+import pipeline_dag
+import ts_cache
+
+MB = 1024 ** 2
+FOLDER_A = "c:\\videos\\a"
+FOLDER_B = "c:\\videos\\b"
+
+
+@pytest.fixture(autouse=True)
+def ts_cache_disabled(monkeypatch):
+
+    # the size predicted is the file_size
+    monkeypatch.setattr(ts_cache, "max_size_bytes", 0)
+
+
+def test_chunk_cutter_same_plan_of_join(tmp_path):
+
+    rng = random.Random(7)
+    list_dict_row = []
+    for index in range(60):
+        seconds = rng.randint(10, 120)
+        list_dict_row.append(
+            {
+                "file_path_folder": str(tmp_path),
+                "file_name": f"{index}.mp4",
+                "file_size": rng.randint(1, 40) * MB,
+                "video_codec": "h264",
+                "audio_codec": "aac",
+                "duration": f"00:{seconds // 60:02d}:{seconds % 60:02d}.50",
+                "group_encode": index // 20 + 1,
+            }
+        )
+    df = pd.DataFrame(list_dict_row)
+
+    list_chunk_join = make_join.get_list_chunk_videos(
+        df.copy(), 100, "00:05:00.00", "greedy"
+    )
+
+    df["file_path"] = df["file_path_folder"] + "\\" + df["file_name"]
+    chunk_cutter = pipeline_dag.ChunkCutter(100 * MB, "00:05:00.00", {})
+    list_chunk_cutter = []
+    for _, dict_row in df.iterrows():
+        list_chunk_closed = chunk_cutter.add(dict_row,
+                                             dict_row["group_encode"])
+        if list_chunk_closed is not None:
+            list_chunk_cutter.append(list_chunk_closed)
+    list_chunk_cutter.append(chunk_cutter.close())
+
+    assert len(list_chunk_join) > 3
+    assert list_chunk_cutter == list_chunk_join
+
+
+def create_report(path_folder):
+    """Report of 5 videos in 2 folders. 1.mp4 is marked to reencode and
+    2.mp4 is big enough to be splitted"""
+
+    list_folder_size_mb = [
+        (FOLDER_A, 10),
+        (FOLDER_A, 12),
+        (FOLDER_A, 25),
+        (FOLDER_B, 5),
+        (FOLDER_B, 5),
+    ]
+    list_dict_row = []
+    for index, (path_folder_video, size_mb) in enumerate(
+        list_folder_size_mb
+    ):
+        list_dict_row.append(
+            {
+                "file_path_folder": path_folder_video,
+                "file_name": f"{index}.mp4",
+                "file_size": size_mb * MB,
+                "video_resolution": "1280x720",
+                "video_resolution_width": 1280,
+                "video_resolution_height": 720,
+                "total_bitrate": 1000,
+                "video_bitrate": 900,
+                "video_codec": "h264",
+                "video_profile": "High",
+                "is_avc": 1,
+                "audio_codec": "aac",
+                "duration": "00:00:10.00",
+                "duration_seconds": 10.0,
+                "video_resolution_to_change": "1280x720" if index == 1
+                else "",
+            }
+        )
+    path_file_report = os.path.join(path_folder, "video_details.xlsx")
+    pd.DataFrame(list_dict_row).to_excel(path_file_report, index=False)
+    return path_file_report
+
+
+def update_file_report_fake(df, dict_video_data, path_folder_encoded):
+
+    index = dict_video_data.name
+    df.loc[index, "file_path_folder"] = path_folder_encoded
+    df.loc[index, "file_name"] = "reencode_1.mp4"
+    df.loc[index, "file_size"] = 11 * MB
+    df.loc[index, "reencode_done"] = 1
+    return df
+
+
+def get_duration_corrected_fake(file_path, path_folder_cache_task):
+
+    # the first videos of the report finish last
+    file_name = file_path.split("\\")[-1]
+    time.sleep(0.05 * (5 - int(file_name[-5])))
+    return "00:00:10.00"
+
+
+def split_video_fake(dict_row, size_limit, duration_limit,
+                     path_folder_videos_splitted):
+
+    if dict_row["file_size"] <= size_limit:
+        return [dict_row]
+    list_dict_row = []
+    for part in (1, 2):
+        dict_row_part = dict_row.copy()
+        dict_row_part["file_path_folder"] = path_folder_videos_splitted
+        dict_row_part["file_name"] = f"2-part{part}.mp4"
+        dict_row_part["file_size"] = 13 * MB
+        list_dict_row.append(dict_row_part)
+    return list_dict_row
+
+
+def get_run_join_job_fake(list_file_output_joined, set_file_output_fail,
+                          file_output_interrupt=None):
+    """run_join_job that quarantines the chunks of set_file_output_fail,
+    raises RuntimeError on file_output_interrupt and measures 12.5 seconds
+    for each video of the others"""
+
+    def run_join_job_fake(list_file_path_to_join, file_output, *args):
+
+        file_name_output = os.path.basename(file_output)
+        if file_name_output == file_output_interrupt:
+            # after the joins of the other chunks are recorded
+            time.sleep(0.3)
+            raise RuntimeError("interrupted")
+        list_file_output_joined.append(file_name_output)
+        if file_name_output in set_file_output_fail:
+            return None, 0.0
+        with open(file_output, "wb") as f:
+            f.write(b"\0")
+        list_dict_videos_duration = [
+            {"file_path_origin": file_path, "duration_real": "00:00:12.50"}
+            for file_path in list_file_path_to_join
+        ]
+        return list_dict_videos_duration, 0.0
+
+    return run_join_job_fake
+
+
+@pytest.fixture
+def pipeline_fake(tmp_path, monkeypatch):
+
+    list_index_reencoded = []
+
+    def run_reencode_job_fake(dict_row, *args):
+        list_index_reencoded.append(dict_row.name)
+        return True, 0.0
+
+    monkeypatch.setattr(make_reencode, "run_reencode_job",
+                        run_reencode_job_fake)
+    monkeypatch.setattr(make_reencode, "update_file_report",
+                        update_file_report_fake)
+    monkeypatch.setattr(pipeline_dag, "get_duration_corrected",
+                        get_duration_corrected_fake)
+    monkeypatch.setattr(pipeline_dag, "split_video", split_video_fake)
+    for folder_name in ("encoded", "splitted", "joined", "cache"):
+        (tmp_path / folder_name).mkdir()
+    return list_index_reencoded
+
+
+def run_pipeline(path_folder):
+
+    return pipeline_dag.run_pipeline(
+        os.path.join(path_folder, "video_details.xlsx"),
+        mb_limit=30,
+        filename_output="o",
+        path_folder_videos_encoded=os.path.join(path_folder, "encoded"),
+        path_folder_videos_splitted=os.path.join(path_folder, "splitted"),
+        path_folder_videos_joined=os.path.join(path_folder, "joined"),
+        path_folder_videos_cache=os.path.join(path_folder, "cache"),
+        dag_io_workers=4,
+        join_retry_backoff=0,
+    )
+
+
+def test_pipeline_chunks_in_report_order(tmp_path, monkeypatch,
+                                         pipeline_fake):
+
+    path_file_report = create_report(str(tmp_path))
+    list_file_output_joined = []
+    monkeypatch.setattr(
+        make_join, "run_join_job",
+        get_run_join_job_fake(list_file_output_joined, {"o-002.mp4"})
+    )
+
+    df = run_pipeline(str(tmp_path))
+
+    assert pipeline_fake == [1]
+    assert df["file_name"].tolist() == [
+        "0.mp4", "reencode_1.mp4", "2-part1.mp4", "2-part2.mp4",
+        "3.mp4", "4.mp4",
+    ]
+    # 10 + 11 MB, then 2 parts of 13 MB, then the other folder
+    assert df["number_block"].tolist() == [1, 1, 2, 2, 3, 3]
+    assert sorted(list_file_output_joined) == \
+        ["o-001.mp4", "o-002.mp4", "o-003.mp4"]
+    # the quarantined chunk is retried by the step 3
+    assert df["join_done"].tolist() == [1, 1, -1, -1, 1, 1]
+    assert df["duration"].tolist()[:2] == ["00:00:12.50"] * 2
+    assert df["video_origin_duration_pre_join"].tolist() == \
+        ["00:00:10.00"] * 6
+    assert not os.path.exists(
+        job_journal.get_path_file_journal(path_file_report)
+    )
+
+
+def test_pipeline_resume_keeps_finished_jobs(tmp_path, monkeypatch,
+                                             pipeline_fake):
+
+    path_file_report = create_report(str(tmp_path))
+
+    # first run: interrupted while the chunk 2 is joined
+    list_file_output_joined = []
+    monkeypatch.setattr(
+        make_join, "run_join_job",
+        get_run_join_job_fake(list_file_output_joined, set(), "o-002.mp4")
+    )
+    with pytest.raises(RuntimeError):
+        run_pipeline(str(tmp_path))
+    assert sorted(list_file_output_joined) == ["o-001.mp4", "o-003.mp4"]
+
+    # second run: only the chunk 2 is joined, and nothing is reencoded
+    list_file_output_joined = []
+    monkeypatch.setattr(
+        make_join, "run_join_job",
+        get_run_join_job_fake(list_file_output_joined, set())
+    )
+    df = run_pipeline(str(tmp_path))
+
+    assert pipeline_fake == [1]
+    assert list_file_output_joined == ["o-002.mp4"]
+    assert df["file_name"].tolist()[1] == "reencode_1.mp4"
+    assert df["number_block"].tolist() == [1, 1, 2, 2, 3, 3]
+    assert df["join_done"].tolist() == [1] * 6
+    assert df["duration"].tolist() == ["00:00:12.50"] * 6
+    assert not os.path.exists(
+        job_journal.get_path_file_journal(path_file_report)
+    )
@@ -0,0 +1,40 @@
+import os
+
+import utils_mass_videojoin
+from utils_mass_videojoin import place_file
+
+
+def raise_os_error(path_file_source, path_file_dest):
+
+    raise OSError("not supported")
+
+
+def test_copy_file_range_before_hardlink(tmp_path, monkeypatch):
+
+    path_file_source = tmp_path / "source.mp4"
+    path_file_source.write_bytes(b"video")
+    path_file_dest = tmp_path / "dest.mp4"
+    monkeypatch.setattr(utils_mass_videojoin, "reflink_file", raise_os_error)
+
+    method = place_file(str(path_file_source), str(path_file_dest),
+                        allow_hardlink=True)
+
+    assert method == "copy_file_range"
+    assert path_file_dest.read_bytes() == b"video"
+    assert not os.path.samefile(path_file_source, path_file_dest)
+
+
+def test_hardlink_when_no_copy_in_kernel(tmp_path, monkeypatch):
+
+    path_file_source = tmp_path / "source.mp4"
+    path_file_source.write_bytes(b"video")
+    path_file_dest = tmp_path / "dest.mp4"
+    monkeypatch.setattr(utils_mass_videojoin, "reflink_file", raise_os_error)
+    monkeypatch.setattr(utils_mass_videojoin, "copy_file_range_file",
+                        raise_os_error)
+
+    method = place_file(str(path_file_source), str(path_file_dest),
+                        allow_hardlink=True)
+
+    assert method == "hardlink"
+    assert os.path.samefile(path_file_source, path_file_dest)
@@ -0,0 +1,43 @@
+import threading
+
+import pytest
+
+import probe_cache
+
+
+@pytest.fixture
+def path_file_cache(tmp_path, monkeypatch):
+
+    path_file = tmp_path / "probe_cache.sqlite"
+    monkeypatch.setattr(probe_cache, "path_file_cache", str(path_file))
+    yield path_file
+    probe_cache.close_connection()
+
+
+def test_one_connection_per_thread(tmp_path, path_file_cache):
+
+    path_file_video = tmp_path / "a.mp4"
+    path_file_video.write_bytes(b"video")
+
+    probe_cache.set_output(str(path_file_video), "json", "{}")
+    conn = probe_cache.get_connection()
+    assert probe_cache.get_output(str(path_file_video), "json") == "{}"
+    assert probe_cache.get_connection() is conn
+
+    list_conn = []
+    thread = threading.Thread(
+        target=lambda: list_conn.append(probe_cache.get_connection())
+    )
+    thread.start()
+    thread.join()
+    assert list_conn[0] is not conn
+
+
+def test_corrupt_cache_misses(tmp_path, path_file_cache):
+
+    path_file_cache.write_bytes(b"not a sqlite file" * 100)
+    path_file_video = tmp_path / "a.mp4"
+    path_file_video.write_bytes(b"video")
+
+    probe_cache.set_output(str(path_file_video), "json", "{}")
+    assert probe_cache.get_output(str(path_file_video), "json") is None
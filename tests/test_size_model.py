@@ -0,0 +1,83 @@
+import pandas as pd
+import pytest
+
+import size_model
+import ts_cache
+
+
+@pytest.fixture
+def cache_folder(tmp_path, monkeypatch):
+
+    monkeypatch.setattr(ts_cache, "path_folder_ts_cache",
+                        str(tmp_path / "ts_cache"))
+    monkeypatch.setattr(ts_cache, "max_size_bytes", 1024 ** 3)
+    (tmp_path / "ts_cache").mkdir()
+    return tmp_path
+
+
+def get_df(tmp_path, list_size, list_video_codec):
+
+    list_file_path = []
+    for i, size in enumerate(list_size):
+        path_file = tmp_path / f"{i}.mp4"
+        path_file.write_bytes(b"\0" * size)
+        list_file_path.append(str(path_file))
+    return pd.DataFrame(
+        {
+            "file_path": list_file_path,
+            "file_name": [f"{i}.mp4" for i in range(len(list_size))],
+            "file_size": list_size,
+            "video_codec": list_video_codec,
+            "audio_codec": ["aac"] * len(list_size),
+        }
+    )
+
+
+def store_ts(path_file, size_ts):
+
+    key = ts_cache.get_key(path_file)
+    with open(ts_cache.get_path_file_ts(key), "wb") as f:
+        f.write(b"\0" * size_ts)
+
+
+def test_prediction_calibrated_by_ts_before_first_join(cache_folder):
+
+    df = get_df(cache_folder, [1000, 1000, 2000], ["h264", "h264", "hevc"])
+    store_ts(df.loc[0, "file_path"], 1100)
+
+    dict_model_ts = size_model.get_dict_model_ts(df)
+    assert dict_model_ts == {
+        "mp4-h264-aac": {"bytes_origin": 1000, "bytes_final": 1100}
+    }
+
+    serie_size_predicted = size_model.get_serie_size_predicted(
+        df, {}, 10 ** 6, dict_model_ts
+    )
+    # hevc has no measure: ratio of all TS remux
+    assert serie_size_predicted.tolist() == [1100, 1100, 2200]
+
+
+def test_join_measure_wins_over_ts(cache_folder):
+
+    df = get_df(cache_folder, [1000, 1000], ["h264", "hevc"])
+    store_ts(df.loc[0, "file_path"], 1100)
+    store_ts(df.loc[1, "file_path"], 1200)
+    dict_model = {"mp4-h264-aac": {"bytes_origin": 1000, "bytes_final": 1010}}
+
+    serie_size_predicted = size_model.get_serie_size_predicted(
+        df, dict_model, 10 ** 6, size_model.get_dict_model_ts(df)
+    )
+    assert serie_size_predicted.tolist() == [1010, 1200]
+
+
+def test_without_ts_cache_ratio_is_one(cache_folder, monkeypatch):
+
+    monkeypatch.setattr(ts_cache, "max_size_bytes", 0)
+    df = get_df(cache_folder, [1000], ["h264"])
+
+    dict_model_ts = size_model.get_dict_model_ts(df)
+    assert dict_model_ts == {}
+    serie_size_predicted = size_model.get_serie_size_predicted(
+        df, {}, 10 ** 6, dict_model_ts
+    )
+    assert serie_size_predicted.tolist() == [1000]
@@ -0,0 +1,107 @@
+import os
+import time
+
+import pytest
+
+import ts_cache
+import video_tools
+
+
+@pytest.fixture
+def cache_folder(tmp_path, monkeypatch):
+
+    path_folder = tmp_path / "ts_cache"
+    path_folder.mkdir()
+    monkeypatch.setattr(ts_cache, "path_folder_ts_cache", str(path_folder))
+    monkeypatch.setattr(ts_cache, "max_size_bytes", 1024 ** 3)
+    return path_folder
+
+
+def store_entry(tmp_path, name, size, mtime):
+
+    path_file_origin = tmp_path / f"{name}.mp4"
+    path_file_origin.write_bytes(b"\0" * size)
+    key = ts_cache.get_key(str(path_file_origin))
+    path_file_temp = ts_cache.get_path_file_temp(key)
+    with open(path_file_temp, "wb") as f:
+        f.write(b"\0" * size)
+    path_file_ts = ts_cache.store(key, path_file_temp, 1.0,
+                                  str(path_file_origin))
+    os.utime(path_file_ts, (mtime, mtime))
+    return key
+
+
+def test_evict_least_recently_used(tmp_path, cache_folder, monkeypatch):
+
+    key_old = store_entry(tmp_path, "old", 100, 1000)
+    key_new = store_entry(tmp_path, "new", 100, 2000)
+    monkeypatch.setattr(ts_cache, "max_size_bytes", 150)
+
+    ts_cache.evict()
+
+    assert ts_cache.lookup(key_old) is None
+    assert not os.path.exists(ts_cache.get_path_file_inf(key_old))
+    assert ts_cache.lookup(key_new) is not None
+
+
+def test_evict_skips_pinned(tmp_path, cache_folder, monkeypatch):
+
+    key_old = store_entry(tmp_path, "old", 100, 1000)
+    key_new = store_entry(tmp_path, "new", 100, 2000)
+    monkeypatch.setattr(ts_cache, "max_size_bytes", 150)
+
+    ts_cache.pin([key_old])
+    try:
+        ts_cache.evict()
+    finally:
+        ts_cache.unpin([key_old])
+
+    assert ts_cache.lookup(key_old) is not None
+    assert ts_cache.lookup(key_new) is None
+
+    # unpinned, it can be evicted again
+    store_entry(tmp_path, "newer", 100, 3000)
+    assert ts_cache.lookup(key_old) is None
+
+
+def test_evict_removes_stale_temp(cache_folder):
+
+    path_file_stale = cache_folder / "a.1.1.tmp"
+    path_file_stale_inf = cache_folder / "a.1.1.tmp.json"
+    path_file_running = cache_folder / "b.1.2.tmp"
+    for path_file in [path_file_stale, path_file_stale_inf,
+                      path_file_running]:
+        path_file.write_bytes(b"\0")
+    time_stale = time.time() - ts_cache.temp_stale_seconds - 60
+    os.utime(path_file_stale, (time_stale, time_stale))
+    os.utime(path_file_stale_inf, (time_stale, time_stale))
+
+    ts_cache.evict()
+
+    assert not path_file_stale.exists()
+    assert not path_file_stale_inf.exists()
+    assert path_file_running.exists()
+
+
+def test_join_mp4_raises_on_failed_remux(tmp_path, cache_folder,
+                                         monkeypatch):
+
+    list_key_unpinned = []
+
+    def convert_to_ts_cached(list_file_path, max_workers=1, pin=True,
+                             semaphore_cpu=None):
+        return {
+            "list_dict_videos_duration": [],
+            "list_path_file_name_ts": [None],
+            "list_key_ts": ["k"],
+            "list_file_path_failed": list_file_path,
+        }
+
+    monkeypatch.setattr(video_tools, "convert_to_ts_cached",
+                        convert_to_ts_cached)
+    monkeypatch.setattr(ts_cache, "unpin", list_key_unpinned.extend)
+
+    with pytest.raises(Exception, match="Can't convert to TS: a.mp4"):
+        video_tools.join_mp4(["a.mp4"], str(tmp_path / "out.mp4"),
+                             str(tmp_path / "cache"))
+    assert list_key_unpinned == ["k"]
@@ -1,6 +1,12 @@
 from video_tools import change_width_height_mp4, get_video_resolution
+import json
 import logging
 import os
+import threading
+
+# memoized transition index. keys: folder_mtime_ns, resolutions
+_dict_transition_index = {}
+_lock_transition_index = threading.Lock()
 
 
 def logging_config():
@@ -129,7 +135,7 @@ def get_video_resolution_format(file_path):
     resolution = get_video_resolution(file_path)
     height = resolution['height']
     width = resolution['width']
-    resolutions_format = f'{height}x{width}'
+    resolutions_format = f'{width}x{height}'
     return resolutions_format
 
 
@@ -148,23 +154,119 @@ def get_list_transition_path_file():
     return list_path_file
 
 
-def get_dict_transition_resolution():
+def get_path_file_transition_index():
+
+    folder_script_path = get_folder_script_path()
+    path_file_transition_index = os.path.join(folder_script_path, 'projects',
+                                              'transition_index.json')
+    return path_file_transition_index
+
+
+def get_transition_folder_mtime_ns(list_transition_path_file):
+    """latest mtime among the transition folders and transition files
+
+    Args:
+        list_transition_path_file (list): transition video path files
+
+    Returns:
+        int: mtime in nanoseconds
     """
 
+    folder_script_path = get_folder_script_path()
+    path_dir = os.path.join(folder_script_path, 'transition')
+    list_mtime_ns = [os.stat(path_dir).st_mtime_ns]
+    for root, dirs, _ in os.walk(path_dir):
+        for dir_name in dirs:
+            list_mtime_ns.append(
+                os.stat(os.path.join(root, dir_name)).st_mtime_ns)
+    for transition_path_file in list_transition_path_file:
+        list_mtime_ns.append(os.stat(transition_path_file).st_mtime_ns)
+    return max(list_mtime_ns)
+
+
+def build_transition_index(list_transition_path_file):
+    """probe the transition videos
+
     Returns:
-        dict: keys=Resolution in string format: heightxwidth. e.g.: 1280x720
-              value=transition Video file path
+        dict: keys=Resolution in string format: widthxheight
+              value=dict. keys: path_file
+    """
+
+    dict_transition_index = {}
+    for transition_path_file in sorted(list_transition_path_file):
+        resolutions = get_video_resolution_format(transition_path_file)
+        if resolutions not in dict_transition_index:
+            dict_transition_index[resolutions] = {
+                'path_file': transition_path_file}
+    return dict_transition_index
+
+
+def load_transition_index(path_file_transition_index):
+
+    if not os.path.isfile(path_file_transition_index):
+        return {}
+    try:
+        with open(path_file_transition_index, 'r') as fin:
+            return json.load(fin)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_transition_index(path_file_transition_index, dict_index):
+
+    os.makedirs(os.path.dirname(path_file_transition_index), exist_ok=True)
+    with open(path_file_transition_index, 'w') as fout:
+        json.dump(dict_index, fout, indent=2)
+
+
+def get_dict_transition_index():
+    """Transition index, built once and shared by all callers.
+    It is rebuilt only when the transition folder changes.
+
+    Returns:
+        dict: keys=Resolution in string format: widthxheight. e.g.: 1280x720
+              value=dict. keys: path_file
     """
 
     list_transition_path_file = get_list_transition_path_file()
     if len(list_transition_path_file) == 0:
         raise Exception("There is no transition video archived " +
                         "in the transition folder")
+    folder_mtime_ns = \
+        get_transition_folder_mtime_ns(list_transition_path_file)
+
+    with _lock_transition_index:
+        if _dict_transition_index.get('folder_mtime_ns') == folder_mtime_ns:
+            return _dict_transition_index['resolutions']
+
+        path_file_transition_index = get_path_file_transition_index()
+        dict_index = load_transition_index(path_file_transition_index)
+        if dict_index.get('folder_mtime_ns') != folder_mtime_ns:
+            logging.info('Build transition index')
+            dict_index = {
+                'folder_mtime_ns': folder_mtime_ns,
+                'resolutions':
+                    build_transition_index(list_transition_path_file)}
+            save_transition_index(path_file_transition_index, dict_index)
+
+        _dict_transition_index.clear()
+        _dict_transition_index.update(dict_index)
+        return _dict_transition_index['resolutions']
+
+
+def get_dict_transition_resolution():
+    """
+
+    Returns:
+        dict: keys=Resolution in string format: widthxheight. e.g.: 1280x720
+              value=transition Video file path
+    """
+
+    dict_transition_index = get_dict_transition_index()
     dict_transition_resolutions = {}
-    for transition_path_file in list_transition_path_file:
-        resolutions = get_video_resolution_format(transition_path_file)
-        if resolutions not in dict_transition_resolutions:
-            dict_transition_resolutions[resolutions] = transition_path_file
+    for resolutions, dict_transition in dict_transition_index.items():
+        dict_transition_resolutions[resolutions] = \
+            dict_transition['path_file']
     return dict_transition_resolutions
 
 
@@ -0,0 +1,211 @@
+"""
+    Create by: apenasrr
+    Source: https://github.com/apenasrr/mass_videojoin
+
+    Shared cache of the MPEG-TS remux of the source videos.
+    Each entry is keyed by the fingerprint (absolute path, size, mtime_ns) of
+    its source, so the TS created to correct the durations is reused by the
+    join step. The folder is kept under a size limit, removing the least
+    recently used entries that are not pinned by a running join, and the
+    temp files left by interrupted remuxes.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+import probe_cache
+
+path_folder_ts_cache = os.path.join("projects", "ts_cache")
+max_size_bytes = 0
+# a remux in progress keeps writing its temp file
+temp_stale_seconds = 3600
+
+_lock = threading.Lock()
+_counter_pinned = Counter()
+
+
+def set_path_folder_ts_cache(path_folder):
+
+    global path_folder_ts_cache
+    path_folder_ts_cache = path_folder
+
+
+def set_max_size_mb(max_size_mb):
+    """
+    Args:
+        max_size_mb (int): size limit of the cache folder. 0 to disable
+    """
+
+    global max_size_bytes
+    max_size_bytes = int(max_size_mb) * 1024 ** 2
+
+
+def is_enabled():
+
+    return max_size_bytes > 0
+
+
+def get_key(path_file):
+    """
+    Returns:
+        str: cache key of the source video. None if the file does not exist
+    """
+
+    fingerprint = probe_cache.get_file_fingerprint(path_file)
+    if fingerprint is None:
+        return None
+    str_fingerprint = "|".join(str(x) for x in fingerprint)
+    return hashlib.sha1(str_fingerprint.encode("utf-8")).hexdigest()
+
+
+def get_path_file_ts(key):
+
+    return os.path.join(path_folder_ts_cache, key + ".ts")
+
+
+def get_path_file_inf(key):
+
+    return os.path.join(path_folder_ts_cache, key + ".json")
+
+
+def get_path_file_temp(key):
+    """
+    Returns:
+        str: path_file where the remux of a missing entry must be written
+             before being stored
+    """
+
+    os.makedirs(path_folder_ts_cache, exist_ok=True)
+    file_name_temp = f"{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+    return os.path.join(path_folder_ts_cache, file_name_temp)
+
+
+def remove_temp(path_file_temp):
+    """Remove the temp files of a remux that will not be stored"""
+
+    for path_file in [path_file_temp, path_file_temp + ".json"]:
+        try:
+            os.remove(path_file)
+        except FileNotFoundError:
+            pass
+
+
+def lookup(key):
+    """Find an entry, marking it as recently used
+
+    Args:
+        key (str): cache key of the source video
+
+    Returns:
+        dict: keys: path_file_ts, duration_seconds. None if not cached
+    """
+
+    if key is None:
+        return None
+    path_file_ts = get_path_file_ts(key)
+    try:
+        with open(get_path_file_inf(key), "r", encoding="utf-8") as f:
+            dict_inf = json.load(f)
+        os.utime(path_file_ts)
+    except (OSError, ValueError):
+        return None
+    return {
+        "path_file_ts": path_file_ts,
+        "duration_seconds": dict_inf["duration_seconds"],
+    }
+
+
+def store(key, path_file_temp, duration_seconds, path_file_origin):
+    """Move a finished remux into the cache and enforce the size limit
+
+    Args:
+        key (str): cache key of the source video
+        path_file_temp (str): remux written in get_path_file_temp(key)
+        duration_seconds (float): real duration of the remux
+        path_file_origin (str): source video path_file
+
+    Returns:
+        str: path_file of the cached TS
+    """
+
+    path_file_ts = get_path_file_ts(key)
+    path_file_inf = get_path_file_inf(key)
+    dict_inf = {
+        "path_file_origin": os.path.abspath(path_file_origin),
+        "duration_seconds": duration_seconds,
+    }
+    path_file_inf_temp = path_file_temp + ".json"
+    try:
+        with open(path_file_inf_temp, "w", encoding="utf-8") as f:
+            json.dump(dict_inf, f, ensure_ascii=False)
+        # the TS is published before its info, so an info file always
+        # points to a complete TS
+        os.replace(path_file_temp, path_file_ts)
+        os.replace(path_file_inf_temp, path_file_inf)
+    except OSError:
+        remove_temp(path_file_temp)
+        raise
+    evict()
+    return path_file_ts
+
+
+def pin(list_key):
+    """Protect entries from the eviction while they are being joined"""
+
+    with _lock:
+        _counter_pinned.update(key for key in list_key if key is not None)
+
+
+def unpin(list_key):
+
+    with _lock:
+        _counter_pinned.subtract(key for key in list_key if key is not None)
+        for key in [k for k, v in _counter_pinned.items() if v <= 0]:
+            del _counter_pinned[key]
+
+
+def evict():
+    """Remove the temp files not written for temp_stale_seconds, left by
+    interrupted remuxes, and the least recently used entries, not pinned,
+    until the cache folder fits in max_size_bytes"""
+
+    if not os.path.isdir(path_folder_ts_cache):
+        return
+    with _lock:
+        list_entry = []
+        total_size = 0
+        time_stale = time.time() - temp_stale_seconds
+        for entry in os.scandir(path_folder_ts_cache):
+            if entry.name.endswith((".tmp", ".tmp.json")):
+                try:
+                    if entry.stat().st_mtime < time_stale:
+                        os.remove(entry.path)
+                        logging.info(f"TS cache removed temp: {entry.name}")
+                except FileNotFoundError:
+                    pass
+                continue
+            if not entry.name.endswith(".ts"):
+                continue
+            stat = entry.stat()
+            total_size += stat.st_size
+            list_entry.append((stat.st_mtime_ns, stat.st_size, entry.name))
+
+        list_entry.sort()
+        for _, file_size, file_name in list_entry:
+            if total_size <= max_size_bytes:
+                break
+            key = file_name[: -len(".ts")]
+            if key in _counter_pinned:
+                continue
+            try:
+                os.remove(get_path_file_inf(key))
+            except FileNotFoundError:
+                pass
+            os.remove(get_path_file_ts(key))
+            total_size -= file_size
+            logging.info(f"TS cache evicted: {file_name}")
@@ -1,6 +1,15 @@
 import glob
 import hashlib
+import json
+import logging
 import os
+import shutil
+
+try:
+    import fcntl
+except ImportError:
+    # not available on Windows
+    fcntl = None
 
 import natsort
 import pandas as pd
@@ -169,7 +178,205 @@ def exclude_all_files_from_folder(path_folder):
         os.remove(i)
 
 
+# ioctl FICLONE from linux/fs.h
+FICLONE = 0x40049409
+
+
+def reflink_file(path_file_source, path_file_dest):
+    """Clone the file extents (btrfs, xfs, ...). No data is written
+
+    Raises:
+        OSError: if the filesystem or the platform does not support it
+    """
+
+    if fcntl is None:
+        raise OSError("reflink not supported")
+    with open(path_file_source, "rb") as f_source, \
+            open(path_file_dest, "wb") as f_dest:
+        fcntl.ioctl(f_dest.fileno(), FICLONE, f_source.fileno())
+
+
+def copy_file_range_file(path_file_source, path_file_dest):
+    """Copy in the kernel, without passing the data through user space.
+    Some filesystems share the extents instead of copying them
+
+    Raises:
+        OSError: if the filesystem or the platform does not support it
+    """
+
+    if not hasattr(os, "copy_file_range"):
+        raise OSError("copy_file_range not supported")
+    with open(path_file_source, "rb") as f_source, \
+            open(path_file_dest, "wb") as f_dest:
+        bytes_left = os.fstat(f_source.fileno()).st_size
+        while bytes_left > 0:
+            bytes_copied = os.copy_file_range(
+                f_source.fileno(), f_dest.fileno(), bytes_left
+            )
+            if bytes_copied == 0:
+                raise OSError("copy_file_range stopped before the end")
+            bytes_left -= bytes_copied
+
+
+def place_file(path_file_source, path_file_dest, allow_hardlink=False):
+    """Put a copy of path_file_source in path_file_dest, writing as little
+    data as possible. Tries, in order: reflink, copy_file_range, hardlink
+    (only if allow_hardlink) and a regular copy. The hardlink is the last
+    option before the copy because the destination shares the inode, so a
+    later rewrite in place of the source would change it too.
+
+    Args:
+        path_file_source (str): source path file
+        path_file_dest (str): destination path file. Must not exist
+        allow_hardlink (bool, optional): True when the source is an
+                                         intermediate file of the project,
+                                         that can share its inode with the
+                                         destination. Defaults to False.
+
+    Returns:
+        str: method used: reflink, hardlink, copy_file_range or copy
+    """
+
+    list_method = [
+        ("reflink", reflink_file),
+        ("copy_file_range", copy_file_range_file),
+    ]
+    if allow_hardlink:
+        list_method.append(("hardlink", os.link))
+
+    for method, function_place in list_method:
+        try:
+            function_place(path_file_source, path_file_dest)
+            logging.info(f"File placed by {method}: {path_file_dest}")
+            return method
+        except OSError:
+            if os.path.lexists(path_file_dest):
+                os.remove(path_file_dest)
+
+    shutil.copyfile(path_file_source, path_file_dest)
+    logging.info(f"File placed by copy: {path_file_dest}")
+    return "copy"
+
+
+def get_path_folder_backup(path_file_report):
+
+    path_folder = os.path.dirname(path_file_report)
+    path_folder_backup = os.path.join(path_folder, "backup")
+    return path_folder_backup
+
+
+def load_backup_manifest(path_folder_backup):
+    """
+    Returns:
+        dict: keys=tag, value=snapshot file_name
+    """
+
+    path_file_manifest = os.path.join(path_folder_backup, "manifest.json")
+    if not os.path.isfile(path_file_manifest):
+        return {}
+    with open(path_file_manifest, "r") as fin:
+        return json.load(fin)
+
+
+def save_backup_manifest(path_folder_backup, dict_manifest):
+
+    path_file_manifest = os.path.join(path_folder_backup, "manifest.json")
+    with open(path_file_manifest, "w") as fout:
+        json.dump(dict_manifest, fout, indent=2)
+
+
+def get_df_digest(df):
+    """content hash of a dataframe, including index and column names"""
+
+    hash_rows = pd.util.hash_pandas_object(df, index=True).values
+    digest = hashlib.sha1(hash_rows.tobytes())
+    digest.update(",".join(map(str, df.columns)).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def get_df_parquet_safe(df):
+    """convert object columns with mixed types, e.g. str and int, to string.
+    Parquet requires one type per column"""
+
+    df_safe = df.copy()
+    for column_name in df_safe.columns:
+        if df_safe[column_name].dtype != object:
+            continue
+        inferred_type = pd.api.types.infer_dtype(
+            df_safe[column_name], skipna=True
+        )
+        if inferred_type not in ("string", "empty"):
+            df_safe[column_name] = df_safe[column_name].astype("string")
+    return df_safe
+
+
 def create_report_backup(df, path_file_report, tag):
+    """Save a compressed parquet snapshot of the report for the stage tag.
+    Snapshots with the same content are written only once.
+    Use export_report_backup to get the xlsx.
+
+    Args:
+        df (dataframe): video_details dataframe
+        path_file_report (str): path_file of video_details.xlsx
+        tag (str): stage tag. e.g.: 1_origin
+    """
+
+    path_folder_backup = get_path_folder_backup(path_file_report)
+    os.makedirs(path_folder_backup, exist_ok=True)
+
+    file_name = os.path.basename(path_file_report)
+    file_name_without_extension = os.path.splitext(file_name)[0]
+    digest = get_df_digest(df)
+    file_name_snapshot = (
+        file_name_without_extension + "_" + digest[:16] + ".parquet"
+    )
+    path_file_snapshot = os.path.join(path_folder_backup, file_name_snapshot)
+    if not os.path.isfile(path_file_snapshot):
+        df_safe = get_df_parquet_safe(df)
+        df_safe.to_parquet(path_file_snapshot, index=False, compression="zstd")
+
+    dict_manifest = load_backup_manifest(path_folder_backup)
+    file_name_snapshot_previous = dict_manifest.get(tag)
+    dict_manifest[tag] = file_name_snapshot
+    save_backup_manifest(path_folder_backup, dict_manifest)
+
+    # remove the previous snapshot of the tag if no other tag uses it
+    if file_name_snapshot_previous is not None and \
+            file_name_snapshot_previous not in dict_manifest.values():
+        path_file_snapshot_previous = \
+            os.path.join(path_folder_backup, file_name_snapshot_previous)
+        if os.path.isfile(path_file_snapshot_previous):
+            os.remove(path_file_snapshot_previous)
+
+
+def get_list_backup_tag(path_file_report):
+    """
+    Returns:
+        list: stage tags with a snapshot, sorted. e.g.: ['1_origin', ...]
+    """
+
+    path_folder_backup = get_path_folder_backup(path_file_report)
+    return sorted(load_backup_manifest(path_folder_backup))
+
+
+def export_report_backup(path_file_report, tag):
+    """Export the snapshot of a stage tag to xlsx, next to the report.
+    e.g.: video_details_1_origin.xlsx
+
+    Args:
+        path_file_report (str): path_file of video_details.xlsx
+        tag (str): stage tag. e.g.: 1_origin
+
+    Returns:
+        str: path_file of the xlsx created
+    """
+
+    path_folder_backup = get_path_folder_backup(path_file_report)
+    dict_manifest = load_backup_manifest(path_folder_backup)
+    if tag not in dict_manifest:
+        raise ValueError(f"There is no backup with tag: {tag}")
+    path_file_snapshot = os.path.join(path_folder_backup, dict_manifest[tag])
+    df = pd.read_parquet(path_file_snapshot)
 
     path_folder = os.path.dirname(path_file_report)
     file_name = os.path.basename(path_file_report)
@@ -177,6 +384,7 @@ def create_report_backup(df, path_file_report, tag):
     file_name_backup = file_name_without_extension + "_" + tag + ".xlsx"
     path_file_backup = os.path.join(path_folder, file_name_backup)
     df.to_excel(path_file_backup, index=False)
+    return path_file_backup
 
 
 def get_folder_script_path():
@@ -184,3 +392,23 @@ def get_folder_script_path():
     folder_script_path_relative = os.path.dirname(__file__)
     folder_script_path = os.path.realpath(folder_script_path_relative)
     return folder_script_path
+
+
+def ensure_folder_existence(folders_path):
+    """
+    :input: folders_path: List
+    """
+
+    for folder_path in folders_path:
+        existence = os.path.isdir(folder_path)
+        if existence is False:
+            os.mkdir(folder_path)
+
+
+def get_transition_effect_status(activate_transition):
+
+    if activate_transition == "true":
+        transition_effect_status = True
+    else:
+        transition_effect_status = False
+    return transition_effect_status
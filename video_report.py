@@ -1,8 +1,12 @@
 import logging
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
 import pandas as pd
 
+import mp4_header
 import video_tools
 from ffprobe_micro import ffprobe
 
@@ -82,7 +86,8 @@ def get_audio_codec(stream_audio):
     return audio_codec
 
 
-def get_list_path_video(path_dir, video_extensions):
+def iter_path_video(path_dir, video_extensions):
+    """Walk path_dir yielding each video path_file as soon as it is found"""
 
     # To input more file video extension:
     #  https://dotwhat.net/type/video-movie-files
@@ -93,7 +98,6 @@ def get_list_path_video(path_dir, video_extensions):
     )
     str_tuple_video_extension = ", ".join(tuple_video_extension)
     logging.info(f"Find for video with extension: {str_tuple_video_extension}")
-    list_file_selected = []
     for root, _, files in os.walk(path_dir):
 
         for file in files:
@@ -101,105 +105,193 @@ def get_list_path_video(path_dir, video_extensions):
             if file_lower.endswith(tuple_video_extension):
                 logging.info(f"Selected file: {file}")
                 path_file = os.path.join(root, file)
-                list_file_selected.append(path_file)
+                yield path_file
             else:
                 logging.info(f"Unselected file: {file}")
+
+
+def get_list_path_video(path_dir, video_extensions):
+
+    list_file_selected = list(iter_path_video(path_dir, video_extensions))
     return list_file_selected
 
 
-def get_list_dict_inf_ffprobe(list_path_file):
+def get_dict_inf_ffprobe(path_file, fast_probe=False):
+    """Catch the raw ffprobe metadata of one video file.
 
-    list_dict = []
-    for file_selected in list_path_file:
-        d = {}
-        d["path_file"] = file_selected
-        # generate raw metadata
-        logging.info("Catching video metadata: %s", file_selected)
-        dict_inf_ffprobe = ffprobe(file_selected).get_output_as_dict()
-        d["metadata"] = dict_inf_ffprobe
-        list_dict.append(d)
+    Args:
+        path_file (str): video path file
+        fast_probe (bool, optional): read mp4/mov headers in-process,
+                                     falling back to ffprobe.
+                                     Defaults to False.
+
+    Returns:
+        dict: keys: path_file, metadata. metadata is empty if ffprobe fails
+    """
+
+    d = {}
+    d["path_file"] = path_file
+    # generate raw metadata
+    logging.info("Catching video metadata: %s", path_file)
+    if fast_probe:
+        dict_inf_mp4_header = mp4_header.get_dict_inf(path_file)
+        if dict_inf_mp4_header is not None:
+            d["metadata"] = dict_inf_mp4_header
+            return d
+    try:
+        dict_inf_ffprobe = ffprobe(path_file).get_output_as_dict()
+    except Exception as e:
+        logging.error(f"Can't catch video metadata: {path_file}")
+        logging.error(e)
+        dict_inf_ffprobe = {}
+    d["metadata"] = dict_inf_ffprobe
+    return d
+
+
+def iter_dict_inf_ffprobe(iter_path_file, max_workers=1, fast_probe=False):
+    """Catch the raw ffprobe metadata of each video from an iterable, using a
+    pool of workers. Results are yielded in the input order, and only a few
+    files are probed ahead, so memory stays flat for any library size.
+
+    Args:
+        iter_path_file (iterable): video path files
+        max_workers (int, optional): ffprobe processes running at the same
+                                     time. Defaults to 1.
+        fast_probe (bool, optional): read mp4/mov headers in-process.
+                                     Defaults to False.
+
+    Yields:
+        dict: keys: path_file, metadata
+    """
+
+    max_workers = max(1, int(max_workers))
+    max_pending = max_workers * 2
+    function_probe = partial(get_dict_inf_ffprobe, fast_probe=fast_probe)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        deque_future = deque()
+        for path_file in iter_path_file:
+            deque_future.append(executor.submit(function_probe, path_file))
+            if len(deque_future) >= max_pending:
+                yield deque_future.popleft().result()
+        while deque_future:
+            yield deque_future.popleft().result()
+
+
+def get_list_dict_inf_ffprobe(list_path_file, max_workers=1,
+                              fast_probe=False):
+    """Catch the raw ffprobe metadata of a video list, using a pool of
+    workers. The returned list keeps the order of list_path_file.
+
+    Args:
+        list_path_file (list): list of video path file
+        max_workers (int, optional): ffprobe processes running at the same
+                                     time. Defaults to 1.
+        fast_probe (bool, optional): read mp4/mov headers in-process.
+                                     Defaults to False.
+
+    Returns:
+        list: list of dict. keys: path_file, metadata
+    """
+
+    list_dict = list(
+        iter_dict_inf_ffprobe(list_path_file, max_workers, fast_probe)
+    )
     return list_dict
 
 
-def gen_report(list_dict_inf_ffprobe):
+def gen_report_row(dict_file):
+    """Parse the raw metadata of one video file into a report row
 
-    list_dict = []
-    for dict_file in list_dict_inf_ffprobe:
+    Args:
+        dict_file (dict): keys: path_file, metadata
 
-        path_file = dict_file["path_file"]
-        print(f"parsing: {path_file}")
-        # path_file = dict_inf_ffprobe['format']['filename']
-        dict_inf_ffprobe = dict_file["metadata"]
-        # parse data
-        duration_dict = video_tools.get_duration_ffprobe(
-            dict_inf=dict_inf_ffprobe
-        )
-        if duration_dict is False:
-            print("!File seems corrupt.\n")
-            continue
-        duration = duration_dict["duration_str"]
-        duration_seconds = duration_dict["duration_seconds"]
-        total_bitrate = int(dict_inf_ffprobe["format"]["bit_rate"])
-        format_name = dict_inf_ffprobe["format"]["format_name"]
-
-        is_video = False
-        for stream in dict_inf_ffprobe["streams"]:
-            if stream["codec_type"] == "video":
-                stream_video = stream
-                is_video = True
-                break
-
-        if is_video:
-
-            video_codec = get_video_codec(stream_video)
-            video_profile = get_video_profile(stream_video)
-            video_resolution_height = get_video_resolution_height(stream_video)
-            video_resolution_width = get_video_resolution_width(stream_video)
-            video_bitrate = get_video_bitrate(dict_inf_ffprobe, stream_video)
-            is_avc = get_is_avc(stream_video)
-        else:
-            logging.error(
-                "File above don't have tag 'video' in "
-                + f"detail file:\n{path_file}"
-            )
-            continue
+    Returns:
+        dict: report row. None if the file is corrupt or has no video
+    """
 
+    path_file = dict_file["path_file"]
+    print(f"parsing: {path_file}")
+    # path_file = dict_inf_ffprobe['format']['filename']
+    dict_inf_ffprobe = dict_file["metadata"]
+    # parse data
+    duration_dict = video_tools.get_duration_ffprobe(
+        dict_inf=dict_inf_ffprobe
+    )
+    if duration_dict is False:
+        print("!File seems corrupt.\n")
+        return None
+    duration = duration_dict["duration_str"]
+    duration_seconds = duration_dict["duration_seconds"]
+    total_bitrate = int(dict_inf_ffprobe["format"]["bit_rate"])
+    format_name = dict_inf_ffprobe["format"]["format_name"]
+
+    is_video = False
+    for stream in dict_inf_ffprobe["streams"]:
+        if stream["codec_type"] == "video":
+            stream_video = stream
+            is_video = True
+            break
+
+    if is_video:
+
+        video_codec = get_video_codec(stream_video)
+        video_profile = get_video_profile(stream_video)
+        video_resolution_height = get_video_resolution_height(stream_video)
+        video_resolution_width = get_video_resolution_width(stream_video)
+        video_bitrate = get_video_bitrate(dict_inf_ffprobe, stream_video)
+        is_avc = get_is_avc(stream_video)
+    else:
+        logging.error(
+            "File above don't have tag 'video' in "
+            + f"detail file:\n{path_file}"
+        )
+        return None
+
+    has_audio = False
+    for stream in dict_inf_ffprobe["streams"]:
+        if stream["codec_type"] == "audio":
+            stream_audio = stream
+            has_audio = True
+            break
+
+    if has_audio is False:
+        logging.info(
+            "File above don't have tag 'audio' in "
+            + f"detail file:\n{path_file}"
+        )
         has_audio = False
-        for stream in dict_inf_ffprobe["streams"]:
-            if stream["codec_type"] == "audio":
-                stream_audio = stream
-                has_audio = True
-                break
-
-        if has_audio is False:
-            logging.info(
-                "File above don't have tag 'audio' in "
-                + f"detail file:\n{path_file}"
-            )
-            has_audio = False
 
-        if has_audio:
-            audio_codec = get_audio_codec(stream_audio)
-        else:
-            audio_codec = ""
-
-        # generate dict
-        d = {}
-        d["duration"] = duration
-        d["duration_seconds"] = duration_seconds
-        d["file_size"] = os.path.getsize(path_file)
-        d["format_name"] = format_name
-        d["total_bitrate"] = total_bitrate
-        d["video_bitrate"] = video_bitrate
-        d["video_codec"] = video_codec
-        d["audio_codec"] = audio_codec
-        d["is_avc"] = is_avc
-        d["video_profile"] = video_profile
-        d["video_resolution_height"] = video_resolution_height
-        d["video_resolution_width"] = video_resolution_width
-        d["path_file"] = path_file
-        d["file_path_folder"] = os.path.dirname(path_file)
-        d["file_name"] = os.path.split(path_file)[1]
-        list_dict.append(d)
+    if has_audio:
+        audio_codec = get_audio_codec(stream_audio)
+    else:
+        audio_codec = ""
+
+    # generate dict
+    d = {}
+    d["duration"] = duration
+    d["duration_seconds"] = duration_seconds
+    d["file_size"] = os.path.getsize(path_file)
+    d["format_name"] = format_name
+    d["total_bitrate"] = total_bitrate
+    d["video_bitrate"] = video_bitrate
+    d["video_codec"] = video_codec
+    d["audio_codec"] = audio_codec
+    d["is_avc"] = is_avc
+    d["video_profile"] = video_profile
+    d["video_resolution_height"] = video_resolution_height
+    d["video_resolution_width"] = video_resolution_width
+    d["path_file"] = path_file
+    d["file_path_folder"] = os.path.dirname(path_file)
+    d["file_name"] = os.path.split(path_file)[1]
+    return d
+
+
+def gen_report(list_dict_inf_ffprobe):
+
+    list_dict = []
+    for dict_file in list_dict_inf_ffprobe:
+        d = gen_report_row(dict_file)
+        if d is not None:
+            list_dict.append(d)
 
     return list_dict
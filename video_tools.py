@@ -3,13 +3,19 @@
     Source: https://github.com/apenasrr/mass_videojoin
 """
 
+import asyncio
+import contextlib
 import glob
 import logging
 import os
+import shutil
 import subprocess
+import threading
 from datetime import timedelta
 
-from ffprobe_micro import ffprobe
+import keyframe_index
+import ts_cache
+from ffprobe_micro import ffmpeg_async, ffprobe, gather_limited
 from utils_mass_videojoin import get_file_name_dest
 
 
@@ -23,28 +29,14 @@ def get_video_resolution(file_path):
         dict: keys: height, width]
     """
 
-    result = subprocess.run(
-        [
-            "ffprobe",
-            "-v",
-            "error",
-            "-show_entries",
-            "stream=width,height",
-            "-of",
-            "default=noprint_wrappers=1:nokey=1",
-            file_path,
-        ],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-    )
+    dict_inf_ffprobe = ffprobe(file_path).get_output_as_dict()
+    for stream in dict_inf_ffprobe["streams"]:
+        if stream["codec_type"] == "video":
+            break
 
-    result_stdout = str(result.stdout)
-    list_height_width = result_stdout.replace("b'", "").split(r"\r\n")
-    height = list_height_width[0]
-    width = list_height_width[1]
     resolution = {}
-    resolution["height"] = height
-    resolution["width"] = width
+    resolution["height"] = str(stream["height"])
+    resolution["width"] = str(stream["width"])
     return resolution
 
 
@@ -84,12 +76,36 @@ def convert_mp4_wo_reencode(path_file_video_origin, path_file_video_dest):
     logging.info("Done")
 
 
+def convert_mp4_audio_to_aac(path_file_video_origin, path_file_video_dest):
+    """Copy the video stream and reencode only the audio to aac"""
+
+    logging.info(
+        "Convert audio to aac without video reencode: "
+        f"{path_file_video_origin}"
+    )
+
+    stringa = (
+        f'ffmpeg -y -i "{path_file_video_origin}" '
+        + "-c:v copy "
+        + "-movflags +faststart "
+        + f'-c:a aac "{path_file_video_dest}"'
+    )
+
+    os.system(stringa)
+    logging.info("Done")
+
+
 def change_width_height_mp4(
-    path_file_video_origin, size_height, size_width, path_file_video_dest
+    path_file_video_origin,
+    size_height,
+    size_width,
+    path_file_video_dest,
+    threads=0,
 ):
     """
     More info: https://www.reck.dk/ffmpeg-autoscale-on-height-or-width/
     :input: size_height: Eg. 480 or 720 or 1080...
+    :input: threads: encoder threads. 0 to let ffmpeg use all the cpus
     """
 
     logging.info(f"Changing height to {size_height}: {path_file_video_origin}")
@@ -104,6 +120,7 @@ def change_width_height_mp4(
         + f'pad={size_width}:{size_height}:(ow-iw)/2:(oh-ih)/2" '
         + "-c:v libx264 -crf 18 -maxrate 2.5M -bufsize 4M -preset ultrafast -flags +global_header "
         + "-pix_fmt yuv420p -profile:v baseline -tune zerolatency -movflags +faststart "
+        + f"-threads {int(threads)} "
         + f'-c:a aac "{path_file_video_dest}"'
     )
 
@@ -145,6 +162,44 @@ def convert_streaming(path_file_video_origin, path_file_video_dest):
 #TODO: create function to convert to mp4 without reencode. Case of .ts from tubedigger
 
 
+def get_list_split_estimated(
+    largefile_path, recoil, file_size, limit_size, original_video_duration_sec
+):
+    """Estimate cut points from the file size, with parts of same duration.
+    Each part after the first starts 'recoil' seconds earlier.
+
+    Returns:
+        tuple: list of ffmpeg '-ss' strings, list of ffmpeg '-t' strings
+    """
+
+    slices_qt = file_size // limit_size + 1
+
+    if original_video_duration_sec == 0:
+        original_video_duration_sec = get_duration(largefile_path)
+    video_duration_sec = original_video_duration_sec + (
+        (slices_qt - 1) * recoil
+    )
+
+    duration_per_split_sec = int(video_duration_sec / slices_qt)
+
+    list_time_start_string = []
+    list_duration_string = []
+    for index in range(slices_qt):
+        if index == 0:
+            time_start_string = ""
+        else:
+            time_start = (duration_per_split_sec - recoil) * (index)
+            time_start_string = f"-ss {time_start} "
+
+        if index + 1 != slices_qt:
+            duration_string = f"-t {duration_per_split_sec} "
+        else:
+            duration_string = ""
+        list_time_start_string.append(time_start_string)
+        list_duration_string.append(duration_string)
+    return list_time_start_string, list_duration_string
+
+
 def split_mp4(
     largefile_path,
     recoil,
@@ -154,6 +209,8 @@ def split_mp4(
 ):
     """
     Split video without reencode
+    Cuts are placed on keyframes from keyframe_index. If the index is not
+    available, cut points are estimated and the recoil is applied.
     :input: recoil: Int. Seconds add to initial 'part 2' to prevent lost frames
     :input: time_split_sec: Int. Moment in seconds where the video must be cut
     :input: mb_limit: Int. File size limit per slice in megabyte.
@@ -166,24 +223,6 @@ def split_mp4(
     # own to build a complete image.
     # See: trac.ffmpeg.org/wiki/Seeking#Seekingwhiledoingacodeccopy
 
-    def get_length(filename):
-        result = subprocess.run(
-            [
-                "ffprobe",
-                "-v",
-                "error",
-                "-show_entries",
-                "format=duration",
-                "-of",
-                "default=noprint_wrappers=1:nokey=1",
-                filename,
-            ],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-        )
-
-        return float(result.stdout)
-
     if mb_limit == 0:
         print("split_mp4: Inform variable mb_limit.")
         return False
@@ -200,29 +239,38 @@ def split_mp4(
     file_name_without_extension = os.path.splitext(file_name_hashed)[0]
     file_size = os.stat(largefile_path).st_size
     limit_size = mb_limit * 1024 ** 2
-    slices_qt = file_size // limit_size + 1
 
-    if original_video_duration_sec == 0:
-        original_video_duration_sec = get_length(largefile_path)
-    video_duration_sec = original_video_duration_sec + (
-        (slices_qt - 1) * recoil
-    )
-
-    duration_per_split_sec = int(video_duration_sec / slices_qt)
+    array_keyframe = keyframe_index.get_keyframe_index(largefile_path)
+    if len(array_keyframe) > 1:
+        list_cut_time = keyframe_index.get_list_cut_time(
+            array_keyframe,
+            file_size,
+            limit_size,
+            keyframe_index.get_start_time(largefile_path),
+        )
+        list_time_start_string = [""] + [
+            f"-ss {time_cut:.6f} " for time_cut in list_cut_time
+        ]
+        list_time_start = [0] + list_cut_time
+        list_duration_string = [
+            f"-t {time_end - time_start:.6f} "
+            for time_start, time_end in zip(list_time_start, list_cut_time)
+        ] + [""]
+    else:
+        logging.info(f"Split without keyframe index: {largefile_path}")
+        list_split_estimated = get_list_split_estimated(
+            largefile_path,
+            recoil,
+            file_size,
+            limit_size,
+            original_video_duration_sec,
+        )
+        list_time_start_string, list_duration_string = list_split_estimated
 
     list_filepath_output = []
-    for index in range(slices_qt):
+    for index, time_start_string in enumerate(list_time_start_string):
         number_file = index + 1
-        if index == 0:
-            time_start_string = ""
-        else:
-            time_start = (duration_per_split_sec - recoil) * (index)
-            time_start_string = f"-ss {time_start} "
-
-        if index + 1 != slices_qt:
-            duration_string = f"-t {duration_per_split_sec} "
-        else:
-            duration_string = ""
+        duration_string = list_duration_string[index]
 
         filename_output = (
             f"{file_name_without_extension}-%03d.mp4" % number_file
@@ -344,12 +392,69 @@ def get_dict_video_duration(path_file, file_path_origin):
     return dict_videos_duration
 
 
-def convert_to_ts(list_file_path, output_path_folder):
+def get_list_args_ts(file_path, path_file_name_ts):
+
+    list_args = [
+        "-y",
+        "-i",
+        file_path,
+        "-c",
+        "copy",
+        "-bsf:v",
+        "h264_mp4toannexb",
+        "-f",
+        "mpegts",
+        "-progress",
+        "pipe:1",
+        "-nostats",
+        path_file_name_ts,
+    ]
+    return list_args
+
+
+def get_float_out_time(ffmpeg_result):
+    """Read the real duration reported by a ffmpeg run with
+    '-progress pipe:1'
+
+    Args:
+        ffmpeg_result (FFProbeResult): result with output_format 'flat'
+
+    Returns:
+        float: last out_time_us reported, in seconds.
+               None if the run failed or did not report it
+    """
+
+    if ffmpeg_result.return_code != 0:
+        return None
+    try:
+        out_time_us = ffmpeg_result.get_output_as_dict()["out_time_us"]
+        return int(out_time_us) / 1_000_000
+    except (IndexError, KeyError, ValueError):
+        return None
+
+
+async def ffmpeg_async_flat(list_args, semaphore=None):
+
+    return await ffmpeg_async(
+        list_args, semaphore=semaphore, output_format="flat"
+    )
+
+
+def convert_to_ts(list_file_path, output_path_folder, max_workers=1,
+                  semaphore_cpu=None):
     """convert a video list to ts
 
     Args:
         list_file_path (list): list of path_file with mp4 extension
         output_path_folder (string): output path folder
+        max_workers (int, optional): ffmpeg processes running at the same
+                                     time. Defaults to 1.
+        semaphore_cpu (threading.BoundedSemaphore, optional): ffmpeg
+            processes running at the same time, shared with other threads.
+            Defaults to None.
+    Returns:
+        dict: keys: list_dict_videos_duration, list_path_file_name_ts.
+              Both lists keep the order of list_file_path
     """
 
     # copy to .ts
@@ -358,8 +463,7 @@ def convert_to_ts(list_file_path, output_path_folder):
 
     exclude_temp_files(output_path_folder)
 
-    list_dict_videos_duration = []
-
+    list_args = []
     for index, file_path in enumerate(list_file_path):
 
         file_name_ts = f"{index+1}.ts"
@@ -367,36 +471,334 @@ def convert_to_ts(list_file_path, output_path_folder):
         logging.info(
             f'"{index+1}.ts" from "{file_path}", to "{path_file_name_ts}"'
         )
-        os.system(
-            "ffmpeg -i "
-            + '"'
-            + file_path
-            + '"'
-            + " -c copy -bsf:v h264_mp4toannexb -f mpegts "
-            + path_file_name_ts
-        )
+        list_args.append((get_list_args_ts(file_path, path_file_name_ts),))
+        list_path_file_name_ts.append(path_file_name_ts)
 
-        dict_videos_duration = get_dict_video_duration(
-            path_file_name_ts, file_path
-        )
+    # the stream copies are I/O bound, so they are overlapped
+    list_ffmpeg_result = asyncio.run(
+        gather_limited(ffmpeg_async_flat, list_args, max_workers,
+                       semaphore_cpu)
+    )
+
+    list_dict_videos_duration = []
+    for file_path, path_file_name_ts, ffmpeg_result in zip(
+        list_file_path, list_path_file_name_ts, list_ffmpeg_result
+    ):
+        # real duration reported by the remux itself
+        float_duration = get_float_out_time(ffmpeg_result)
+        if float_duration is not None:
+            dict_videos_duration = {
+                "file_path_origin": file_path,
+                "duration_real": float_seconds_to_string(float_duration),
+            }
+        else:
+            logging.warning(
+                f"No remux progress, probing duration of: {path_file_name_ts}"
+            )
+            dict_videos_duration = get_dict_video_duration(
+                path_file_name_ts, file_path
+            )
         list_dict_videos_duration.append(dict_videos_duration)
 
-        list_path_file_name_ts.append(path_file_name_ts)
+    dict_return = {
+        "list_dict_videos_duration": list_dict_videos_duration,
+        "list_path_file_name_ts": list_path_file_name_ts,
+    }
+    return dict_return
+
+
+def convert_to_ts_cached(list_file_path, max_workers=1, pin=True,
+                         semaphore_cpu=None):
+    """convert a video list to ts, reusing the remux in ts_cache and
+    storing the new ones there
+
+    Args:
+        list_file_path (list): list of path_file with mp4 extension
+        max_workers (int, optional): ffmpeg processes running at the same
+                                     time. Defaults to 1.
+        pin (bool, optional): keep the entries safe from eviction until
+                              ts_cache.unpin(list_key_ts). Defaults to True.
+        semaphore_cpu (threading.BoundedSemaphore, optional): ffmpeg
+            processes running at the same time, shared with other threads.
+            Defaults to None.
+    Returns:
+        dict: keys: list_dict_videos_duration, list_path_file_name_ts,
+              list_key_ts, list_file_path_failed. The first three lists
+              keep the order of list_file_path. A video that could not be
+              converted has path_file_ts None and duration_real "", and is
+              listed in list_file_path_failed
+    """
+
+    logging.info("Convert files to TS, with cache: ")
+    list_key_ts = [ts_cache.get_key(file_path) for file_path in list_file_path]
+    if pin:
+        ts_cache.pin(list_key_ts)
+
+    # remux each missing source once, even if repeated in the list
+    dict_key_cached = {}
+    dict_key_miss = {}
+    for file_path, key in zip(list_file_path, list_key_ts):
+        if key is None:
+            logging.error(f"File not found: {file_path}")
+            continue
+        if key in dict_key_cached or key in dict_key_miss:
+            continue
+        dict_cached = ts_cache.lookup(key)
+        if dict_cached is not None:
+            dict_key_cached[key] = dict_cached
+        else:
+            dict_key_miss[key] = file_path
+
+    list_key_miss = list(dict_key_miss)
+    list_args = []
+    for key in list_key_miss:
+        path_file_temp = ts_cache.get_path_file_temp(key)
+        list_args.append(
+            (get_list_args_ts(dict_key_miss[key], path_file_temp),)
+        )
+    list_ffmpeg_result = asyncio.run(
+        gather_limited(ffmpeg_async_flat, list_args, max_workers,
+                       semaphore_cpu)
+    )
+
+    for key, args, ffmpeg_result in zip(
+        list_key_miss, list_args, list_ffmpeg_result
+    ):
+        file_path = dict_key_miss[key]
+        path_file_temp = args[0][-1]
+        if ffmpeg_result.return_code != 0:
+            logging.error(f"Can't convert to TS: {file_path}")
+            ts_cache.remove_temp(path_file_temp)
+            continue
+        try:
+            float_duration = get_float_out_time(ffmpeg_result)
+            if float_duration is None:
+                dict_inf_ffprobe = ffprobe(
+                    path_file_temp, use_cache=False
+                ).get_output_as_dict()
+                duration_dict = get_duration_ffprobe(
+                    dict_inf=dict_inf_ffprobe
+                )
+                float_duration = float(duration_dict["duration_seconds"])
+            path_file_ts = ts_cache.store(
+                key, path_file_temp, float_duration, file_path
+            )
+        except Exception as e:
+            logging.error(f"Can't convert to TS: {file_path}. {e}")
+            ts_cache.remove_temp(path_file_temp)
+            continue
+        dict_key_cached[key] = {
+            "path_file_ts": path_file_ts,
+            "duration_seconds": float_duration,
+        }
+
+    list_dict_videos_duration = []
+    list_path_file_name_ts = []
+    list_file_path_failed = []
+    for file_path, key in zip(list_file_path, list_key_ts):
+        dict_cached = dict_key_cached.get(key)
+        if dict_cached is None:
+            list_file_path_failed.append(file_path)
+            list_path_file_name_ts.append(None)
+            list_dict_videos_duration.append(
+                {"file_path_origin": file_path, "duration_real": ""}
+            )
+            continue
+        list_path_file_name_ts.append(dict_cached["path_file_ts"])
+        list_dict_videos_duration.append(
+            {
+                "file_path_origin": file_path,
+                "duration_real": float_seconds_to_string(
+                    dict_cached["duration_seconds"]
+                ),
+            }
+        )
 
     dict_return = {
         "list_dict_videos_duration": list_dict_videos_duration,
         "list_path_file_name_ts": list_path_file_name_ts,
+        "list_key_ts": list_key_ts,
+        "list_file_path_failed": list_file_path_failed,
     }
     return dict_return
 
 
-def join_mp4(list_file_path, file_name_output, path_folder_cache):
+def read_progress_out_time(stream_stderr, dict_progress):
+    """Read the stderr of a ffmpeg process started with '-progress pipe:2',
+    keeping the last out_time_us reported. Other lines are logged.
+
+    Args:
+        stream_stderr (file): stderr pipe of the ffmpeg process
+        dict_progress (dict): receives the key out_time_us (int)
+    """
+
+    for line in iter(stream_stderr.readline, b""):
+        line = line.decode("utf-8", errors="replace").strip()
+        key, sep, value = line.partition("=")
+        if sep == "":
+            if line != "":
+                logging.error(line)
+            continue
+        if key == "out_time_us" and value.lstrip("-").isdigit():
+            dict_progress["out_time_us"] = int(value)
+    stream_stderr.close()
+
+
+def get_command_array_ts_part(file_path):
+
+    command_array = [
+        "ffmpeg",
+        "-hide_banner",
+        "-nostdin",
+        "-v",
+        "error",
+        "-i",
+        file_path,
+        "-c",
+        "copy",
+        "-bsf:v",
+        "h264_mp4toannexb",
+        "-f",
+        "mpegts",
+        "-progress",
+        "pipe:2",
+        "-nostats",
+        "pipe:1",
+    ]
+    return command_array
+
+
+def get_command_array_ts_muxer(file_name_output):
+
+    command_array = [
+        "ffmpeg",
+        "-hide_banner",
+        "-v",
+        "error",
+        "-y",
+        "-analyzeduration",
+        "20M",
+        "-probesize",
+        "20M",
+        "-f",
+        "mpegts",
+        "-i",
+        "pipe:0",
+        "-c",
+        "copy",
+        "-flags",
+        "+global_header",
+        "-movflags",
+        "+faststart",
+        "-bsf:a",
+        "aac_adtstoasc",
+        file_name_output,
+    ]
+    return command_array
+
+
+def join_mp4_pipe(list_file_path, file_name_output):
+    """join a list of video path_file with mp4 extension, streaming the TS
+    remux of each video straight into the final muxer, without writing
+    intermediate TS files.
+
+    Args:
+         list_file_path (list): list of path_file with mp4 extension
+         file_name_output (string): filename output
+    Returns:
+         list: list of dicts:
+                file_path_origin (string): file_path of original video,
+                duration_real (string): real video duration,
+                                        format="hh:mm:ss.ms"
+    """
+
+    logging.info("Join files from TS pipe to MP4: ")
+    process_muxer = subprocess.Popen(
+        get_command_array_ts_muxer(file_name_output), stdin=subprocess.PIPE
+    )
+
+    list_dict_videos_duration = []
+    process_part = None
+    try:
+        for index, file_path in enumerate(list_file_path):
+            logging.info(f'TS part {index+1} from "{file_path}"')
+            process_part = subprocess.Popen(
+                get_command_array_ts_part(file_path),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+            dict_progress = {}
+            thread_stderr = threading.Thread(
+                target=read_progress_out_time,
+                args=(process_part.stderr, dict_progress),
+                daemon=True,
+            )
+            thread_stderr.start()
+            try:
+                shutil.copyfileobj(process_part.stdout, process_muxer.stdin)
+            except BrokenPipeError:
+                raise Exception(
+                    f"TS muxer stopped while receiving: {file_path}"
+                ) from None
+            process_part.stdout.close()
+            returncode = process_part.wait()
+            thread_stderr.join()
+            process_part = None
+
+            if returncode == 0 and "out_time_us" in dict_progress:
+                float_duration = dict_progress["out_time_us"] / 1_000_000
+                dict_videos_duration = {
+                    "file_path_origin": file_path,
+                    "duration_real": float_seconds_to_string(float_duration),
+                }
+            else:
+                logging.error(
+                    f"TS remux returned {returncode}, "
+                    f"probing duration of: {file_path}"
+                )
+                dict_videos_duration = get_dict_video_duration(
+                    file_path, file_path
+                )
+            list_dict_videos_duration.append(dict_videos_duration)
+    finally:
+        # no child is left running, whatever stopped the loop
+        if process_part is not None:
+            process_part.kill()
+            process_part.stdout.close()
+            process_part.wait()
+        try:
+            process_muxer.stdin.close()
+        except BrokenPipeError:
+            pass
+        process_muxer.wait()
+
+    if process_muxer.returncode != 0:
+        raise Exception(
+            f"TS muxer returned {process_muxer.returncode}: "
+            f"{file_name_output}"
+        )
+    return list_dict_videos_duration
+
+
+def join_mp4(list_file_path, file_name_output, path_folder_cache,
+             join_mode="file", ts_workers=1, semaphore_cpu=None,
+             semaphore_disk=None):
     """join a list of video path_file with mp4 extension
 
     Args:
          list_file_path (list): list of path_file with mp4 extension
          file_name_output (string): filename output
          path_folder_cache (string): path folder cache to temp alloc ts videos
+         join_mode (string, optional): 'file' to write TS files in
+                                       path_folder_cache, 'pipe' to stream
+                                       them to the muxer. Defaults to 'file'.
+         ts_workers (int, optional): TS conversions running at the same
+                                     time, in 'file' mode. Defaults to 1.
+         semaphore_cpu (threading.BoundedSemaphore, optional): TS
+            conversions running at the same time, shared by the joins of
+            other threads. Defaults to None.
+         semaphore_disk (threading.BoundedSemaphore, optional): held while
+            the joined file is written. Defaults to None.
     Returns:
          list: list of dicts:
                 file_path_origin (string): file_path of original video,
@@ -404,25 +806,51 @@ def join_mp4(list_file_path, file_name_output, path_folder_cache):
                                         format="hh:mm:ss.ms"
     """
 
-    convert_ts_return = convert_to_ts(list_file_path, path_folder_cache)
+    semaphore_disk = semaphore_disk or contextlib.nullcontext()
+    if join_mode == "pipe":
+        # the remux and the mux stream together, all of it writes the output
+        with semaphore_disk:
+            return join_mp4_pipe(list_file_path, file_name_output)
+
+    if ts_cache.is_enabled():
+        convert_ts_return = convert_to_ts_cached(
+            list_file_path, ts_workers, semaphore_cpu=semaphore_cpu
+        )
+    else:
+        convert_ts_return = convert_to_ts(
+            list_file_path, path_folder_cache, ts_workers, semaphore_cpu
+        )
     list_dict_videos_duration = convert_ts_return["list_dict_videos_duration"]
     list_path_file_name_ts = convert_ts_return["list_path_file_name_ts"]
 
-    logging.info("\n")
-    logging.info("Join files from TS to MP4: ")
-    stringa = 'ffmpeg -analyzeduration 20M -probesize 20M -i "concat:'
-    index_final = len(list_path_file_name_ts) - 1
-    for index, path_file_name_ts in enumerate(list_path_file_name_ts):
-        stringa += path_file_name_ts
-        if index != index_final:
-            stringa += "|"
-        else:
-            stringa += (
-                '" -c copy -flags +global_header -pix_fmt yuv420p '
-                "-movflags +faststart -bsf:a aac_adtstoasc "
-                f"{file_name_output}"
+    try:
+        list_file_path_failed = convert_ts_return.get(
+            "list_file_path_failed", []
+        )
+        if list_file_path_failed:
+            raise Exception(
+                "Can't convert to TS: " + ", ".join(list_file_path_failed)
             )
+        logging.info("\n")
+        logging.info("Join files from TS to MP4: ")
+        stringa = 'ffmpeg -analyzeduration 20M -probesize 20M -i "concat:'
+        index_final = len(list_path_file_name_ts) - 1
+        for index, path_file_name_ts in enumerate(list_path_file_name_ts):
+            stringa += path_file_name_ts
+            if index != index_final:
+                stringa += "|"
+            else:
+                stringa += (
+                    '" -c copy -flags +global_header -pix_fmt yuv420p '
+                    "-movflags +faststart -bsf:a aac_adtstoasc "
+                    f"{file_name_output}"
+                )
 
-    os.system(stringa)
-    exclude_temp_files(path_folder_cache)
+        with semaphore_disk:
+            os.system(stringa)
+    finally:
+        exclude_temp_files(path_folder_cache)
+        # cached TS can be evicted again
+        if "list_key_ts" in convert_ts_return:
+            ts_cache.unpin(convert_ts_return["list_key_ts"])
     return list_dict_videos_duration